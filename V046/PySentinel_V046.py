@@ -1,191 +1,34 @@
-import subprocess
 import sys
 import os
+
+# Service mode: hand over before tkinter and matplotlib are imported
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    import headless
+    sys.exit(headless.main(sys.argv[1:]))
+
 import tkinter as tk
 from tkinter import ttk
 import psutil
-import GPUtil  # For GPU monitoring
-import wmi  # For disk usage monitoring on Windows
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import time
-import configparser
+from datetime import datetime
 import socket
-import csv
 import threading
-from email_sender import send_drive_space_alert, send_threshold_alert, send_daily_report, send_email
-
-# Setup the path for the configuration file
-CONFIG_DIR = os.path.join(os.getcwd(), 'config')
-CONFIG_FILE_PATH = os.path.join(CONFIG_DIR, 'config.ini')
-
-def check_and_install_dependencies():
-    required_packages = {
-        'psutil': 'psutil',
-        'matplotlib': 'matplotlib',
-        'pandas': 'pandas',
-        'setuptools': 'setuptools',
-        'pyarrow': 'pyarrow',
-        'GPUtil': 'GPUtil',  # Added GPUtil for GPU monitoring
-        'WMI': 'wmi'  # Added WMI for disk usage monitoring on Windows
-    }
-
-    for package_name, module_name in required_packages.items():
-        try:
-            __import__(module_name)
-        except ImportError:
-            print(f"{package_name} not found. Installing...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
-            print(f"{package_name} installed successfully.")
-            
-# Initialize settings dictionary at the top of the file
-settings = {
-    'refresh_rate': 60,
-    'smtp_server': '',
-    'smtp_port': '',
-    'smtp_username': '',
-    'smtp_password': '',
-    'email_recipient': '',
-    'email_interval': 5,
-    'send_on_threshold_violation': 0,
-    'cpu_min_threshold': 0,
-    'cpu_max_threshold': 100,
-    'ram_min_threshold': 0,
-    'ram_max_threshold': 100,
-    'disk_min_threshold': 0,
-    'disk_max_threshold': 100,
-    'network_upload_min_threshold': 0,
-    'network_upload_max_threshold': 1000,
-    'network_download_min_threshold': 0,
-    'network_download_max_threshold': 1000,
-}
-
-def load_settings():
-    """Load settings from the config.ini file or create it with default values if not present."""
-    config = configparser.ConfigParser()
-
-    # Ensure the config directory exists
-    if not os.path.exists(CONFIG_DIR):
-        os.makedirs(CONFIG_DIR)
-
-    # If the config file does not exist, create it with default values
-    if not os.path.exists(CONFIG_FILE_PATH):
-        print("Config file not found, creating a new one with default settings.")
-        config['General'] = {
-            'refresh_rate': '60'
-        }
-        config['Email'] = {
-            'smtp_server': '',
-            'smtp_port': '',
-            'smtp_username': '',
-            'smtp_password': '',
-            'email_recipient': '',
-            'email_interval': '5',
-            'send_on_threshold_violation': '0'
-        }
-        config['Thresholds'] = {
-            'cpu_min_threshold': '0',
-            'cpu_max_threshold': '100',
-            'ram_min_threshold': '0',
-            'ram_max_threshold': '100',
-            'disk_min_threshold': '0',
-            'disk_max_threshold': '100',
-            'network_upload_min_threshold': '0',
-            'network_upload_max_threshold': '1000',
-            'network_download_min_threshold': '0',
-            'network_download_max_threshold': '1000',
-            'gpu_max_threshold': '100'  # Add GPU max threshold default
-        }
-
-        # Write the default configuration to file
-        with open(CONFIG_FILE_PATH, 'w') as configfile:
-            config.write(configfile)
-
-    # Read the config file
-    config.read(CONFIG_FILE_PATH)
-
-    # Load general settings
-    settings['refresh_rate'] = config.getint('General', 'refresh_rate', fallback=60)
-    settings['smtp_server'] = config.get('Email', 'smtp_server', fallback='')
-    settings['smtp_port'] = config.get('Email', 'smtp_port', fallback='')
-    settings['smtp_username'] = config.get('Email', 'smtp_username', fallback='')
-    settings['smtp_password'] = config.get('Email', 'smtp_password', fallback='')
-    settings['email_recipient'] = config.get('Email', 'email_recipient', fallback='')
-    settings['email_interval'] = config.getint('Email', 'email_interval', fallback=5)
-    settings['send_on_threshold_violation'] = config.getint('Email', 'send_on_threshold_violation', fallback=0)
-
-    # Load threshold settings
-    settings['cpu_min_threshold'] = config.getint('Thresholds', 'cpu_min_threshold', fallback=0)
-    settings['cpu_max_threshold'] = config.getint('Thresholds', 'cpu_max_threshold', fallback=100)
-    settings['ram_min_threshold'] = config.getint('Thresholds', 'ram_min_threshold', fallback=0)
-    settings['ram_max_threshold'] = config.getint('Thresholds', 'ram_max_threshold', fallback=100)
-    settings['disk_min_threshold'] = config.getint('Thresholds', 'disk_min_threshold', fallback=0)
-    settings['disk_max_threshold'] = config.getint('Thresholds', 'disk_max_threshold', fallback=100)
-    settings['network_upload_min_threshold'] = config.getint('Thresholds', 'network_upload_min_threshold', fallback=0)
-    settings['network_upload_max_threshold'] = config.getint('Thresholds', 'network_upload_max_threshold', fallback=1000)
-    settings['network_download_min_threshold'] = config.getint('Thresholds', 'network_download_min_threshold', fallback=0)
-    settings['network_download_max_threshold'] = config.getint('Thresholds', 'network_download_max_threshold', fallback=1000)
-
-    # **Load GPU threshold**
-    settings['gpu_max_threshold'] = config.getint('Thresholds', 'gpu_max_threshold', fallback=100)  # Add this line to load the GPU threshold
-
-    # Load drive thresholds
-    for partition in psutil.disk_partitions():
-        # Normalize the drive letter
-        normalized_drive = partition.device.strip(':\\')
-
-        # Load thresholds from config
-        min_threshold = config.getint('Thresholds', f'drive_{normalized_drive}_min_threshold', fallback=10)
-        max_threshold = config.getint('Thresholds', f'drive_{normalized_drive}_max_threshold', fallback=90)
-
-        settings[f'drive_{normalized_drive}_min_threshold'] = min_threshold
-        settings[f'drive_{normalized_drive}_max_threshold'] = max_threshold
-
-    print("Settings loaded:", settings)  # Log the settings for debugging
-
-def save_settings():
-    """Save settings to the config.ini file."""
-    config = configparser.ConfigParser()
-    config['General'] = {
-        'refresh_rate': str(settings['refresh_rate']),
-    }
-    config['Email'] = {
-        'smtp_server': settings['smtp_server'],
-        'smtp_port': settings['smtp_port'],
-        'smtp_username': settings['smtp_username'],
-        'smtp_password': settings['smtp_password'],
-        'email_recipient': settings['email_recipient'],
-        'email_interval': str(settings['email_interval']),
-        'send_on_threshold_violation': str(settings['send_on_threshold_violation']),
-    }
-    config['Thresholds'] = {
-        'cpu_min_threshold': str(settings['cpu_min_threshold']),
-        'cpu_max_threshold': str(settings['cpu_max_threshold']),
-        'ram_min_threshold': str(settings['ram_min_threshold']),
-        'ram_max_threshold': str(settings['ram_max_threshold']),
-        'disk_min_threshold': str(settings['disk_min_threshold']),
-        'disk_max_threshold': str(settings['disk_max_threshold']),
-        'network_upload_min_threshold': str(settings['network_upload_min_threshold']),
-        'network_upload_max_threshold': str(settings['network_upload_max_threshold']),
-        'network_download_min_threshold': str(settings['network_download_min_threshold']),
-        'network_download_max_threshold': str(settings['network_download_max_threshold']),
-    }
-
-    # Save drive thresholds
-    for partition in psutil.disk_partitions():
-        normalized_drive = partition.device.strip(':\\')
-        if f'drive_{normalized_drive}_min_threshold' in settings:
-            config['Thresholds'][f'drive_{normalized_drive}_min_threshold'] = str(settings[f'drive_{normalized_drive}_min_threshold'])
-        if f'drive_{normalized_drive}_max_threshold' in settings:
-            config['Thresholds'][f'drive_{normalized_drive}_max_threshold'] = str(settings[f'drive_{normalized_drive}_max_threshold'])
-
-    # Ensure the directory exists
-    if not os.path.exists(CONFIG_DIR):
-        os.makedirs(CONFIG_DIR)
-
-    # Write the settings to the config file
-    with open(CONFIG_FILE_PATH, 'w') as configfile:
-        config.write(configfile)
+import numpy as np
+import storage
+from downsample import lttb
+from ringbuffer import RingBuffer
+from sampler import SamplingJob, stop_slow_collectors
+from scheduler import Scheduler, wakeups
+from tk_bridge import TkBridge
+from status_server import StatusServer
+import history
+import drives
+import fleet
+from config_store import settings, load_settings, save_settings, enabled_plugins, printable_settings
+from email_sender import send_daily_report, send_email
+import monitoring
+from monitoring import run_checks
+import anomaly
 
 class RangeSlider(tk.Canvas):
     def __init__(self, parent, min_val, max_val, start_min, start_max, min_label, max_label, unit='', **kwargs):
@@ -269,187 +112,696 @@ class RangeSlider(tk.Canvas):
         """Get the maximum value."""
         return self.pos_to_val(self.max_position)
 
+# Minimum time between two redraws of the same graph (milliseconds)
+FRAME_BUDGET_MS = 50
+
+# Time windows the graphs can show, in seconds; older samples are read back from the CSV files
+HISTORY_WINDOWS = {'1 h': 3600, '24 h': 24 * 3600, '7 d': 7 * 24 * 3600}
+DEFAULT_HISTORY_WINDOW = '1 h'
+
+# Matplotlib date numbers are days since the epoch
+SECONDS_PER_DAY = 86400.0
+LOCAL_TIMEZONE = datetime.now().astimezone().tzinfo
+
 class LiveGraph:
-    def __init__(self, parent, plot_type):
-        self.figure, self.ax = plt.subplots(figsize=(8, 4))  # Adjust the size to make the GUI more compact
+    def __init__(self, parent, plot_type, machine_name=None, sample_interval=None, plugin=None):
+        # Matplotlib is only loaded once a graph is built; the figure is embedded directly, without pyplot
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.figure = Figure(figsize=(8, 4))  # Adjust the size to make the GUI more compact
+        self.ax = self.figure.add_subplot()
         self.canvas = FigureCanvasTkAgg(self.figure, parent)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         self.plot_type = plot_type
-        self.data = {'cpu': [], 'ram': [], 'disk': [], 'gpu': [], 'network_in': [], 'network_out': []}
-        self.time_stamps = []
-        self.max_data_points = 20
-
-        # Store the initial network I/O counters to initialize cumulative data to 0
-        self.initial_net_io = psutil.net_io_counters()
-
-        # Initialize WMI for disk usage monitoring
-        self.wmi_interface = wmi.WMI()
-        
-        # CSV-related attributes
-        self.machine_name = socket.gethostname()
-        self.current_date = time.strftime("%Y-%m-%d")
-        self.csv_file_path = self.create_csv_file()
-
-        # Initialize graphs
-        self.update_plot(None)
-
-    def create_csv_file(self):
-        """Create a new CSV file for the current day."""
-        filename = f"{self.machine_name}_{self.current_date}.csv"
-        file_path = os.path.join(os.getcwd(), filename)
-        # Create the file and write the header
-        with open(file_path, 'w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Date', 'Time', 'CPU Usage (%)', 'RAM Usage (%)', 'Disk Usage (%)', 
-                             'GPU Usage (%)', 'Network In (MB)', 'Network Out (MB)'])
-        return file_path
-
-    def write_to_csv(self, data_row):
-        """Write a row of data to the CSV file."""
-        with open(self.csv_file_path, 'a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(data_row)
-
-    def get_gpu_usage(self):
-        """Fetch the current GPU usage using GPUtil."""
-        gpus = GPUtil.getGPUs()
-        if gpus:
-            return gpus[0].load * 100  # GPU load is a fraction, convert to percentage
+        self.machine_name = machine_name  # Host whose stored samples are loaded, this machine by default
+        self.sample_interval = sample_interval  # Seconds between two add_sample calls, the refresh rate by default
+        self.plugin = plugin  # plugins.Plugin whose declared metrics a "plugin" graph shows
+        self.keys = list(plugin.columns) if plugin is not None else ['cpu', 'ram', 'disk', 'gpu', 'network_in', 'network_out']
+        self.window_seconds = HISTORY_WINDOWS[DEFAULT_HISTORY_WINDOW]
+        # Samples of the window, timestamps in seconds since the epoch; sized by load_history
+        self.buffer = RingBuffer(1, self.keys)
+
+        # Line artists are created once and updated in place; see setup_axes
+        self.lines = {}
+        self.background = None
+        self.setup_axes()
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+        # Rendering state: hidden graphs keep buffering samples but do not draw
+        self.widget = self.canvas.get_tk_widget()
+        self.visible = True
+        self.dirty = False
+        self.redraw_pending = False
+        self.last_draw = 0
+
+        # Start with the stored samples of the default window
+        self.load_history()
+
+    def load_history(self):
+        """Replace the buffered samples with the ones stored for the current window."""
+        end = time.time()
+        start, end_time = datetime.fromtimestamp(end - self.window_seconds), datetime.fromtimestamp(end)
+        if self.plugin is not None:
+            timestamps, columns = storage.load_history(start, end_time, self.machine_name, self.plugin.columns,
+                                                       self.plugin.header, self.plugin.file_prefix)
         else:
-            return 0  # No GPU found
-
-    def get_disk_usage(self):
-        """Fetch disk usage percentage using WMI."""
-        disk_usage_percentage = 0
-        try:
-            for disk in self.wmi_interface.Win32_PerfFormattedData_PerfDisk_LogicalDisk():
-                if disk.Name == "_Total":  # Use "_Total" to get the overall disk usage
-                    disk_usage_percentage = float(disk.PercentDiskTime)
-                    break
-        except Exception as e:
-            print(f"Error getting disk usage: {e}")
-        # Ensure the disk usage percentage is clamped between 0 and 100
-        disk_usage_percentage = max(0, min(disk_usage_percentage, 100))
-        return disk_usage_percentage
-
-    def update_plot(self, frame):
-        current_time = time.strftime("%H:%M:%S")
-        current_date = time.strftime("%Y-%m-%d")
-        self.time_stamps.append(current_time)
-        
-        if len(self.time_stamps) > self.max_data_points:
-            self.time_stamps.pop(0)
-            for key in self.data:
-                self.data[key].pop(0)
-        
-        # Collect data
-        cpu_usage = psutil.cpu_percent(interval=1)
-        ram_usage = psutil.virtual_memory().percent
-        disk_usage = self.get_disk_usage()  # Updated disk usage
-        gpu_usage = self.get_gpu_usage()
-        # Update GPU usage using GPUtil
-        self.data['cpu'].append(cpu_usage)
-        self.data['ram'].append(ram_usage)
-        self.data['disk'].append(disk_usage)
-        self.data['gpu'].append(gpu_usage)
-
-        # Get the current network I/O counters
-        current_net_io = psutil.net_io_counters()
-
-        # Calculate cumulative data by subtracting initial counters
-        network_in_cumulative = (current_net_io.bytes_recv - self.initial_net_io.bytes_recv) / (1024 * 1024)
-        network_out_cumulative = (current_net_io.bytes_sent - self.initial_net_io.bytes_sent) / (1024 * 1024)
-
-        # Append cumulative data to the graph data
-        self.data['network_in'].append(network_in_cumulative)
-        self.data['network_out'].append(network_out_cumulative)
-
-        # Write to CSV
-        data_row = [
-            current_date, current_time, cpu_usage, ram_usage, disk_usage, 
-            gpu_usage, network_in_cumulative, network_out_cumulative
-        ]
-        self.write_to_csv(data_row)
-
-        # Create a new CSV file if the day has changed
-        if current_date != self.current_date:
-            self.current_date = current_date
-            self.csv_file_path = self.create_csv_file()
-
-        # Clear the plot
-        self.ax.clear()
-
+            timestamps, columns = storage.load_history(start, end_time, self.machine_name)
+        # Room for the stored samples plus a full window of new ones at the current refresh rate
+        interval = self.sample_interval or settings['refresh_rate']
+        capacity = len(timestamps) + int(self.window_seconds // max(interval, 1)) + 1
+        self.buffer = RingBuffer(capacity, self.keys)
+        self.buffer.extend(timestamps, columns)
+
+    def set_window(self, label):
+        """Show another time window, reading its older samples back from storage."""
+        self.window_seconds = HISTORY_WINDOWS[label]
+        self.load_history()
+        self.set_time_limits(time.time())
+        if self.plot_type != "system":
+            self.ax.set_ylim(0, 1)  # Fitted again to the data of the new window
+        self.background = None
+        self.request_redraw()
+
+    def add_sample(self, sample):
+        """Buffer a sample from the Sampler and schedule a redraw."""
+        self.buffer.append(sample['timestamp'], sample)
+        # Drop the samples that left the window
+        self.buffer.drop_before(sample['timestamp'] - self.window_seconds)
+
+        self.request_redraw()
+
+    def add_samples(self, samples):
+        """Buffer the samples that arrived together while the Tk thread was busy."""
+        for sample in samples:
+            self.add_sample(sample)
+
+    def set_visible(self, visible):
+        """Start or stop drawing; a graph becoming visible catches up with the buffered samples."""
+        if visible == self.visible:
+            return
+        self.visible = visible
+        if visible:
+            # The window may have been resized while hidden, start from a full draw
+            self.background = None
+            self.request_redraw()
+
+    def request_redraw(self):
+        """Coalesce redraw requests into at most one draw per frame budget."""
+        self.dirty = True
+        if not self.visible or self.redraw_pending:
+            return
+        self.redraw_pending = True
+        elapsed = (time.perf_counter() - self.last_draw) * 1000
+        self.widget.after(max(0, int(FRAME_BUDGET_MS - elapsed)), self.draw_frame)
+
+    def draw_frame(self):
+        """Draw the buffered samples if the graph is still visible."""
+        self.redraw_pending = False
+        if not self.visible or not self.dirty:
+            return
+        self.dirty = False
+        self.last_draw = time.perf_counter()
+        self.redraw()
+
+    def setup_axes(self):
+        """Create the static parts of the plot and the line artists updated by redraw."""
         if self.plot_type == "system":
-            # Update CPU, RAM, Disk, and GPU Usage plot
-            self.ax.plot(self.time_stamps, self.data['cpu'], label='CPU Usage')
-            self.ax.plot(self.time_stamps, self.data['ram'], label='RAM Usage')
-            self.ax.plot(self.time_stamps, self.data['disk'], label='Disk Usage')
-            self.ax.plot(self.time_stamps, self.data['gpu'], label='GPU Usage')
+            series = [('cpu', 'CPU Usage'), ('ram', 'RAM Usage'), ('disk', 'Disk Usage'), ('gpu', 'GPU Usage')]
             self.ax.set_title('System Resources Over Time')
             self.ax.set_ylabel('Usage (%)')
             self.ax.set_ylim(0, 100)  # Set the y-axis limits to 0-100%
-        
-        elif self.plot_type == "network":
-            # Update Network Usage plot
-            self.ax.plot(self.time_stamps, self.data['network_in'], label='Network In')
-            self.ax.plot(self.time_stamps, self.data['network_out'], label='Network Out')
+        elif self.plot_type == "plugin":
+            series = [(key, spec['label']) for key, spec in self.plugin.metrics.items()]
+            self.ax.set_title(f'{self.plugin.title} Over Time')
+            units = sorted({spec['unit'] for spec in self.plugin.metrics.values() if spec['unit']})
+            self.ax.set_ylabel(', '.join(units) or 'Value')
+            self.ax.set_ylim(0, 1)
+        else:
+            series = [('network_in', 'Network In'), ('network_out', 'Network Out')]
             self.ax.set_title('Network Cumulative Data Usage Over Time')
             self.ax.set_ylabel('Cumulative Data (MB)')
+            self.ax.set_ylim(0, 1)
+
+        # Animated lines are left out of the cached background and blitted on top of it
+        for key, label in series:
+            self.lines[key], = self.ax.plot([], [], label=label, animated=True)
 
         self.ax.legend(loc='upper left')
         self.ax.set_xlabel('Time')
-        self.ax.set_xticks(self.time_stamps)
-        self.ax.set_xticklabels(self.time_stamps, rotation=90)  # Rotate time labels 90 degrees
-        
-        self.canvas.draw()
+        self.set_time_limits(time.time())
+        # A handful of date ticks chosen for the visible span instead of one label per sample
+        import matplotlib.dates as mdates
+        locator = mdates.AutoDateLocator(tz=LOCAL_TIMEZONE)
+        self.ax.xaxis.set_major_locator(locator)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator, tz=LOCAL_TIMEZONE))
+        self.figure.tight_layout()
+
+    def set_time_limits(self, end):
+        """Show the window ending at a timestamp, plus a tenth of the window as headroom."""
+        self.ax.set_xlim((end - self.window_seconds) / SECONDS_PER_DAY,
+                         (end + self.window_seconds * 0.1) / SECONDS_PER_DAY)
+
+    def on_draw(self, event):
+        """After a full draw, cache the static background and paint the lines over it."""
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def update_limits(self):
+        """Move the axes only when the data leaves them. Returns True if the background must be redrawn."""
+        changed = False
+        if not len(self.buffer):
+            return changed
+        x_min, x_max = self.ax.get_xlim()
+        end = self.buffer.view_times()[-1]
+        if end / SECONDS_PER_DAY > x_max:
+            # The headroom means the axis only moves every few samples
+            self.set_time_limits(end)
+            changed = True
+
+        if self.plot_type != "system":
+            y_min, y_max = self.ax.get_ylim()
+            # fmin and fmax skip the NaN a plugin stores for a missing value
+            low = min(np.fmin.reduce(self.buffer.view(key)) for key in self.lines)
+            high = max(np.fmax.reduce(self.buffer.view(key)) for key in self.lines)
+            if high > y_max or low < y_min:
+                self.ax.set_ylim(min(0, low), high * 1.2 or 1)
+                changed = True
+        return changed
+
+    def redraw(self):
+        """Update the line data and blit it over the cached background."""
+        # Long windows are reduced to about one point per pixel, keeping peaks visible
+        width = max(int(self.ax.bbox.width), 100)
+        times = self.buffer.view_times()
+        for key, line in self.lines.items():
+            x_values, y_values = times, self.buffer.view(key)
+            if len(times) > width:
+                x_values, y_values = lttb(times, y_values, width)
+            line.set_data(x_values / SECONDS_PER_DAY, y_values)
+
+        if self.update_limits() or self.background is None:
+            # Axes, ticks or size changed: a full draw refreshes the background through on_draw
+            self.canvas.draw()
+            return
+
+        self.canvas.restore_region(self.background)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
+
+# Spans offered by the history browser, in seconds
+HISTORY_BROWSER_SPANS = {'1 h': 3600, '6 h': 6 * 3600, '1 d': 24 * 3600, '7 d': 7 * 24 * 3600,
+                         '30 d': 30 * 24 * 3600, '90 d': 90 * 24 * 3600, '1 y': 365 * 24 * 3600}
+DEFAULT_HISTORY_BROWSER_SPAN = '1 d'
+MIN_HISTORY_BROWSER_SPAN = 10 * 60
+
+class HistoryBrowser:
+    """Browse the stored CSV history: pan and zoom, each view loaded in the background at screen resolution."""
+
+    def __init__(self, parent, bridge):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        import matplotlib.dates as mdates
+        self.bridge = bridge
+
+        # Navigation controls
+        controls = tk.Frame(parent)
+        controls.pack(fill="x")
+        tk.Button(controls, text="<", width=3, command=lambda: self.pan(-0.5)).pack(side="left", padx=(10, 0))
+        tk.Button(controls, text=">", width=3, command=lambda: self.pan(0.5)).pack(side="left")
+        tk.Button(controls, text="-", width=3, command=lambda: self.zoom(2)).pack(side="left", padx=(10, 0))
+        tk.Button(controls, text="+", width=3, command=lambda: self.zoom(0.5)).pack(side="left")
+        self.span_var = tk.StringVar(value=DEFAULT_HISTORY_BROWSER_SPAN)
+        span_menu = tk.OptionMenu(controls, self.span_var, *HISTORY_BROWSER_SPANS, command=self.set_span)
+        span_menu.pack(side="left", padx=(10, 0))
+        tk.Button(controls, text="Latest", command=self.show_latest).pack(side="left")
+        self.status_var = tk.StringVar()
+        tk.Label(controls, textvariable=self.status_var, anchor="e").pack(side="right", padx=10)
+
+        # Usage and network on two axes sharing the time axis
+        self.figure = Figure(figsize=(8, 4))
+        self.ax, self.network_ax = self.figure.subplots(2, 1, sharex=True)
+        self.canvas = FigureCanvasTkAgg(self.figure, parent)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.lines = {}
+        for key, label in [('cpu', 'CPU Usage'), ('ram', 'RAM Usage'), ('disk', 'Disk Usage'), ('gpu', 'GPU Usage')]:
+            self.lines[key], = self.ax.plot([], [], label=label)
+        for key, label in [('network_in', 'Network In'), ('network_out', 'Network Out')]:
+            self.lines[key], = self.network_ax.plot([], [], label=label)
+        self.ax.set_ylabel('Usage (%)')
+        self.ax.set_ylim(0, 100)
+        self.network_ax.set_ylabel('Cumulative Data (MB)')
+        self.network_ax.set_ylim(0, 1)
+        for ax in (self.ax, self.network_ax):
+            ax.legend(loc='upper left')
+        locator = mdates.AutoDateLocator(tz=LOCAL_TIMEZONE)
+        self.network_ax.xaxis.set_major_locator(locator)
+        self.network_ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator, tz=LOCAL_TIMEZONE))
+        self.figure.tight_layout()
+
+        # Mouse: the wheel zooms around the pointer, dragging pans
+        self.drag_start = None
+        self.canvas.mpl_connect('scroll_event', self.on_scroll)
+        self.canvas.mpl_connect('button_press_event', self.on_press)
+        self.canvas.mpl_connect('motion_notify_event', self.on_motion)
+        self.canvas.mpl_connect('button_release_event', self.on_release)
+
+        # Nothing is read from disk until the tab is first shown
+        self.store = history.HistoryStore()
+        self.loader = history.HistoryLoader(self.store, self.on_loaded)
+        self.started = False
+        self.span = HISTORY_BROWSER_SPANS[DEFAULT_HISTORY_BROWSER_SPAN]
+        self.end = time.time()
+        self.set_view(self.end - self.span, self.end, load=False)
+
+    def set_visible(self, visible):
+        """Start the loader and load the first view the first time the tab is shown."""
+        if visible and not self.started:
+            self.started = True
+            self.loader.start()
+            self.show_latest()
+
+    def stop(self):
+        if self.started:
+            self.loader.stop()
+
+    def set_view(self, start, end, load=True):
+        """Show a time range now with the data already loaded, and fetch it at the right resolution."""
+        span = max(end - start, MIN_HISTORY_BROWSER_SPAN)
+        center = (start + end) / 2
+        self.span = span
+        self.end = center + span / 2
+        self.ax.set_xlim((self.end - span) / SECONDS_PER_DAY, self.end / SECONDS_PER_DAY)
+        self.canvas.draw_idle()
+        if load and self.started:
+            self.request_load()
+
+    def request_load(self):
+        # About one point per pixel of the axes
+        points = max(int(self.ax.bbox.width), 100)
+        self.loader.request(self.end - self.span, self.end, points)
+        self.bridge.expect()
+        self.status_var.set("Loading...")
+
+    def pan(self, fraction):
+        """Move the view by a fraction of its span (negative: back in time)."""
+        offset = self.span * fraction
+        self.set_view(self.end - self.span + offset, self.end + offset)
+
+    def zoom(self, factor, center=None):
+        """Scale the span around a timestamp (the middle of the view by default)."""
+        if center is None:
+            center = self.end - self.span / 2
+        start = self.end - self.span
+        self.set_view(center - (center - start) * factor, center + (self.end - center) * factor)
+
+    def set_span(self, label):
+        """Show the chosen span, ending at the end of the current view."""
+        span = HISTORY_BROWSER_SPANS[label]
+        self.set_view(self.end - span, self.end)
+
+    def show_latest(self):
+        """Jump to the most recent samples."""
+        self.set_view(time.time() - self.span, time.time())
+
+    def on_scroll(self, event):
+        if event.xdata is None:
+            return
+        self.zoom(0.8 if event.button == 'up' else 1.25, event.xdata * SECONDS_PER_DAY)
+
+    def on_press(self, event):
+        if event.button == 1 and event.x is not None:
+            self.drag_start = (event.x, self.end)
+
+    def on_motion(self, event):
+        if self.drag_start is None or event.x is None:
+            return
+        # Move with the pointer using the data already loaded; the range is fetched on release
+        x_start, end = self.drag_start
+        seconds_per_pixel = self.span / max(self.ax.bbox.width, 1)
+        self.set_view(end - self.span - (event.x - x_start) * seconds_per_pixel,
+                      end - (event.x - x_start) * seconds_per_pixel, load=False)
+
+    def on_release(self, event):
+        if self.drag_start is not None:
+            self.drag_start = None
+            self.request_load()
+
+    def on_loaded(self, generation, start, end, series):
+        """Called on the loader thread: hand the result to the Tk thread."""
+        self.bridge.post(self.show_loaded, generation, series)
+
+    def show_loaded(self, generation, series):
+        if generation != self.loader.generation:
+            return  # The view moved again, a newer result is on its way
+        samples = 0
+        for key, line in self.lines.items():
+            x_values, y_values = series[key]
+            line.set_data(x_values / SECONDS_PER_DAY, y_values)
+            samples = max(samples, len(x_values))
+        network_max = max((series[key][1].max() for key in ('network_in', 'network_out') if len(series[key][1])), default=0)
+        self.network_ax.set_ylim(0, network_max * 1.2 or 1)
+        self.status_var.set(f"{samples} points" if samples else "No data stored for this range")
+        self.canvas.draw_idle()
+
+def format_size(size):
+    """Format a number of bytes as GB, or TB above 1000 GB."""
+    gb = size / (1024 ** 3)
+    return f"{gb / 1024:.2f} TB" if gb >= 1000 else f"{gb:.1f} GB"
+
+def format_duration(seconds):
+    """Format a duration in the largest suitable unit."""
+    if seconds is None:
+        return "-"
+    if seconds >= 2 * 24 * 3600:
+        return f"{seconds / (24 * 3600):.0f} d"
+    if seconds >= 2 * 3600:
+        return f"{seconds / 3600:.0f} h"
+    return f"{seconds / 60:.0f} min"
+
+# Drive thresholds edited in the Drives tab, saved by apply_settings: drive key -> {'min_threshold', 'enabled'}
+drive_thresholds = {}
+
+class DriveView:
+    """Drives tab: one table row per partition, updated in place with what the DrivePoller reports."""
+
+    COLUMNS = [('drive', 'Drive', 150), ('type', 'Type', 60), ('size', 'Size', 75), ('used', 'Used', 75),
+               ('free', 'Free', 75), ('percent', 'Use %', 55), ('growth', 'Growth', 85), ('full', 'Full In', 65),
+               ('min_free', 'Min Free', 70), ('alerts', 'Alerts', 50)]
+
+    def __init__(self, parent, bridge):
+        self.bridge = bridge
+        title = tk.Label(parent, text="Drive Monitoring", font=("Arial", 14))
+        title.pack(pady=10)
+
+        # A table scales to dozens of mounts, where a frame per drive would not
+        table_frame = tk.Frame(parent)
+        table_frame.pack(fill="both", expand=True, padx=10)
+        self.tree = ttk.Treeview(table_frame, columns=[name for name, _, _ in self.COLUMNS], show="headings", selectmode="browse")
+        for name, heading, width in self.COLUMNS:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width, anchor="w" if name == 'drive' else "e", stretch=name == 'drive')
+        self.tree.tag_configure('low', foreground="red")
+        self.tree.tag_configure('stale', foreground="gray")
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+
+        # Threshold editor for the selected drive; the values are saved by Apply Settings
+        editor = tk.Frame(parent)
+        editor.pack(fill="x", padx=10, pady=10)
+        self.selected_var = tk.StringVar(value="Select a drive")
+        tk.Label(editor, textvariable=self.selected_var, width=20, anchor="w").pack(side="left")
+        tk.Label(editor, text="Minimum Free Space (GB):").pack(side="left")
+        self.min_free_entry = tk.Entry(editor, width=8)
+        self.min_free_entry.pack(side="left")
+        self.enabled_var = tk.IntVar(value=1)
+        tk.Checkbutton(editor, text="Alerts", variable=self.enabled_var).pack(side="left", padx=5)
+        tk.Button(editor, text="Set", command=self.set_threshold).pack(side="left")
+
+        self.drives = {}  # drive key -> latest usage snapshot
+        self.rows = {}  # drive key -> values currently shown in its row
+        self.visible = False
+        self.pending = set()  # Drives updated while the tab was hidden
+        # Polled by the scheduler; see setup_gui
+        self.poller = drives.DrivePoller(self.on_update)
+
+    def stop(self):
+        self.poller.stop()
+
+    def set_visible(self, visible):
+        """Rows are only refreshed while the tab is shown; catch up when it is."""
+        self.visible = visible
+        if visible:
+            for key in self.pending:
+                self.render(key)
+            self.pending.clear()
+
+    def on_update(self, changed, removed):
+        """Called on the scheduler thread: copy the values and hand them to the Tk thread."""
+        snapshots = [{
+            'key': drive.key, 'mountpoint': drive.mountpoint, 'fstype': drive.fstype,
+            'total': drive.total, 'used': drive.used, 'free': drive.free, 'percent': drive.percent,
+            'growth': drive.growth, 'full_in': drive.seconds_until_full(), 'responding': drive.responding,
+        } for drive in changed]
+        self.bridge.post(self.apply_update, snapshots, removed)
+
+    def apply_update(self, snapshots, removed):
+        for key in removed:
+            self.drives.pop(key, None)
+            self.pending.discard(key)
+            if self.rows.pop(key, None) is not None:
+                self.tree.delete(key)
+        for snapshot in snapshots:
+            self.drives[snapshot['key']] = snapshot
+            if self.visible:
+                self.render(snapshot['key'])
+            else:
+                self.pending.add(snapshot['key'])
+
+    def get_threshold(self, key):
+        """Return (minimum free GB, alerts enabled) for a drive, including edits not applied yet."""
+        edited = drive_thresholds.get(key, {})
+        return (edited.get('min_threshold', settings.get(f'drive_{key}_min_threshold', 10)),
+                edited.get('enabled', settings.get(f'drive_{key}_enabled', 1)))
+
+    def render(self, key):
+        """Update the row of a drive, touching the widget only if a value changed."""
+        drive = self.drives.get(key)
+        if drive is None:
+            return
+        min_free, enabled = self.get_threshold(key)
+        growth_gb = drive['growth'] * 3600 / (1024 ** 3)
+        values = (
+            drive['mountpoint'], drive['fstype'], format_size(drive['total']), format_size(drive['used']),
+            format_size(drive['free']), f"{drive['percent']:.1f}", f"{growth_gb:+.2f} GB/h",
+            format_duration(drive['full_in']), f"{min_free} GB", "On" if enabled else "Off",
+        )
+        if not drive['responding']:
+            tags = ('stale',)
+        elif enabled and drive['free'] / (1024 ** 3) < min_free:
+            tags = ('low',)
+        else:
+            tags = ()
+        row = (values, tags)
+        if self.rows.get(key) == row:
+            return
+        if key in self.rows:
+            self.tree.item(key, values=values, tags=tags)
+        else:
+            self.tree.insert("", "end", iid=key, values=values, tags=tags)
+        self.rows[key] = row
+
+    def on_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        key = selection[0]
+        min_free, enabled = self.get_threshold(key)
+        self.selected_var.set(self.drives[key]['mountpoint'] if key in self.drives else key)
+        self.min_free_entry.delete(0, tk.END)
+        self.min_free_entry.insert(0, str(min_free))
+        self.enabled_var.set(enabled)
+
+    def set_threshold(self):
+        """Store the threshold of the selected drive until Apply Settings saves it."""
+        selection = self.tree.selection()
+        if not selection:
+            return
+        key = selection[0]
+        try:
+            min_free = int(self.min_free_entry.get())
+        except ValueError:
+            min_free = 10  # Default to 10 GB
+        drive_thresholds[key] = {'min_threshold': max(min_free, 0), 'enabled': self.enabled_var.get()}
+        self.render(key)
 
-def create_drive_frame(drive, drive_info):
-    """Create a frame for each drive with threshold settings and options."""
-    global drive_sliders  # Use the global drive_sliders dictionary
-    drive_frame = tk.LabelFrame(drive_tab, text=f"Drive {drive}: {drive_info['total']} GB total")
-    drive_frame.pack(fill="x", padx=10, pady=5)
+# Hosts listed in the Fleet tab: the worst ones; the percentiles cover the whole fleet
+FLEET_ROWS = 200
 
-    # Space Thresholds
-    threshold_label = tk.Label(drive_frame, text="Occupied Space Threshold (GB):")
-    threshold_label.pack(anchor="w")
-    
-    # Labels for the sliders
-    min_label = tk.StringVar()
-    max_label = tk.StringVar()
-
-    # **Load the saved min and max thresholds from settings**
-    normalized_drive = drive.strip(':\\')
-    min_threshold = settings.get(f'drive_{normalized_drive}_min_threshold', 10)  # Default to 10 GB
-    max_threshold = settings.get(f'drive_{normalized_drive}_max_threshold', drive_info['total'] * 0.8)  # Default to 80% of total
-
-    # Initialize the RangeSlider with loaded values
-    drive_slider = RangeSlider(
-        drive_frame, 0, drive_info['total'], min_threshold, max_threshold,
-        min_label, max_label, unit=' GB', width=300, height=50
-    )
-    
-    # Pack the slider and min/max display
-    drive_slider.pack()
-    min_display = tk.Label(drive_frame, textvariable=min_label, width=15)
-    min_display.pack(side="left", padx=(5, 0))
-    max_display = tk.Label(drive_frame, textvariable=max_label, width=15)
-    max_display.pack(side="left")
+# Milliseconds between two refreshes of the Fleet tab and of the host windows opened from it
+FLEET_REFRESH_MS = 1000
 
-    # Store the slider in the global dictionary
-    drive_sliders[normalized_drive] = drive_slider
+class FleetView:
+    """Fleet tab: p50/p95/max of each metric across the agents' hosts, and the worst hosts with sparklines.
 
-    # Debugging output
-    print(f"Drive {drive}: Min: {min_threshold}, Max: {max_threshold}")
+    The numbers come from a fleet.FleetModel updated by the aggregator as samples arrive;
+    the tab only reads them, at most once per FLEET_REFRESH_MS and only while it is shown.
+    """
 
-# Global dictionary to store drive sliders
-drive_sliders = {}
+    METRIC_LABELS = {'cpu': 'CPU', 'ram': 'RAM', 'disk': 'Disk', 'gpu': 'GPU'}
+
+    def __init__(self, parent, model):
+        self.model = model
+        title = tk.Label(parent, text="Fleet Overview", font=("Arial", 14))
+        title.pack(pady=10)
+
+        # Fleet-wide percentiles, with the recent p95 as a sparkline
+        summary_frame = tk.LabelFrame(parent, text="Across Hosts (p50 / p95 / max, recent p95)", padx=10, pady=5)
+        summary_frame.pack(fill="x", padx=10)
+        self.summary_vars = {}
+        self.trend_vars = {}
+        for row, (metric, label) in enumerate(self.METRIC_LABELS.items()):
+            tk.Label(summary_frame, text=f"{label}:", width=6, anchor="w").grid(row=row, column=0, sticky="w")
+            self.summary_vars[metric] = tk.StringVar(value="-")
+            tk.Label(summary_frame, textvariable=self.summary_vars[metric], width=28, anchor="w").grid(row=row, column=1, sticky="w")
+            self.trend_vars[metric] = tk.StringVar()
+            tk.Label(summary_frame, textvariable=self.trend_vars[metric], font="TkFixedFont", anchor="w").grid(row=row, column=2, sticky="w")
+
+        controls = tk.Frame(parent)
+        controls.pack(fill="x", padx=10, pady=5)
+        self.count_var = tk.StringVar(value="Waiting for agents...")
+        tk.Label(controls, textvariable=self.count_var).pack(side="left")
+        self.sort_var = tk.StringVar(value='worst')
+        tk.OptionMenu(controls, self.sort_var, 'worst', *fleet.FLEET_METRICS, command=lambda value: self.refresh()).pack(side="right")
+        tk.Label(controls, text="Sort by:").pack(side="right")
+
+        # Worst hosts first; double-click opens the host's graphs
+        columns = [('host', 'Host', 150)] + [(metric, f"{label} %", 60) for metric, label in self.METRIC_LABELS.items()] + \
+                  [('trend', 'Trend', 200)]
+        table_frame = tk.Frame(parent)
+        table_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.tree = ttk.Treeview(table_frame, columns=[name for name, _, _ in columns], show="headings", selectmode="browse")
+        for name, heading, width in columns:
+            command = (lambda metric=name: self.sort_by(metric)) if name in self.METRIC_LABELS else None
+            self.tree.heading(name, text=heading, command=command)
+            self.tree.column(name, width=width, anchor="w" if name in ('host', 'trend') else "e", stretch=name == 'trend')
+        self.tree.tag_configure('stale', foreground="gray")
+        self.tree.tag_configure('high', foreground="red")
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        self.tree.bind("<Double-1>", self.open_host)
+
+        self.rows = {}  # host -> (values, tags) currently shown
+        self.order = []  # Hosts in the order shown
+        self.windows = {}  # host -> HostWindow
+        self.visible = False
+        self.refresh_pending = False
+        self.last_refresh = 0
+
+    def set_visible(self, visible):
+        self.visible = visible
+        if visible:
+            self.request_refresh()
+
+    def sort_by(self, metric):
+        self.sort_var.set(metric)
+        self.refresh()
+
+    def request_refresh(self):
+        """Called on the Tk thread when the model changed: refresh once the interval has passed."""
+        if self.refresh_pending or not (self.visible or self.windows):
+            return
+        self.refresh_pending = True
+        elapsed = (time.perf_counter() - self.last_refresh) * 1000
+        self.tree.after(max(0, int(FLEET_REFRESH_MS - elapsed)), self.refresh)
+
+    def refresh(self):
+        self.refresh_pending = False
+        self.last_refresh = time.perf_counter()
+        for host, window in self.windows.items():
+            window.add_sample(self.model.last_sample(host))
+        if not self.visible:
+            return
+
+        for metric, (p50, p95, high, trend) in self.model.summary().items():
+            if p50 is not None:
+                self.summary_vars[metric].set(f"{p50:5.1f} / {p95:5.1f} / {high:5.1f}")
+            self.trend_vars[metric].set(trend)
+        active, total = self.model.host_count()
+        self.count_var.set(f"{active} hosts reporting" + (f", {total - active} silent" if total > active else ""))
+
+        sort_key = self.sort_var.get()
+        rows = self.model.rows(sort_key, FLEET_ROWS)
+        shown = [host for host, _, _, _ in rows]
+        for host in set(self.rows) - set(shown):
+            self.tree.delete(host)
+            del self.rows[host]
+        for index, (host, values, sparklines, stale) in enumerate(rows):
+            worst = max(values, key=values.get)
+            trend = sparklines[worst if sort_key == 'worst' else sort_key]
+            row_values = (host,) + tuple(f"{values[metric]:.1f}" for metric in self.METRIC_LABELS) + (trend,)
+            if stale:
+                tags = ('stale',)
+            elif values[worst] >= 90:
+                tags = ('high',)
+            else:
+                tags = ()
+            if host not in self.rows:
+                self.tree.insert("", index, iid=host, values=row_values, tags=tags)
+            elif self.rows[host] != (row_values, tags):
+                self.tree.item(host, values=row_values, tags=tags)
+            self.rows[host] = (row_values, tags)
+        # Reorder only when the ranking changed
+        if shown != self.order:
+            for index, host in enumerate(shown):
+                self.tree.move(host, "", index)
+            self.order = shown
+
+    def open_host(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        host = selection[0]
+        window = self.windows.get(host)
+        if window is not None:
+            window.top.lift()
+            return
+        self.windows[host] = HostWindow(self.tree, host, lambda: self.windows.pop(host, None))
+        self.request_refresh()
+
+class HostWindow:
+    """The Main and Network graphs of one agent's host, in their own window, fed from the fleet model."""
+
+    def __init__(self, parent, host, on_close):
+        self.top = tk.Toplevel(parent)
+        self.top.title(f"{host} - System Monitoring Tool")
+        self.top.geometry("800x500")
+        self.on_close = on_close
+        notebook = ttk.Notebook(self.top)
+        system_tab = ttk.Frame(notebook)
+        network_tab = ttk.Frame(notebook)
+        notebook.add(system_tab, text="System")
+        notebook.add(network_tab, text="Network")
+        notebook.pack(expand=True, fill='both')
+        # Starts from the host's stored samples, which the aggregator writes under its name
+        interval = FLEET_REFRESH_MS / 1000
+        self.graphs = {str(system_tab): LiveGraph(system_tab, "system", host, interval),
+                       str(network_tab): LiveGraph(network_tab, "network", host, interval)}
+        self.notebook = notebook
+        notebook.bind("<<NotebookTabChanged>>", self.update_visibility)
+        self.update_visibility()
+        self.last_timestamp = 0
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+
+    def update_visibility(self, event=None):
+        selected = self.notebook.select()
+        for tab, graph in self.graphs.items():
+            graph.set_visible(tab == selected)
+
+    def add_sample(self, sample):
+        if sample is None or sample['timestamp'] <= self.last_timestamp:
+            return
+        self.last_timestamp = sample['timestamp']
+        for graph in self.graphs.values():
+            graph.add_sample(sample)
+
+    def close(self):
+        self.on_close()
+        self.top.destroy()
 
 def apply_settings():
     global refresh_rate_entry, smtp_entry, port_entry, username_entry, password_entry, recipient_entry
-    global interval_entry, send_on_threshold_var
+    global interval_entry, send_on_threshold_var, digest_mode_var, digest_window_entry, attachment_window_entry
+    global smtp_enabled_var, webhook_entry, syslog_entry, jsonl_entry
+    global anomaly_var, anomaly_threshold_entry
     global cpu_slider, ram_slider, disk_slider
     global network_upload_entry, network_download_entry
-    global drive_sliders, drive_checkboxes
 
     # Apply refresh rate
     try:
@@ -474,6 +826,27 @@ def apply_settings():
     
     settings['send_on_threshold_violation'] = send_on_threshold_var.get()
 
+    # Apply alert digest settings
+    settings['digest_mode'] = digest_mode_var.get()
+    try:
+        new_digest_window = int(digest_window_entry.get())
+        settings['digest_window'] = new_digest_window if new_digest_window > 0 else 300
+    except ValueError:
+        settings['digest_window'] = 300  # Default to 5 minutes
+
+    # Apply the history window attached to alert emails
+    try:
+        new_attachment_window = int(attachment_window_entry.get())
+        settings['attachment_window'] = new_attachment_window if new_attachment_window > 0 else 30
+    except ValueError:
+        settings['attachment_window'] = 30  # Default to 30 minutes
+
+    # Apply notification channels
+    settings['smtp_enabled'] = smtp_enabled_var.get()
+    settings['webhook_url'] = webhook_entry.get().strip()
+    settings['syslog_address'] = syslog_entry.get().strip()
+    settings['jsonl_path'] = jsonl_entry.get().strip()
+
     # Apply CPU, RAM, Disk thresholds
     settings['cpu_min_threshold'] = int(cpu_slider.get_min_value())
     settings['cpu_max_threshold'] = int(cpu_slider.get_max_value())
@@ -493,134 +866,94 @@ def apply_settings():
     except ValueError:
         settings['network_download_max_threshold'] = 1000  # Default to 1000 MB
 
-    # Save drive thresholds using the drive sliders
-    for drive_letter, slider in drive_sliders.items():
-    # Normalize drive letter
-        normalized_drive = drive_letter.strip(':\\')
-        settings[f'drive_{normalized_drive}_min_threshold'] = int(slider.get_min_value())
-        settings[f'drive_{normalized_drive}_max_threshold'] = int(slider.get_max_value())
+    # Apply anomaly detection settings
+    settings['anomaly_detection'] = anomaly_var.get()
+    try:
+        new_anomaly_threshold = float(anomaly_threshold_entry.get())
+        settings['anomaly_threshold'] = new_anomaly_threshold if new_anomaly_threshold > 0 else 3.0
+    except ValueError:
+        settings['anomaly_threshold'] = 3.0  # Default to 3 standard deviations
 
+    # Apply the thresholds of the plugin metrics; an empty entry means no threshold
+    for (name, option), entry in plugin_threshold_entries.items():
+        text = entry.get().strip()
+        try:
+            if text:
+                float(text)
+        except ValueError:
+            continue  # Keep the previous threshold
+        settings['plugin_settings'].setdefault(name, {})[option] = text
+
+    # Save the drive thresholds set in the Drives tab
+    for normalized_drive, threshold in drive_thresholds.items():
+        settings[f'drive_{normalized_drive}_min_threshold'] = threshold['min_threshold']
+        settings[f'drive_{normalized_drive}_enabled'] = threshold['enabled']
+    drive_thresholds.clear()
 
     # Save settings to config file
     save_settings()
 
+    # Take a new refresh rate into account now rather than after the current interval
+    if scheduler is not None:
+        scheduler.reschedule()
+
     # Display a message indicating the settings have been applied
     print("Settings have been applied.")
-    print(f"Current Settings: {settings}")
+    print(f"Current Settings: {printable_settings()}")
 
-def send_test_email():
+def send_test_email(status_var=None):
     """Send a test email using the current SMTP settings."""
+    def report(message):
+        print(message)
+        # The status label belongs to Tk: hand the update to the main loop
+        if status_var is not None and gui_bridge is not None:
+            gui_bridge.post_latest('test-email-status', status_var.set, message)
+
     def email_thread():
         try:
-            print("Sending test email...")
+            report("Sending test email...")
             send_email(
                 subject=f"Test Email from {socket.gethostname()}",
                 body="This is a test email to verify the SMTP settings."
             )
-            print("Test email sent successfully.")
+            report("Test email sent successfully.")
         except Exception as e:
-            print(f"Failed to send test email: {e}")
+            report(f"Failed to send test email: {e}")
     
     # Run the email sending in a separate thread to avoid freezing the GUI
     threading.Thread(target=email_thread).start()
+    if gui_bridge is not None:
+        gui_bridge.expect()
 
-def monitor_drive_space():
-    """Monitor the free space of each drive and send an alert if below the threshold."""
-    def email_thread(drive_letter, free_space_gb):
-        try:
-            print(f"Sending email alert for drive {drive_letter} with free space: {free_space_gb:.2f} GB")
-            send_drive_space_alert(drive_letter, free_space_gb)
-        except Exception as e:
-            print(f"Failed to send email alert for drive space: {e}")
-    
-    for partition in psutil.disk_partitions():
-        try:
-            usage = psutil.disk_usage(partition.mountpoint)
-            free_space_gb = usage.free / (1024 ** 3)  # Convert bytes to GB
-            
-            # Get thresholds from settings
-            normalized_drive = partition.device.strip('\\')
-            min_threshold = settings.get(f'drive_{normalized_drive}_min_threshold', 10)  # Default threshold to 10GB
-            
-            # Check if the free space is below the threshold
-            if free_space_gb < min_threshold:
-                threading.Thread(target=email_thread, args=(normalized_drive, free_space_gb)).start()
-        except PermissionError:
-            print(f"Permission denied for {partition.device}")
-            
-def get_gpu_usage():
-    """Fetch the current GPU usage using GPUtil."""
-    gpus = GPUtil.getGPUs()
-    if gpus:
-        return gpus[0].load * 100  # GPU load is a fraction, convert to percentage
-    else:
-        return 0  # No GPU found
-
-# Insert this after the monitor_drive_space function
-def monitor_thresholds():
-    """Monitor system thresholds like CPU, RAM, GPU, Disk, and Network usage and send alerts if thresholds are exceeded."""
-    exceeded_params = []
-
-    # Monitor CPU usage
-    cpu_usage = psutil.cpu_percent(interval=1)
-    if cpu_usage > settings['cpu_max_threshold']:
-        exceeded_params.append(f"CPU Usage ({cpu_usage}%) exceeded threshold ({settings['cpu_max_threshold']}%)")
-
-    # Monitor RAM usage
-    ram_usage = psutil.virtual_memory().percent
-    if ram_usage > settings['ram_max_threshold']:
-        exceeded_params.append(f"RAM Usage ({ram_usage}%) exceeded threshold ({settings['ram_max_threshold']}%)")
-
-    # Monitor GPU usage
-    gpu_usage = get_gpu_usage()
-    if gpu_usage > settings['gpu_max_threshold']:
-        exceeded_params.append(f"GPU Usage ({gpu_usage}%) exceeded threshold ({settings['gpu_max_threshold']}%)")
-
-    # Monitor Disk usage
-    for partition in psutil.disk_partitions():
-        try:
-            usage = psutil.disk_usage(partition.mountpoint)
-            disk_usage = (usage.used / usage.total) * 100  # Get disk usage as percentage
-            if disk_usage > settings['disk_max_threshold']:
-                exceeded_params.append(f"Disk Usage ({disk_usage:.2f}%) on {partition.device} exceeded threshold ({settings['disk_max_threshold']}%)")
-        except PermissionError:
-            print(f"Permission denied for {partition.device}")
-
-    # Monitor Network usage
-    network_io = psutil.net_io_counters()
-    network_in_cumulative = (network_io.bytes_recv / (1024 * 1024))  # Convert to MB
-    network_out_cumulative = (network_io.bytes_sent / (1024 * 1024))  # Convert to MB
+# Queue carrying results from background threads to the Tk main loop, created by setup_gui
+gui_bridge = None
 
-    # Check upload and download against thresholds
-    if network_out_cumulative > settings['network_upload_max_threshold']:
-        exceeded_params.append(f"Network Upload ({network_out_cumulative:.2f} MB) exceeded threshold ({settings['network_upload_max_threshold']} MB)")
+# Single thread running every periodic job (sampling, checks, drive polling), created by setup_gui
+scheduler = None
 
-    if network_in_cumulative > settings['network_download_max_threshold']:
-        exceeded_params.append(f"Network Download ({network_in_cumulative:.2f} MB) exceeded threshold ({settings['network_download_max_threshold']} MB)")
+# Threshold entries of the plugin metrics in the Settings tab: (plugin name, option) -> Entry
+plugin_threshold_entries = {}
 
-    # Send alert if any thresholds are exceeded
-    if exceeded_params:
-        exceeded_params_str = "\n".join(exceeded_params)
-        print("Sending threshold exceedance alert...")
-        send_threshold_alert(exceeded_params_str)
+# Sampling interval while the window is minimized, when nobody looks at the graphs
+IDLE_SAMPLE_INTERVAL = 60
 
+# Seconds between two polls of the drives, while the Drives tab is shown and otherwise
+DRIVE_POLL_INTERVAL = 10
+HIDDEN_DRIVE_POLL_INTERVAL = 300
 
-def start_monitoring(root):
-    """Start the periodic monitoring process."""
-    monitor_drive_space()  # Check drive space
-    monitor_thresholds()    # Check CPU, RAM, and GPU thresholds
-    # Call other monitoring functions as needed, e.g., monitor_thresholds()
-
-    # Schedule next check (e.g., every minute)
-    root.after(60 * 1000, start_monitoring, root)  # Pass `root` as an argument
+def get_refresh_rate():
+    try:
+        return int(settings['refresh_rate'])  # Use the applied refresh rate from settings
+    except (ValueError, TypeError):
+        return 60  # Fallback default if parsing fails
 
 def setup_gui():
     global refresh_rate_entry, smtp_entry, port_entry, username_entry, password_entry, recipient_entry
-    global interval_entry, send_on_threshold_var
+    global interval_entry, send_on_threshold_var, digest_mode_var, digest_window_entry, attachment_window_entry
+    global smtp_enabled_var, webhook_entry, syslog_entry, jsonl_entry
+    global anomaly_var, anomaly_threshold_entry
     global cpu_slider, ram_slider, disk_slider
     global network_upload_entry, network_download_entry
-    global drive_sliders, drive_checkboxes  # Adding variables for drive sliders and checkboxes
-    global drive_tab  # Make sure drive_tab is accessible
     
     # Load settings from the config file
     load_settings()
@@ -629,20 +962,40 @@ def setup_gui():
     root.title("System Monitoring Tool")
     root.geometry("800x600")  # Adjusted the default window size to make it more compact
 
+    # Background threads never touch Tk: they post to this queue, drained by the main loop
+    global gui_bridge, scheduler
+    gui_bridge = TkBridge(root)
+    gui_bridge.start()
+    scheduler = Scheduler()
+
     # Create notebook for tabs
     notebook = ttk.Notebook(root)
     main_tab = ttk.Frame(notebook)
     network_tab = ttk.Frame(notebook)  # New Network Tab
+    history_tab = ttk.Frame(notebook)
     settings_tab = ttk.Frame(notebook)
-    drive_tab = ttk.Frame(notebook)  # Define the drive_tab variable here
+    drive_tab = ttk.Frame(notebook)
 
     notebook.add(main_tab, text="Main")
     notebook.add(network_tab, text="Network")  # Add the new Network Tab
+    notebook.add(history_tab, text="History")
     notebook.add(settings_tab, text="Settings")
-    """
     notebook.add(drive_tab, text="Drives")  # Add Drive Tab
-    
-    """
+    # Central instance: receive the agents' samples and show the Fleet tab
+    fleet_tab = None
+    if settings['listen_address']:
+        fleet_tab = ttk.Frame(notebook)
+        notebook.add(fleet_tab, text="Fleet")
+    # Plugin collectors switched on in config.ini, a graph tab each; only imported when enabled
+    loaded_plugins = []
+    if enabled_plugins():
+        import plugins
+        loaded_plugins = plugins.load_enabled()
+    plugin_tabs = []
+    for plugin in loaded_plugins:
+        plugin_tab = ttk.Frame(notebook)
+        notebook.add(plugin_tab, text=plugin.title)
+        plugin_tabs.append((plugin, plugin_tab))
     notebook.pack(expand=True, fill='both')
 
     # Setup Main Tab for System Resources
@@ -650,52 +1003,30 @@ def setup_gui():
 
     # Setup Network Tab for Network Usage
     live_graph_network = LiveGraph(network_tab, plot_type="network")
-    
-    """
-    # Setup Drive Tab
-    drive_label = tk.Label(drive_tab, text="Drive Monitoring", font=("Arial", 14))
-    drive_label.pack(pady=10)
 
-    # Get available drives and create frames
-    partitions = psutil.disk_partitions()
-    drive_sliders = {}
-    drive_checkboxes = {}
+    # Setup the plugin tabs with the metrics each plugin declares
+    plugin_graphs = [(plugin, plugin_tab, LiveGraph(plugin_tab, plot_type="plugin", plugin=plugin))
+                     for plugin, plugin_tab in plugin_tabs]
+
+    # Setup History Tab to browse the stored CSV files
+    history_browser = HistoryBrowser(history_tab, gui_bridge)
 
-    for partition in partitions:
+    # Setup Drive Tab, refreshed by a background poller
+    drive_view = DriveView(drive_tab, gui_bridge)
+
+    # Setup Fleet Tab, fed by the aggregator as the agents' samples are stored
+    fleet_view = agent_server = host_monitor = None
+    if fleet_tab is not None:
+        from aggregator import Aggregator  # asyncio is only needed when agents connect
+        fleet_model = fleet.FleetModel(on_change=lambda: gui_bridge.post_latest('fleet-refresh', fleet_view.request_refresh))
+        fleet_view = FleetView(fleet_tab, fleet_model)
+        host_monitor = monitoring.HostMonitor()
+        agent_server = Aggregator(settings['listen_address'], [host_monitor, fleet_model])
         try:
-            usage = psutil.disk_usage(partition.mountpoint)
-            drive_info = {
-                'total': usage.total // (1024 ** 3),  # Convert to GB
-            }
-
-            # Create a frame for each drive
-            frame = tk.Frame(drive_tab)
-            frame.pack(pady=5, fill="x")
-
-            # Checkbox to enable/disable monitoring for this drive
-            drive_var = tk.IntVar(value=1)  # 1 means enabled by default
-            drive_checkboxes[partition.device] = drive_var
-            checkbox = tk.Checkbutton(frame, text=f"Monitor {partition.device} ({drive_info['total']} GB total)", variable=drive_var)
-            checkbox.pack(side="left")
-
-            # Sliders for min/max threshold for this drive
-            min_label = tk.StringVar()
-            max_label = tk.StringVar()
-            drive_slider = RangeSlider(frame, 0, 100, 10, 90, min_label, max_label, unit='%', width=300, height=50)  # Default values
-            drive_slider.pack(side="left")
-            drive_sliders[partition.device] = drive_slider
-
-            # Display slider values
-            min_display = tk.Label(frame, textvariable=min_label, width=10)
-            min_display.pack(side="left")
-            max_display = tk.Label(frame, textvariable=max_label, width=10)
-            max_display.pack(side="left")
-
-        except PermissionError:
-            # Handle access restrictions
-            print(f"Permission denied for {partition.device}")
-    
-    """
+            agent_server.start()
+        except (OSError, ValueError) as e:
+            print(f"Cannot receive agents on {settings['listen_address']}: {e}")
+            agent_server = None
 
     # Setup Settings Tab
     settings_label = tk.Label(settings_tab, text="Settings", font=("Arial", 14))
@@ -749,9 +1080,55 @@ def setup_gui():
     send_on_threshold_checkbox = tk.Checkbutton(email_interval_frame, text="Send email if a value is outside of threshold for 3 consecutive minutes", variable=send_on_threshold_var)
     send_on_threshold_checkbox.pack(anchor="w")
 
+    # Alert digest: coalesce all breaches of a window into one summary email
+    digest_mode_var = tk.IntVar(value=settings['digest_mode'])
+    digest_mode_checkbox = tk.Checkbutton(email_interval_frame, text="Group alerts into a single digest email per window", variable=digest_mode_var)
+    digest_mode_checkbox.pack(anchor="w")
+
+    digest_window_label = tk.Label(email_interval_frame, text="Digest Window (seconds):")
+    digest_window_label.pack(anchor="w")
+    digest_window_entry = tk.Entry(email_interval_frame)
+    digest_window_entry.pack(fill="x")
+    digest_window_entry.insert(0, str(settings['digest_window']))  # Insert saved value
+
+    attachment_window_label = tk.Label(email_interval_frame, text="History Attached to Alerts (minutes):")
+    attachment_window_label.pack(anchor="w")
+    attachment_window_entry = tk.Entry(email_interval_frame)
+    attachment_window_entry.pack(fill="x")
+    attachment_window_entry.insert(0, str(settings['attachment_window']))  # Insert saved value
+
+    # Notification Channels, all enabled channels are notified concurrently
+    channels_frame = tk.LabelFrame(settings_tab, text="Notification Channels", padx=10, pady=10)
+    channels_frame.pack(padx=10, pady=10, fill="x")
+
+    smtp_enabled_var = tk.IntVar(value=settings['smtp_enabled'])  # Set saved value
+    smtp_enabled_checkbox = tk.Checkbutton(channels_frame, text="Send alerts by email", variable=smtp_enabled_var)
+    smtp_enabled_checkbox.pack(anchor="w")
+
+    webhook_label = tk.Label(channels_frame, text="Webhook URL (HTTP POST):")
+    webhook_label.pack(anchor="w")
+    webhook_entry = tk.Entry(channels_frame)
+    webhook_entry.pack(fill="x")
+    webhook_entry.insert(0, settings['webhook_url'])  # Insert saved value
+
+    syslog_label = tk.Label(channels_frame, text="Syslog Address (host:port or socket path):")
+    syslog_label.pack(anchor="w")
+    syslog_entry = tk.Entry(channels_frame)
+    syslog_entry.pack(fill="x")
+    syslog_entry.insert(0, settings['syslog_address'])  # Insert saved value
+
+    jsonl_label = tk.Label(channels_frame, text="Alert Log File (JSON lines):")
+    jsonl_label.pack(anchor="w")
+    jsonl_entry = tk.Entry(channels_frame)
+    jsonl_entry.pack(fill="x")
+    jsonl_entry.insert(0, settings['jsonl_path'])  # Insert saved value
+
     # Send Test Email Button
-    test_email_button = tk.Button(settings_tab, text="Send Test Email", command=send_test_email)
+    test_email_status = tk.StringVar()
+    test_email_button = tk.Button(settings_tab, text="Send Test Email", command=lambda: send_test_email(test_email_status))
     test_email_button.pack(pady=5)
+    test_email_label = tk.Label(settings_tab, textvariable=test_email_status)
+    test_email_label.pack()
 
     # Threshold Settings
     threshold_frame = tk.LabelFrame(settings_tab, text="Threshold Settings", padx=10, pady=10)
@@ -817,6 +1194,39 @@ def setup_gui():
     network_download_entry.pack(side="left")
     network_download_entry.insert(0, str(settings['network_download_max_threshold']))
 
+    # Anomaly Detection (alerts on values far from the learned baseline)
+    anomaly_frame = tk.Frame(threshold_frame)
+    anomaly_frame.pack(pady=5, fill="x")
+    anomaly_label = tk.Label(anomaly_frame, text="Anomaly Detection:")
+    anomaly_label.pack(side="left")
+    anomaly_var = tk.StringVar(value=settings['anomaly_detection'])  # Set saved value
+    anomaly_menu = tk.OptionMenu(anomaly_frame, anomaly_var, 'off', *sorted(anomaly.DETECTORS))
+    anomaly_menu.pack(side="left")
+    anomaly_threshold_label = tk.Label(anomaly_frame, text="Score Threshold:")
+    anomaly_threshold_label.pack(side="left", padx=(10, 0))
+    anomaly_threshold_entry = tk.Entry(anomaly_frame, width=10)
+    anomaly_threshold_entry.pack(side="left")
+    anomaly_threshold_entry.insert(0, str(settings['anomaly_threshold']))
+
+    # Thresholds of the plugin metrics, the declared ones until changed here
+    plugin_threshold_entries.clear()
+    for plugin in loaded_plugins:
+        for key, spec in plugin.metrics.items():
+            plugin_frame = tk.Frame(threshold_frame)
+            plugin_frame.pack(pady=5, fill="x")
+            unit = f" ({spec['unit']})" if spec['unit'] else ""
+            plugin_label = tk.Label(plugin_frame, text=f"{spec['label']} Threshold{unit}:")
+            plugin_label.pack(side="left")
+            for bound in ('min', 'max'):
+                bound_label = tk.Label(plugin_frame, text=f"{bound.capitalize()}:")
+                bound_label.pack(side="left", padx=(10, 0))
+                bound_entry = tk.Entry(plugin_frame, width=10)
+                bound_entry.pack(side="left")
+                threshold = plugin.threshold(key, bound)
+                if threshold is not None:
+                    bound_entry.insert(0, f"{threshold:g}")
+                plugin_threshold_entries[(plugin.name, f'{key}_{bound}_threshold')] = bound_entry
+
     # Monitoring Refresh Rate - Moved to the bottom of the settings tab
     refresh_rate_frame = tk.LabelFrame(settings_tab, text="Monitoring Refresh Rate", padx=10, pady=10)
     refresh_rate_frame.pack(padx=10, pady=10, fill="x")
@@ -831,26 +1241,137 @@ def setup_gui():
     apply_button = tk.Button(settings_tab, text="Apply Settings", command=apply_settings)
     apply_button.pack(pady=10)
 
-    # Function to update the graphs based on the refresh rate
-    def update_graph():
-        live_graph_system.update_plot(None)
-        live_graph_network.update_plot(None)
+    # Only the graph of the selected tab is drawn, and nothing while the window is minimized
+    graph_tabs = {str(main_tab): live_graph_system, str(network_tab): live_graph_network}
+    visible_tabs = dict(graph_tabs)
+    visible_tabs[str(history_tab)] = history_browser
+    visible_tabs[str(drive_tab)] = drive_view
+    for plugin, plugin_tab, graph in plugin_graphs:
+        visible_tabs[str(plugin_tab)] = graph
+    if fleet_view is not None:
+        visible_tabs[str(fleet_tab)] = fleet_view
+
+    def update_graph_visibility(event=None):
+        minimized = root.state() in ('iconic', 'withdrawn')
+        selected = notebook.select()
+        for tab, view in visible_tabs.items():
+            view.set_visible(not minimized and tab == selected)
+        # Minimized: background mode with fewer samples and GUI queue polls
+        scheduler.set_idle(minimized)
+        gui_bridge.set_idle(minimized)
+        if not minimized and selected == str(drive_tab):
+            scheduler.trigger('drives')
+
+    def on_window_map_change(event):
+        if event.widget is root:
+            update_graph_visibility()
+
+    notebook.bind("<<NotebookTabChanged>>", update_graph_visibility)
+    root.bind("<Map>", on_window_map_change)
+    root.bind("<Unmap>", on_window_map_change)
+    update_graph_visibility()
+
+    # History window selectors under each graph
+    for tab, graph in [(main_tab, live_graph_system), (network_tab, live_graph_network)] + [entry[1:] for entry in plugin_graphs]:
+        window_frame = tk.Frame(tab)
+        window_frame.pack(fill="x")
+        window_label = tk.Label(window_frame, text="History:")
+        window_label.pack(side="left", padx=(10, 0))
+        window_var = tk.StringVar(value=DEFAULT_HISTORY_WINDOW)
+        window_menu = tk.OptionMenu(window_frame, window_var, *HISTORY_WINDOWS, command=graph.set_window)
+        window_menu.pack(side="left")
+
+    # Status bar showing the last sample and how long results wait before the GUI picks them up
+    status_var = tk.StringVar(value="Waiting for the first sample...")
+    status_label = tk.Label(root, textvariable=status_var, anchor="w")
+    status_label.pack(side="bottom", fill="x")
+
+    # Runs on the Tk thread for every sample collected by the scheduler
+    def update_graphs(samples):
+        for graph in graph_tabs.values():
+            graph.add_samples(samples)
+        sample = samples[-1]
+        stats = gui_bridge.stats()
+        status_var.set(
+            f"Last sample: {sample['time']}  |  Queue latency: {stats['latency_avg_ms']:.1f} ms average, "
+            f"{stats['latency_max_ms']:.1f} ms max  |  Wakeups: {wakeups.per_minute()}/min"
+            + (f"  |  Stale: {', '.join(name.upper() for name in sample['stale'])}" if sample['stale'] else "")
+        )
+
+    # Optional /metrics endpoint, rendered on the scheduler thread like the drive polls it reads
+    status_server = None
+    if settings['http_address']:
+        status_server = StatusServer(settings['http_address'], lambda: drive_view.poller.drives.values())
         try:
-            refresh_rate = settings['refresh_rate']  # Use the applied refresh rate from settings
-        except ValueError:
-            refresh_rate = 60  # Fallback default if parsing fails
-        root.after(refresh_rate * 1000, update_graph)  # Convert to milliseconds
-
-    update_graph()
-
-    # Start monitoring process
-    start_monitoring(root)
+            status_server.start()
+        except (OSError, ValueError) as e:
+            print(f"Cannot serve metrics on {settings['http_address']}: {e}")
+            status_server = None
+
+    # Latest sample in shared memory for local tools, published from the scheduler thread too
+    publisher = None
+    if settings['shared_memory']:
+        from shared_snapshot import SnapshotPublisher
+        try:
+            publisher = SnapshotPublisher(settings['shared_memory'])
+        except OSError as e:
+            print(f"Cannot publish the latest sample as {settings['shared_memory']!r}: {e}")
+
+    def on_sample(sample):
+        gui_bridge.post_batch('samples', update_graphs, sample)
+        if status_server is not None:
+            status_server.update(sample)
+        if publisher is not None:
+            publisher.publish(sample)
+
+    # All periodic work runs from the scheduler; aligned intervals share their wakeups
+    # One sampler feeds every graph, so each refresh writes a single CSV row
+    scheduler.add('sampling', SamplingJob(on_sample),
+                  get_refresh_rate, lambda: max(get_refresh_rate(), IDLE_SAMPLE_INTERVAL))
+    # Check drive space, then CPU, RAM, GPU, disk and network thresholds
+    scheduler.add('checks', run_checks, monitoring.CHECK_INTERVAL)
+    if agent_server is not None:
+        scheduler.add('agent-checks', host_monitor.run_checks, monitoring.CHECK_INTERVAL)
+    # Per-container metrics from the cgroup v2 files, stored and checked like this machine's
+    if settings['container_monitoring'] == 'on':
+        import cgroups
+        if cgroups.is_cgroup2(settings['cgroup_root']):
+            container_monitor = monitoring.HostMonitor()
+            scheduler.add('containers', cgroups.ContainerJob(settings['cgroup_root'], container_monitor), get_refresh_rate)
+            scheduler.add('container-checks', container_monitor.run_checks, monitoring.CHECK_INTERVAL)
+        else:
+            print(f"No cgroup v2 hierarchy at {settings['cgroup_root']}, container monitoring disabled.")
+    # Plugin collectors: sampled like the main graphs, stored in their own files and checked with the thresholds
+    for plugin, plugin_tab, graph in plugin_graphs:
+        scheduler.add(f'plugin-{plugin.name}', plugins.PluginJob(plugin, lambda sample, graph=graph: gui_bridge.post_batch(graph, graph.add_samples, sample)),
+                      get_refresh_rate, lambda: max(get_refresh_rate(), IDLE_SAMPLE_INTERVAL))
+        monitoring.extra_checks.append(plugin.breaches)
+    scheduler.add('drives', drive_view.poller.poll,
+                  lambda: DRIVE_POLL_INTERVAL if drive_view.visible else HIDDEN_DRIVE_POLL_INTERVAL,
+                  HIDDEN_DRIVE_POLL_INTERVAL)
+    scheduler.start()
 
     # Start the GUI main loop
     root.mainloop()
 
+    scheduler.stop()
+    history_browser.stop()
+    drive_view.stop()
+    gui_bridge.stop()
+    if status_server is not None:
+        status_server.stop()
+    if agent_server is not None:
+        agent_server.stop()
+    if publisher is not None:
+        publisher.close()
+    if loaded_plugins:
+        scheduler.join(timeout=5)  # No job may still be collecting from a plugin it closes
+        for plugin in loaded_plugins:
+            plugin.close()
+
+    stop_slow_collectors()
+    # Send any alerts still waiting in an open digest window
+    monitoring.shutdown()
+
 if __name__ == "__main__":
-    check_and_install_dependencies()
     setup_gui()
-
-
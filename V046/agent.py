@@ -0,0 +1,232 @@
+import sys
+import time
+import random
+import select
+import signal
+import socket
+import argparse
+import threading
+from collections import deque
+
+import gorilla
+import protocol
+from sampler import Sampler, stop_slow_collectors
+
+# Longest wait between two connection attempts while the aggregator is unreachable
+MAX_RETRY_DELAY = 60
+
+# Buffered samples are compressed in blocks of up to this many samples
+BLOCK_SAMPLES = 600
+
+class SampleBlock:
+    """Consecutive buffered samples, compressed as they are added.
+
+    The raw samples are kept only while the block is open, to send the newest ones as they
+    come; a closed block keeps nothing but its compressed bytes, sent as is in a BLOCK frame.
+    """
+
+    def __init__(self, first_sequence):
+        self.first_sequence = first_sequence
+        self.count = 0
+        self.encoder = gorilla.BlockEncoder(len(protocol.SAMPLE_FIELDS))
+        self.samples = []
+        self.data = None
+
+    @property
+    def last_sequence(self):
+        return self.first_sequence + self.count - 1
+
+    def add(self, sample):
+        self.encoder.append(sample['timestamp'], [sample[field] for field in protocol.SAMPLE_FIELDS])
+        self.samples.append(sample)
+        self.count += 1
+
+    def close(self):
+        self.data = self.encoder.finish()
+        self.encoder = None
+        self.samples = None
+
+def encode_pending(first_sequence, samples):
+    """Frame samples of an open block: compressed, unless a lone sample is smaller as a plain record."""
+    if len(samples) == 1:
+        return protocol.encode_samples(first_sequence, samples)
+    encoder = gorilla.BlockEncoder(len(protocol.SAMPLE_FIELDS))
+    for sample in samples:
+        encoder.append(sample['timestamp'], [sample[field] for field in protocol.SAMPLE_FIELDS])
+    return protocol.encode_block(first_sequence, len(samples), encoder.finish())
+
+class Agent:
+    """Sample this machine and stream the samples to an aggregator, buffering them while it is unreachable.
+
+    Samples keep a sequence number and stay in the buffer until the aggregator acknowledges
+    them, so nothing is lost over a reconnection; a full buffer drops the oldest samples.
+    The buffer holds Gorilla-compressed blocks (see gorilla.py): hours of samples at a one
+    second interval take a few MB.
+    """
+
+    def __init__(self, server, interval=10, buffer_size=8640, batch=1, publisher=None):
+        self.is_unix, self.address = protocol.parse_address(server)
+        self.interval = interval
+        self.buffer_size = buffer_size
+        # Dropping the oldest block of a full buffer loses at most a tenth of it
+        self.block_samples = max(1, min(BLOCK_SAMPLES, buffer_size // 10))
+        self.batch = batch  # Samples sent together once connected, compressed when more than one
+        self.publisher = publisher  # shared_snapshot.SnapshotPublisher for local tools, or None
+        self.blocks = deque()  # SampleBlock not acknowledged yet, the last one open
+        self.buffered = 0
+        self.next_sequence = 1
+        self.sent_sequence = 0  # Last sequence number sent on the current connection
+        self.dropped = 0
+        self.host = socket.gethostname()
+        self.session = random.getrandbits(63)  # Sequence numbers restart with every agent run
+        self.sock = None
+        self.reader = None
+        self.retry_delay = 1
+        self.next_attempt = 0
+        self.stop_event = threading.Event()
+
+    def connect(self):
+        family = socket.AF_UNIX if self.is_unix else socket.AF_INET
+        if not self.is_unix and ':' in self.address[0]:
+            family = socket.AF_INET6
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(5)
+        try:
+            sock.connect(self.address)
+            sock.sendall(protocol.encode_hello(self.host, self.session))
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.reader = protocol.FrameReader()
+        # Everything not acknowledged is sent again, the aggregator skips what it already stored
+        self.sent_sequence = self.blocks[0].first_sequence - 1 if self.blocks else self.next_sequence - 1
+        self.retry_delay = 1
+        print(f"Connected to the aggregator, {self.buffered} buffered samples to send.")
+
+    def disconnect(self, reason):
+        print(f"Aggregator connection lost: {reason}. Buffering samples, next attempt in {self.retry_delay} s.")
+        self.sock.close()
+        self.sock = None
+        self.next_attempt = time.monotonic() + self.retry_delay
+        self.retry_delay = min(self.retry_delay * 2, MAX_RETRY_DELAY)
+
+    def add(self, sample):
+        if not self.blocks or self.blocks[-1].data is not None:
+            self.blocks.append(SampleBlock(self.next_sequence))
+        block = self.blocks[-1]
+        block.add(sample)
+        if block.count == self.block_samples:
+            block.close()
+        self.buffered += 1
+        self.next_sequence += 1
+        while self.buffered > self.buffer_size:
+            oldest = self.blocks.popleft()
+            self.buffered -= oldest.count
+            self.dropped += oldest.count
+
+    def read_acks(self):
+        """Drop the acknowledged samples from the buffer, without waiting for ACKs not received yet."""
+        while select.select([self.sock], [], [], 0)[0]:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError("closed by the aggregator")
+            for frame_type, payload in self.reader.feed(data):
+                if frame_type != protocol.ACK:
+                    raise protocol.ProtocolError(f"Unexpected frame type {frame_type}")
+                acknowledged = protocol.decode_ack(payload)
+                # Blocks go whole: one acknowledged in part is sent again in full after a reconnection
+                while self.blocks and self.blocks[0].last_sequence <= acknowledged:
+                    self.buffered -= self.blocks.popleft().count
+
+    def send_pending(self):
+        """Send the buffered samples not sent on this connection yet, a frame per block."""
+        for block in self.blocks:
+            if block.last_sequence <= self.sent_sequence:
+                continue
+            if block.data is not None:
+                self.sock.sendall(protocol.encode_block(block.first_sequence, block.count, block.data))
+            else:
+                skip = max(self.sent_sequence - block.first_sequence + 1, 0)
+                if block.count - skip < self.batch:
+                    break
+                self.sock.sendall(encode_pending(block.first_sequence + skip, block.samples[skip:]))
+            self.sent_sequence = block.last_sequence
+
+    def flush(self):
+        if self.sock is None:
+            if time.monotonic() < self.next_attempt:
+                return
+            try:
+                self.connect()
+            except OSError as e:
+                print(f"Cannot reach the aggregator: {e}. Next attempt in {self.retry_delay} s.")
+                self.next_attempt = time.monotonic() + self.retry_delay
+                self.retry_delay = min(self.retry_delay * 2, MAX_RETRY_DELAY)
+                return
+        try:
+            self.read_acks()
+            self.send_pending()
+        except (OSError, protocol.ProtocolError) as e:
+            self.disconnect(e)
+
+    def run(self):
+        # Created here so WMI is initialized on the thread that uses it; nothing is logged locally
+        sampler = Sampler(log_to_csv=False)
+        print(f"Streaming samples every {self.interval} s to the aggregator as {self.host}.")
+        while not self.stop_event.is_set():
+            sample = sampler.snapshot()
+            if self.publisher is not None:
+                self.publisher.publish(sample)
+            self.add(sample)
+            self.flush()
+            if self.dropped:
+                print(f"Buffer full, dropped the {self.dropped} oldest samples.")
+                self.dropped = 0
+            # Sample on wall-clock multiples of the interval, like the scheduler
+            now = time.time()
+            self.stop_event.wait((now // self.interval + 1) * self.interval - now)
+        if self.sock is not None:
+            self.sock.close()
+        stop_slow_collectors()
+
+    def stop(self):
+        self.stop_event.set()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream this machine's samples to a PySentinel aggregator.")
+    parser.add_argument('--server', required=True, help="Aggregator address: host:port or unix:/path/to/socket")
+    parser.add_argument('--interval', type=int, default=10, help="Seconds between two samples")
+    parser.add_argument('--buffer', type=int, default=8640, help="Samples kept while the aggregator is unreachable (compressed, about 30 bytes each)")
+    parser.add_argument('--batch', type=int, default=1, help="Samples sent together in one compressed frame")
+    parser.add_argument('--shared-memory', default='', help="Publish the latest sample to local tools in this shared memory segment (e.g. pysentinel)")
+    args = parser.parse_args(argv)
+    if args.interval < 1 or args.buffer < 1 or not 1 <= args.batch <= BLOCK_SAMPLES:
+        parser.error(f"--interval and --buffer must be positive, --batch between 1 and {BLOCK_SAMPLES}")
+
+    publisher = None
+    if args.shared_memory:
+        from shared_snapshot import SnapshotPublisher
+        try:
+            publisher = SnapshotPublisher(args.shared_memory)
+        except OSError as e:
+            print(f"Cannot publish the latest sample as {args.shared_memory!r}: {e}")
+
+    agent = Agent(args.server, args.interval, args.buffer, args.batch, publisher)
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, shutting down...")
+        agent.stop()
+
+    for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), request_stop)
+
+    agent.run()
+    if publisher is not None:
+        publisher.close()
+    print(f"Agent stopped, {agent.buffered} samples were not acknowledged.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+import re
+import sys
+import time
+import zlib
+import queue
+import signal
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+import protocol
+
+# Samples are handed to storage in bulk once per FLUSH_INTERVAL seconds,
+# or sooner when FLUSH_SAMPLES samples are waiting
+FLUSH_INTERVAL = 1.0
+FLUSH_SAMPLES = 50000
+
+# Connections stop being read while this many samples wait for storage
+MAX_PENDING_SAMPLES = 500000
+
+# Pending connections the listener accepts, for a whole fleet reconnecting after a restart
+LISTEN_BACKLOG = 4096
+
+# Seconds a session's last sequence number is kept once it has no connection and nothing batched.
+# Agents retry at least every minute; one coming back later only resends what was never acknowledged.
+SESSION_GRACE = 600
+
+COLUMNS = ('timestamp',) + protocol.SAMPLE_FIELDS
+
+def safe_host_name(host):
+    """Make a host name sent by an agent usable in the CSV file names."""
+    host = re.sub(r'[^A-Za-z0-9._-]', '_', host.strip())[:255]
+    if host.strip('.') == '':
+        raise protocol.ProtocolError(f"Invalid host name {host!r}")
+    return host
+
+class ColumnBatch:
+    """Samples of one agent session waiting for storage, one list per column."""
+
+    def __init__(self, first_sequence):
+        self.first_sequence = first_sequence
+        self.columns = {key: [] for key in COLUMNS}
+        self.count = 0
+        self.acks = []  # (writer, sequence number) to acknowledge once stored
+
+    def extend(self, columns, skip):
+        for key in COLUMNS:
+            self.columns[key].extend(columns[key][skip:])
+        self.count += len(columns['timestamp']) - skip
+
+    def totals(self):
+        """Summarize the batch for the alert checks: (sums of the usage keys, count, last sample)."""
+        sums = {key: sum(self.columns[key]) for key in ('cpu', 'ram', 'gpu')}
+        last = {key: self.columns[key][-1] for key in COLUMNS}
+        return sums, self.count, last
+
+def write_batches(batches):
+    """Store the batches (on the storage thread) and return the keys of those that failed."""
+    failed = []
+    for (host, session), batch in batches.items():
+        try:
+            storage.append_columns(batch.columns, machine_name=host)
+        except OSError as e:
+            print(f"Cannot store {batch.count} samples of {host}: {e}")
+            failed.append((host, session))
+    return failed
+
+class Aggregator:
+    """Receive the agents' samples on one asyncio event loop, without a thread per connection.
+
+    Frames are decoded into columns and appended to per-session batches; a flush task hands
+    all the batches to storage at once on a single worker thread, then acknowledges them and
+    passes per-host totals to its consumers: the alert checks (a monitoring.HostMonitor or
+    AlertShards) and, in the GUI, the fleet overview (fleet.FleetModel).
+    """
+
+    def __init__(self, listen, consumers=(), flush_interval=FLUSH_INTERVAL):
+        self.listen = listen
+        self.consumers = list(consumers)  # Objects with observe_totals({host: (sums, count, last sample)})
+        self.flush_interval = flush_interval
+        self.sequences = {}  # (host, session) -> last sequence number accepted
+        self.batches = {}  # (host, session) -> ColumnBatch
+        self.session_connections = {}  # (host, session) -> open connections
+        self.idle_sessions = {}  # (host, session) -> monotonic time its last connection closed
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aggregator-storage")
+        self.thread = None
+        self.loop = None
+        self.started = threading.Event()
+        self.error = None
+
+        # Ingest statistics
+        self.connections = 0
+        self.received = 0
+        self.stored = 0
+
+    def start(self):
+        """Run the event loop in a background thread; raises if the address cannot be bound."""
+        self.thread = threading.Thread(target=self.run, name="aggregator", daemon=True)
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+        print(f"Aggregator listening on {self.listen}.")
+
+    def stop(self):
+        """Close the listener, store what is still batched and stop the event loop."""
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.stopping.set)
+            self.thread.join(timeout=10)
+        self.executor.shutdown(wait=True)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.error = e
+            self.started.set()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.flush_now = asyncio.Event()
+        self.room = asyncio.Event()  # Set while the pending samples are under MAX_PENDING_SAMPLES
+        self.room.set()
+
+        is_unix, address = protocol.parse_address(self.listen)
+        if is_unix:
+            if sys.platform == 'win32':
+                raise ValueError("Unix sockets are not supported on this platform")
+            server = await asyncio.start_unix_server(self.handle, address, backlog=LISTEN_BACKLOG)
+        else:
+            server = await asyncio.start_server(self.handle, address[0], address[1], reuse_address=True, backlog=LISTEN_BACKLOG)
+        flusher = asyncio.ensure_future(self.flush_loop())
+        flusher.add_done_callback(self.flusher_done)
+        self.started.set()
+
+        await self.stopping.wait()
+        server.close()
+        await server.wait_closed()
+        flusher.cancel()
+        await self.flush()
+
+    async def handle(self, reader, writer):
+        """One agent connection: a HELLO frame, then SAMPLES or BLOCK frames, each acknowledged once stored."""
+        frames = protocol.FrameReader()
+        host = session = key = None
+        peer = writer.get_extra_info('peername') or 'local socket'
+        self.connections += 1
+        try:
+            while True:
+                await self.room.wait()
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for frame_type, payload in frames.feed(data):
+                    if frame_type == protocol.HELLO:
+                        session, host = protocol.decode_hello(payload)
+                        host = safe_host_name(host)
+                        if key is not None:
+                            self.release_session(key)
+                        key = (host, session)
+                        self.session_connections[key] = self.session_connections.get(key, 0) + 1
+                        self.idle_sessions.pop(key, None)
+                    elif frame_type == protocol.SAMPLES:
+                        if host is None:
+                            raise protocol.ProtocolError("SAMPLES frame before HELLO")
+                        self.receive(host, session, writer, *protocol.decode_sample_columns(payload))
+                    elif frame_type == protocol.BLOCK:
+                        if host is None:
+                            raise protocol.ProtocolError("BLOCK frame before HELLO")
+                        self.receive(host, session, writer, *protocol.decode_block_columns(payload))
+                    else:
+                        raise protocol.ProtocolError(f"Unexpected frame type {frame_type}")
+        except (protocol.ProtocolError, OSError) as e:
+            print(f"Dropping agent connection from {host or peer}: {e}")
+        finally:
+            self.connections -= 1
+            if key is not None:
+                self.release_session(key)
+            writer.close()
+
+    def release_session(self, key):
+        count = self.session_connections.pop(key) - 1
+        if count:
+            self.session_connections[key] = count
+        else:
+            self.idle_sessions[key] = time.monotonic()
+
+    def expire_sessions(self):
+        """Forget the sequence numbers of the sessions idle for SESSION_GRACE: every agent run opens a new one."""
+        limit = time.monotonic() - SESSION_GRACE
+        for key, since in list(self.idle_sessions.items()):
+            if since < limit and key not in self.batches:
+                del self.idle_sessions[key]
+                self.sequences.pop(key, None)
+
+    def receive(self, host, session, writer, first_sequence, columns):
+        """Batch the samples not accepted yet; after a reconnection the agent resends what was not acknowledged."""
+        key = (host, session)
+        count = len(columns['timestamp'])
+        last_sequence = first_sequence + count - 1
+        accepted = self.sequences.get(key, 0)
+        skip = max(accepted - first_sequence + 1, 0)
+        if skip >= count:
+            writer.write(protocol.encode_ack(accepted))  # Nothing new: acknowledge right away
+            return
+        self.sequences[key] = last_sequence
+        batch = self.batches.get(key)
+        if batch is None:
+            batch = self.batches[key] = ColumnBatch(first_sequence + skip)
+        batch.extend(columns, skip)
+        batch.acks.append((writer, last_sequence))
+        self.received += count - skip
+        self.pending += count - skip
+        if self.pending >= FLUSH_SAMPLES:
+            self.flush_now.set()
+        if self.pending >= MAX_PENDING_SAMPLES:
+            self.room.clear()  # Storage is behind: stop reading until the next flush
+
+    def flusher_done(self, task):
+        """Report a flush task that ended other than by the shutdown: nothing is stored or acknowledged any more."""
+        if task.cancelled():
+            return
+        error = task.exception()
+        print(f"Aggregator flush task stopped unexpectedly: {type(error).__name__}: {error}" if error else
+              "Aggregator flush task stopped unexpectedly.")
+
+    async def flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_now.clear()
+            await self.flush()
+            self.expire_sessions()
+
+    async def flush(self):
+        """Store every batch in one call on the storage thread, then send the ACKs."""
+        batches, self.batches = self.batches, {}
+        self.pending = 0
+        if not batches:
+            self.room.set()
+            return
+        failed = await self.loop.run_in_executor(self.executor, write_batches, batches)
+        self.room.set()
+
+        totals = {}
+        for key, batch in batches.items():
+            if key in failed:
+                # Not acknowledged: accept these samples again and make the agents reconnect and resend them
+                self.sequences[key] = min(self.sequences[key], batch.first_sequence - 1)
+                for writer, sequence in batch.acks:
+                    writer.close()
+                continue
+            self.stored += batch.count
+            for writer, sequence in batch.acks:
+                if not writer.is_closing():
+                    writer.write(protocol.encode_ack(sequence))
+            host = key[0]
+            sums, count, last = batch.totals()
+            if host in totals:
+                previous_sums, previous_count, previous_last = totals[host]
+                sums = {metric: sums[metric] + previous_sums[metric] for metric in sums}
+                count += previous_count
+                last = max(last, previous_last, key=lambda sample: sample['timestamp'])
+            totals[host] = (sums, count, last)
+        if totals:
+            for consumer in self.consumers:
+                # The samples are stored and acknowledged already: a failing consumer must not stop the flushes
+                try:
+                    consumer.observe_totals(totals)
+                except Exception as e:
+                    print(f"Cannot pass the agents' totals to {type(consumer).__name__}: {type(e).__name__}: {e}")
+
+    def stats(self):
+        return {'connections': self.connections, 'received': self.received, 'stored': self.stored}
+
+def run_alert_shard(index, totals_queue, alerts_queue, interval):
+    """Worker process: threshold and anomaly checks for the hosts of one shard.
+
+    After every check run the shard's active alerts go back to the parent, which serves them over HTTP.
+    """
+    # The parent handles Ctrl+C and stops the shards through their queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import monitoring
+    from config_store import load_settings, get_settings
+    load_settings()
+    host_monitor = monitoring.HostMonitor(interval)
+    next_check = time.monotonic() + interval
+    while True:
+        try:
+            totals = totals_queue.get(timeout=max(next_check - time.monotonic(), 0))
+        except queue.Empty:
+            totals = {}
+        if totals is None:
+            break
+        host_monitor.observe_totals(totals)
+        if time.monotonic() >= next_check:
+            get_settings()  # Pick up edits of config.ini
+            host_monitor.run_checks()
+            alerts_queue.put((index, monitoring.get_active_alerts()))
+            next_check = max(next_check + interval, time.monotonic())
+    monitoring.shutdown()
+
+class AlertShards:
+    """Run the alert checks of the agents' hosts in worker processes, each host always in the same one.
+
+    A host's digest and anomaly baselines live in a single process, while the checks of a
+    large fleet use several cores. Workers are spawned, so they start clean on every platform.
+    Their active alerts are copied into this process's monitoring.active_alerts as they come.
+    """
+
+    def __init__(self, workers, interval):
+        context = multiprocessing.get_context('spawn')
+        self.queues = [context.Queue() for _ in range(workers)]
+        self.alerts_queue = context.Queue()
+        self.processes = [
+            context.Process(target=run_alert_shard, args=(index, totals_queue, self.alerts_queue, interval),
+                            name=f"alert-shard-{index}", daemon=True)
+            for index, totals_queue in enumerate(self.queues)
+        ]
+        for process in self.processes:
+            process.start()
+        self.alerts_thread = threading.Thread(target=self.receive_alerts, name="alert-shards", daemon=True)
+        self.alerts_thread.start()
+
+    def receive_alerts(self):
+        """Replace the active alerts of each shard's hosts with those of its latest check run."""
+        import monitoring
+        shard_hosts = [set() for _ in self.queues]
+        while True:
+            message = self.alerts_queue.get()
+            if message is None:
+                break
+            index, alerts = message
+            with monitoring.active_alerts_lock:
+                for host in shard_hosts[index] - set(alerts):
+                    monitoring.active_alerts.pop(host, None)
+                monitoring.active_alerts.update(alerts)
+            shard_hosts[index] = set(alerts)
+
+    def shard(self, host):
+        # crc32 rather than hash(): the same host must map to the same shard in every run
+        return zlib.crc32(host.encode('utf-8')) % len(self.queues)
+
+    def observe_totals(self, totals):
+        """Send each shard the totals of its hosts, one message per shard."""
+        by_shard = {}
+        for host, host_totals in totals.items():
+            by_shard.setdefault(self.shard(host), {})[host] = host_totals
+        for index, shard_totals in by_shard.items():
+            self.queues[index].put(shard_totals)
+
+    def stop(self):
+        """Stop the workers once they have sent their pending digests."""
+        for totals_queue in self.queues:
+            totals_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+        self.alerts_queue.put(None)
+        self.alerts_thread.join(timeout=5)
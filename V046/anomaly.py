@@ -0,0 +1,176 @@
+import sys
+import math
+import argparse
+from datetime import datetime, timedelta
+
+import storage
+
+# Metrics checked for anomalies and their sample key (storage.SAMPLE_COLUMNS), live and in the backtest
+ANOMALY_METRICS = {
+    'CPU Usage': 'cpu',
+    'RAM Usage': 'ram',
+    'GPU Usage': 'gpu',
+}
+
+def anomaly_values(sample):
+    """Return the {metric: value} a detector is fed from a sample, or from averages, keyed like storage.SAMPLE_COLUMNS."""
+    return {metric: sample[key] for metric, key in ANOMALY_METRICS.items()}
+
+class EwmaDetector:
+    """Flag values far from an exponentially weighted moving average, in units of its moving deviation."""
+
+    def __init__(self, alpha=0.05, threshold=3.0, warmup=30, min_std=1.0):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup  # Samples needed before anything is flagged
+        self.min_std = min_std  # Floor so a perfectly flat series does not flag tiny changes
+        self.mean = None
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, value, timestamp=None):
+        """Score a value against the baseline, then fold it in. Returns (is_anomaly, score, expected)."""
+        if self.mean is None:
+            self.mean = value
+            self.count = 1
+            return False, 0.0, value
+
+        expected = self.mean
+        score = abs(value - expected) / max(math.sqrt(self.var), self.min_std)
+        is_anomaly = self.count >= self.warmup and score > self.threshold
+
+        # Plain running average for the first samples, so the early deviation is not underestimated
+        alpha = max(self.alpha, 1.0 / (self.count + 1))
+        diff = value - self.mean
+        self.mean += alpha * diff
+        self.var = (1 - alpha) * (self.var + alpha * diff * diff)
+        self.count += 1
+        return is_anomaly, score, expected
+
+class ZScoreDetector:
+    """Flag values far from the running mean of the whole series (Welford's algorithm)."""
+
+    def __init__(self, threshold=3.0, warmup=30, min_std=1.0):
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_std = min_std
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.count = 0
+
+    def update(self, value, timestamp=None):
+        """Score a value against the baseline, then fold it in. Returns (is_anomaly, score, expected)."""
+        expected = self.mean
+        is_anomaly, score = False, 0.0
+        if self.count > 1:
+            std = math.sqrt(self.m2 / (self.count - 1))
+            score = abs(value - expected) / max(std, self.min_std)
+            is_anomaly = self.count >= self.warmup and score > self.threshold
+
+        self.count += 1
+        diff = value - self.mean
+        self.mean += diff / self.count
+        self.m2 += diff * (value - self.mean)
+        return is_anomaly, score, expected if self.count > 1 else value
+
+class SeasonalDetector:
+    """Keep one EWMA baseline per hour of the week, so Tuesday 3am is compared with previous Tuesdays at 3am."""
+
+    BUCKETS = 7 * 24
+
+    def __init__(self, alpha=0.2, threshold=3.0, warmup=6, min_std=1.0):
+        # Fixed number of buckets: memory does not grow with the length of the series
+        self.buckets = [EwmaDetector(alpha, threshold, warmup, min_std) for _ in range(self.BUCKETS)]
+
+    def update(self, value, timestamp=None):
+        """Score a value against the baseline of its hour of the week. Returns (is_anomaly, score, expected)."""
+        moment = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()
+        return self.buckets[moment.weekday() * 24 + moment.hour].update(value)
+
+DETECTORS = {
+    'ewma': EwmaDetector,
+    'zscore': ZScoreDetector,
+    'seasonal': SeasonalDetector,
+}
+
+def create_detector(kind, threshold=3.0):
+    """Create a detector by name ('ewma', 'zscore' or 'seasonal')."""
+    return DETECTORS[kind](threshold=threshold)
+
+class AnomalyMonitor:
+    """One detector per metric; feeds the alert pipeline alongside the static thresholds."""
+
+    def __init__(self, kind='ewma', threshold=3.0):
+        self.kind = kind
+        self.threshold = threshold
+        self.detectors = {}
+
+    def observe(self, values, timestamp=None):
+        """Feed a {metric: value} sample and return the anomalies as (metric, value, expected, score)."""
+        anomalies = []
+        for metric, value in values.items():
+            detector = self.detectors.get(metric)
+            if detector is None:
+                detector = self.detectors[metric] = create_detector(self.kind, self.threshold)
+            is_anomaly, score, expected = detector.update(value, timestamp)
+            if is_anomaly:
+                anomalies.append((metric, value, expected, score))
+        return anomalies
+
+def backtest(kind, start, end, threshold=3.0, machine_name=None, interval=60):
+    """Replay the stored history through a detector and return the anomalies it would have raised.
+
+    Like the live checks, the detector sees the average of each interval (monitoring.CHECK_INTERVAL),
+    not every stored sample.
+    """
+    monitor = AnomalyMonitor(kind, threshold)
+    columns = {key: storage.CSV_HEADER.index(storage.SAMPLE_COLUMNS[key]) for key in ANOMALY_METRICS.values()}
+    anomalies = []
+    samples = 0
+    bucket = None
+    sums, count, last = dict.fromkeys(columns, 0.0), 0, None
+
+    def check():
+        averages = {key: round(total / count, 1) for key, total in sums.items()}
+        for metric, value, expected, score in monitor.observe(anomaly_values(averages), last.timestamp()):
+            anomalies.append((last, metric, value, expected, score))
+
+    for row in storage.iter_rows(start, end, machine_name):
+        try:
+            moment = datetime.strptime(f"{row[0]} {row[1]}", "%Y-%m-%d %H:%M:%S")
+            values = {key: float(row[index]) for key, index in columns.items()}
+        except (ValueError, IndexError):
+            continue
+        samples += 1
+        row_bucket = int(moment.timestamp() // interval)
+        if row_bucket != bucket:
+            if count:
+                check()
+            bucket, sums, count = row_bucket, dict.fromkeys(columns, 0.0), 0
+        for key, value in values.items():
+            sums[key] += value
+        count += 1
+        last = moment
+    if count:
+        check()
+    return samples, anomalies
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest anomaly detectors on the stored CSV history.")
+    parser.add_argument('--detector', choices=sorted(DETECTORS), default='ewma')
+    parser.add_argument('--threshold', type=float, default=3.0, help="Score above which a value is anomalous")
+    parser.add_argument('--days', type=int, default=7, help="Number of days of history to replay")
+    parser.add_argument('--machine', default=None, help="Machine name used in the CSV file names")
+    parser.add_argument('--interval', type=int, default=60, help="Seconds averaged per check, as the live checks do")
+    args = parser.parse_args(argv)
+
+    end = datetime.now()
+    start = end - timedelta(days=args.days)
+    samples, anomalies = backtest(args.detector, start, end, args.threshold, args.machine, args.interval)
+    for moment, metric, value, expected, score in anomalies:
+        print(f"{moment:%Y-%m-%d %H:%M:%S}  {metric:<12} {value:7.2f} (expected {expected:7.2f}, score {score:5.1f})")
+    print(f"{len(anomalies)} anomalies in {samples} samples with the {args.detector} detector.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+import os
+import re
+import time
+import socket
+
+import psutil
+
+import storage
+
+# Root of the unified (v2) cgroup hierarchy
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# Cgroups watched at most: each one keeps its directory open
+MAX_CGROUPS = 512
+
+# The whole tree is listed again this often, in case a change slipped between two counts
+FULL_RESCAN_INTERVAL = 300
+
+# Container runtimes name their cgroups after a 64-digit id: shortened to 12 like `docker ps`
+CONTAINER_ID = re.compile(r'^(.*?)([0-9a-f]{64})(\.scope)?$')
+
+DIRECTORY_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)
+
+def is_cgroup2(root):
+    return os.path.exists(os.path.join(root, 'cgroup.controllers'))
+
+def cgroup_name(path):
+    """Name a cgroup by its path below the root, with container ids shortened."""
+    parts = []
+    for part in path.split('/'):
+        match = CONTAINER_ID.match(part)
+        parts.append(f"{match.group(1)}{match.group(2)[:12]}" if match else part)
+    return '/'.join(parts)
+
+def read_file(dir_fd, name):
+    """Read a cgroup file relative to its open directory, without resolving the path again."""
+    fd = os.open(name, os.O_RDONLY, dir_fd=dir_fd)
+    try:
+        return os.read(fd, 65536).decode('ascii', 'replace')
+    finally:
+        os.close(fd)
+
+def read_optional(dir_fd, name):
+    """Read a file of a controller that may not be enabled for this cgroup (None then)."""
+    try:
+        return read_file(dir_fd, name)
+    except OSError:
+        return None
+
+def parse_keyed(text):
+    """Parse 'key value' lines (cpu.stat, cgroup.stat) into {key: int}."""
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(' ')
+        if value.isdigit():
+            values[key] = int(value)
+    return values
+
+def parse_io(text):
+    """Sum the bytes read and written on every device of io.stat."""
+    read_bytes = write_bytes = 0
+    for line in text.splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key == 'rbytes':
+                read_bytes += int(value)
+            elif key == 'wbytes':
+                write_bytes += int(value)
+    return read_bytes, write_bytes
+
+def parse_pressure(text):
+    """Share of the last 10 seconds some tasks stalled (the 'some avg10' of a .pressure file), in %."""
+    for line in text.splitlines():
+        if line.startswith('some '):
+            for field in line.split()[1:]:
+                key, _, value = field.partition('=')
+                if key == 'avg10':
+                    return float(value)
+    return None
+
+class Cgroup:
+    def __init__(self, path, fd, parent):
+        self.path = path
+        self.name = cgroup_name(path)
+        self.fd = fd
+        self.parent = parent
+        self.children = {}  # Directory name -> Cgroup
+        self.descendants = None  # nr_descendants of cgroup.stat when the children were last listed
+        self.dirty = False  # A child disappeared: list the children again
+        self.previous = None  # (monotonic time, CPU usage in µs, bytes read, bytes written)
+
+class CgroupCollector:
+    """CPU, memory, IO and pressure-stall metrics of every cgroup, read from the cgroup v2 files.
+
+    Every cgroup directory stays open and its files are read relative to that handle. The
+    tree is only listed again below the cgroups whose descendant count (cgroup.stat) changed
+    or that lost a child, so an unchanged tree costs one read of the root's cgroup.stat.
+    """
+
+    def __init__(self, root=CGROUP_ROOT):
+        self.root_path = root
+        self.root = None
+        self.cgroups = {}  # Path below the root -> Cgroup
+        self.total_memory = psutil.virtual_memory().total
+        self.cpu_count = psutil.cpu_count() or 1
+        self.next_full_rescan = 0
+        self.warned = False
+        self.removed = []  # Names of the cgroups removed since the caller last emptied the list
+
+    def collect(self):
+        """Return {cgroup name: metrics} with storage.CONTAINER_COLUMNS keys; new cgroups appear from their second collection."""
+        now = time.monotonic()
+        if self.root is None:
+            self.root = Cgroup('', os.open(self.root_path, DIRECTORY_FLAGS), None)
+        force = now >= self.next_full_rescan
+        if force:
+            self.next_full_rescan = now + FULL_RESCAN_INTERVAL
+        self.refresh(self.root, force)
+
+        containers = {}
+        for cgroup in list(self.cgroups.values()):
+            if cgroup.path not in self.cgroups:
+                continue  # Removed with its parent
+            try:
+                metrics = self.read_metrics(cgroup, now)
+            except OSError:
+                # Gone since the last listing: forget it and list its parent again next time
+                self.remove(cgroup)
+                continue
+            if metrics is not None:
+                containers[cgroup.name] = metrics
+        return containers
+
+    def refresh(self, cgroup, force=False):
+        """List the children of a cgroup again if its descendant count changed, then go down into them."""
+        try:
+            descendants = parse_keyed(read_file(cgroup.fd, 'cgroup.stat')).get('nr_descendants', 0)
+        except OSError:
+            if cgroup.parent is not None:
+                self.remove(cgroup)
+            return
+        if not force and not cgroup.dirty and descendants == cgroup.descendants:
+            return
+        cgroup.descendants = descendants
+        cgroup.dirty = False
+
+        with os.scandir(cgroup.fd) as entries:
+            names = {entry.name for entry in entries if entry.is_dir(follow_symlinks=False)}
+        for name in set(cgroup.children) - names:
+            self.remove(cgroup.children[name])
+        for name in sorted(names - set(cgroup.children)):
+            if len(self.cgroups) >= MAX_CGROUPS:
+                if not self.warned:
+                    print(f"Watching the first {MAX_CGROUPS} cgroups only.")
+                    self.warned = True
+                break
+            try:
+                fd = os.open(name, DIRECTORY_FLAGS, dir_fd=cgroup.fd)
+            except OSError:
+                continue  # Removed in the meantime
+            path = f"{cgroup.path}/{name}" if cgroup.path else name
+            cgroup.children[name] = self.cgroups[path] = Cgroup(path, fd, cgroup)
+        for child in list(cgroup.children.values()):
+            self.refresh(child, force)
+
+    def remove(self, cgroup):
+        """Forget a cgroup and its children, and have its parent listed again."""
+        for child in list(cgroup.children.values()):
+            self.remove(child)
+        os.close(cgroup.fd)
+        if self.cgroups.pop(cgroup.path, None) is not None:
+            self.removed.append(cgroup.name)
+        parent = cgroup.parent
+        if parent is not None:
+            parent.children.pop(cgroup.path.rpartition('/')[2], None)
+        while parent is not None:
+            parent.dirty = True
+            parent = parent.parent
+
+    def cpu_limit(self, fd):
+        """CPUs a cgroup may use: its cpu.max quota, or every CPU of the machine."""
+        fields = (read_optional(fd, 'cpu.max') or '').split()  # "quota period", or "max period"
+        if len(fields) == 2 and fields[0].isdigit() and fields[1].isdigit() and int(fields[1]):
+            return int(fields[0]) / int(fields[1])
+        return self.cpu_count
+
+    def read_metrics(self, cgroup, now):
+        fd = cgroup.fd
+        usage = parse_keyed(read_file(fd, 'cpu.stat')).get('usage_usec', 0)  # Raises once the cgroup is gone
+        memory = read_optional(fd, 'memory.current')
+        memory_max = read_optional(fd, 'memory.max')
+        io = read_optional(fd, 'io.stat')
+        read_bytes, write_bytes = parse_io(io) if io is not None else (None, None)
+        pressures = {}
+        for resource in ('cpu', 'memory', 'io'):
+            text = read_optional(fd, f'{resource}.pressure')
+            pressures[f'{resource}_pressure'] = parse_pressure(text) if text else None
+
+        previous = cgroup.previous
+        cgroup.previous = (now, usage, read_bytes, write_bytes)
+        if previous is None or now <= previous[0]:
+            return None
+        elapsed = now - previous[0]
+
+        metrics = {'cpu': round(max(usage - previous[1], 0) / 1e6 / elapsed / self.cpu_limit(fd) * 100, 1)}
+        if memory is not None:
+            memory = int(memory)
+            limit = int(memory_max) if memory_max and memory_max.strip().isdigit() else self.total_memory
+            metrics['ram'] = round(memory / limit * 100, 1)
+            metrics['memory'] = round(memory / (1024 * 1024), 1)
+        else:
+            metrics['ram'] = metrics['memory'] = None
+        for key, index, value in (('io_read', 2, read_bytes), ('io_write', 3, write_bytes)):
+            if value is None or previous[index] is None:
+                metrics[key] = None
+            else:
+                metrics[key] = round(max(value - previous[index], 0) / (1024 * 1024) / elapsed, 3)
+        metrics.update(pressures)
+        return metrics
+
+    def close(self):
+        if self.root is not None:
+            self.remove(self.root)
+            self.root = None
+
+class ContainerJob:
+    """Scheduler job: collect the cgroups' metrics, store them and feed their threshold checks.
+
+    Each cgroup is checked as the host "<this machine>/<cgroup>" by a monitoring.HostMonitor,
+    with the CPU and RAM thresholds, anomaly detection and pressure_max_threshold.
+    Removed cgroups are forgotten by the monitor as soon as the collector notices.
+    """
+
+    def __init__(self, root, host_monitor):
+        self.root = root
+        self.host_monitor = host_monitor
+        self.collector = None
+
+    def __call__(self):
+        if self.collector is None:
+            self.collector = CgroupCollector(self.root)
+        containers = self.collector.collect()
+        host = socket.gethostname()
+        if self.collector.removed:
+            removed, self.collector.removed = self.collector.removed, []
+            self.host_monitor.forget([f"{host}/{name}" for name in removed])
+        if not containers:
+            return
+        timestamp = time.time()
+        storage.append_container_samples(timestamp, containers)
+        self.host_monitor.observe_totals({
+            f"{host}/{name}": ({'cpu': metrics['cpu'], 'ram': metrics['ram'] or 0.0, 'gpu': 0.0}, 1, dict(metrics, timestamp=timestamp))
+            for name, metrics in containers.items()
+        })
+
+    def close(self):
+        if self.collector is not None:
+            self.collector.close()
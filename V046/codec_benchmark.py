@@ -0,0 +1,134 @@
+import io
+import sys
+import csv
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime
+
+import gorilla
+import protocol
+from agent import BLOCK_SAMPLES
+
+FIELDS = protocol.SAMPLE_FIELDS
+
+def synthetic_samples(count, interval=1.0, seed=1):
+    """Samples shaped like Sampler.snapshot(): percentages rounded to 0.1, cumulative network MB from byte counters."""
+    rng = random.Random(seed)
+    samples = []
+    start = (time.time() // 86400) * 86400
+    cpu, ram, received, sent = 10.0, 45.0, 0, 0
+    for index in range(count):
+        cpu = min(100.0, max(0.0, cpu + rng.gauss(0, 3)))
+        if rng.random() < 0.05:
+            ram = min(100.0, max(0.0, ram + rng.choice((-0.1, 0.1))))
+        received += int(rng.expovariate(1 / 20000))
+        sent += int(rng.expovariate(1 / 4000))
+        samples.append({
+            'timestamp': start + index * interval + rng.uniform(0.001, 0.004),  # Scheduler wake-up delay
+            'cpu': round(cpu, 1), 'ram': round(ram, 1),
+            'disk': round(rng.uniform(0, 20), 1) if rng.random() < 0.1 else 0.0, 'gpu': 0.0,
+            'network_in': received / (1024 * 1024), 'network_out': sent / (1024 * 1024),
+        })
+    return samples
+
+def csv_samples(path):
+    """Read the samples of a stored day file (machine_YYYY-MM-DD.csv)."""
+    samples = []
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if len(row) < 2 + len(FIELDS):
+                continue
+            sample = {'timestamp': datetime.strptime(f"{row[0]} {row[1]}", "%Y-%m-%d %H:%M:%S").timestamp()}
+            sample.update(zip(FIELDS, map(float, row[2:2 + len(FIELDS)])))
+            samples.append(sample)
+    return samples
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+def csv_codec(samples):
+    """The daily CSV files: one text row per sample (storage.append_columns)."""
+    def encode(samples):
+        text = io.StringIO()
+        writer = csv.writer(text)
+        for sample in samples:
+            moment = time.localtime(sample['timestamp'])
+            writer.writerow([time.strftime("%Y-%m-%d", moment), time.strftime("%H:%M:%S", moment)] + [sample[field] for field in FIELDS])
+        return text.getvalue().encode('utf-8')
+
+    def decode(data):
+        rows = csv.reader(io.StringIO(data.decode('utf-8')))
+        return [(datetime.strptime(f"{row[0]} {row[1]}", "%Y-%m-%d %H:%M:%S").timestamp(), *map(float, row[2:])) for row in rows]
+
+    return encode, decode
+
+def records_codec(samples):
+    """Version 1 SAMPLES frames: fixed 40-byte records."""
+    def encode(samples):
+        return b''.join(protocol.encode_samples(index + 1, samples[index:index + BLOCK_SAMPLES])
+                        for index in range(0, len(samples), BLOCK_SAMPLES))
+
+    def decode(data):
+        return [protocol.decode_sample_columns(payload) for frame_type, payload in protocol.FrameReader().feed(data)]
+
+    return encode, decode
+
+def gorilla_codec(samples):
+    """BLOCK frames: Gorilla-compressed blocks, as buffered and sent by the agent."""
+    def encode(samples):
+        frames = []
+        for index in range(0, len(samples), BLOCK_SAMPLES):
+            encoder = gorilla.BlockEncoder(len(FIELDS))
+            block = samples[index:index + BLOCK_SAMPLES]
+            for sample in block:
+                encoder.append(sample['timestamp'], [sample[field] for field in FIELDS])
+            frames.append(protocol.encode_block(index + 1, len(block), encoder.finish()))
+        return b''.join(frames)
+
+    def decode(data):
+        return [protocol.decode_block_columns(payload) for frame_type, payload in protocol.FrameReader().feed(data)]
+
+    return encode, decode
+
+CODECS = {'csv rows': csv_codec, 'records (v1)': records_codec, 'gorilla': gorilla_codec}
+
+def dict_bytes(samples):
+    """Memory of the samples kept as dicts, the way the agent used to buffer them."""
+    tracemalloc.start()
+    copies = [dict(sample) for sample in samples]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del copies
+    return size
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the sizes and speeds of the sample encodings.")
+    parser.add_argument('--samples', type=int, default=36000, help="Synthetic samples to encode (one second apart)")
+    parser.add_argument('--csv', help="Use the samples of a stored day file instead")
+    parser.add_argument('--hours', type=float, default=24, help="History to project the memory use for, at one sample per second")
+    args = parser.parse_args(argv)
+
+    samples = csv_samples(args.csv) if args.csv else synthetic_samples(args.samples)
+    if not samples:
+        parser.error("no samples to encode")
+    seconds = args.hours * 3600
+    print(f"{len(samples)} samples, {len(FIELDS)} metrics each; memory for {args.hours:g} h at 1 s per sample")
+    print(f"{'encoding':<14} {'bytes/sample':>12} {'encode/s':>10} {'decode/s':>10} {'memory':>10}")
+    for name, codec in CODECS.items():
+        encode, decode = codec(samples)
+        data, encode_time = timed(encode, samples)
+        decoded, decode_time = timed(decode, data)
+        size = len(data) / len(samples)
+        print(f"{name:<14} {size:12.1f} {len(samples) / encode_time:10.0f} {len(samples) / decode_time:10.0f} {size * seconds / 1e6:8.1f} MB")
+    size = dict_bytes(samples) / len(samples)
+    print(f"{'dicts':<14} {size:12.1f} {'-':>10} {'-':>10} {size * seconds / 1e6:8.1f} MB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import time
+import signal
+import threading
+import multiprocessing
+
+# Seconds a sample waits for an isolated collector before repeating its last value, marked stale
+DEFAULT_DEADLINE = 0.5
+
+# A collector that has not answered for this long is hung: its worker is killed and started again
+HANG_TIMEOUT = 30
+
+# Shortest time between two starts of a worker, so one that crashes at once does not spin
+RESTART_DELAY = 10
+
+def run_worker(connection, function):
+    """Worker process: call the collector for every request and send back (True, value) or (False, error)."""
+    # The parent handles Ctrl+C and stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        try:
+            reply = (True, function())
+        except Exception as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        connection.send(reply)
+
+class IsolatedCollector:
+    """Run a slow or crash-prone collector (GPUtil, WMI) in its own worker process.
+
+    collect() waits at most `deadline` seconds for the worker: a late answer is picked up by
+    a later call, meanwhile the last value is returned and marked stale, so one collector
+    never holds up the sample. A worker that dies, or stays busy for HANG_TIMEOUT seconds,
+    is killed and started again. Workers are spawned, so they start clean on every platform.
+    """
+
+    def __init__(self, name, function, default=0, deadline=DEFAULT_DEADLINE):
+        self.name = name
+        self.function = function  # Module-level callable: the worker imports it by name
+        self.value = default
+        self.deadline = deadline
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.connection = None
+        self.sent_at = None  # Monotonic time of the request waiting for an answer
+        self.next_start = 0
+        self.last_error = None
+        self.restarts = 0
+        self.lock = threading.Lock()  # One request at a time, whichever thread collects
+        self.start()  # Started right away: a spawned interpreter takes a moment to import the collector
+
+    def start(self):
+        parent, child = self.context.Pipe()
+        self.process = self.context.Process(target=run_worker, args=(child, self.function),
+                                            name=f"collector-{self.name}", daemon=True)
+        self.process.start()
+        child.close()
+        self.connection = parent
+        self.sent_at = None
+        self.next_start = time.monotonic() + RESTART_DELAY
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.connection.close()
+        self.process = None
+
+    def restart(self, reason):
+        print(f"The {self.name} collector {reason}, restarting its worker.")
+        self.kill()
+        self.restarts += 1
+        if time.monotonic() >= self.next_start:
+            self.start()
+
+    def collect(self):
+        """Return (value, stale): a fresh value when the worker answers in time, else the last one and True."""
+        with self.lock:
+            return self._collect()
+
+    def _collect(self):
+        now = time.monotonic()
+        if self.process is None:
+            if now < self.next_start:
+                return self.value, True
+            self.start()
+        try:
+            if self.sent_at is None:
+                self.connection.send(True)
+                self.sent_at = now
+            # One request at a time: an answer is always to the request waiting, maybe sent by an earlier call
+            if self.connection.poll(self.deadline):
+                ok, result = self.connection.recv()
+                self.sent_at = None
+                if ok:
+                    self.value = result
+                    self.last_error = None
+                    return result, False
+                if result != self.last_error:
+                    print(f"The {self.name} collector failed: {result}")
+                    self.last_error = result
+                return self.value, True
+        except (EOFError, OSError):
+            self.restart("stopped")
+            return self.value, True
+        if time.monotonic() - self.sent_at > HANG_TIMEOUT:
+            self.restart(f"did not answer for {HANG_TIMEOUT} s")
+        return self.value, True
+
+    def stop(self):
+        with self.lock:
+            if self.process is None:
+                return
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout=1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(timeout=5)
+            self.connection.close()
+            self.process = None
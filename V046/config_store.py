@@ -0,0 +1,393 @@
+import os
+import configparser
+import threading
+import psutil
+
+# Setup the path for the configuration file
+CONFIG_DIR = os.path.join(os.getcwd(), 'config')
+CONFIG_FILE_PATH = os.path.join(CONFIG_DIR, 'config.ini')
+
+# Initialize settings dictionary at the top of the file
+settings = {
+    'refresh_rate': 60,
+    'smtp_server': '',
+    'smtp_port': '',
+    'smtp_username': '',
+    'smtp_password': '',
+    'email_recipient': '',
+    'smtp_security': 'starttls',
+    'email_interval': 5,
+    'send_on_threshold_violation': 0,
+    'digest_mode': 0,
+    'digest_window': 300,
+    'attachment_window': 30,
+    'cpu_min_threshold': 0,
+    'cpu_max_threshold': 100,
+    'ram_min_threshold': 0,
+    'ram_max_threshold': 100,
+    'disk_min_threshold': 0,
+    'disk_max_threshold': 100,
+    'network_upload_min_threshold': 0,
+    'network_upload_max_threshold': 1000,
+    'network_download_min_threshold': 0,
+    'network_download_max_threshold': 1000,
+    'gpu_max_threshold': 100,
+    'pressure_max_threshold': 100,
+    'smtp_enabled': 1,
+    'smtp_timeout': 30,
+    'smtp_retries': 2,
+    'webhook_url': '',
+    'webhook_timeout': 5,
+    'webhook_retries': 3,
+    'syslog_address': '',
+    'syslog_timeout': 2,
+    'syslog_retries': 1,
+    'jsonl_path': '',
+    'jsonl_timeout': 2,
+    'jsonl_retries': 1,
+    'anomaly_detection': 'off',
+    'anomaly_threshold': 3.0,
+    'http_address': '',
+    'listen_address': '',
+    'shared_memory': '',
+    'container_monitoring': 'off',
+    'cgroup_root': '/sys/fs/cgroup',
+    'plugins': {},
+    'plugin_settings': {},
+}
+
+# Settings never written to the log: the SMTP password, and webhook URLs that embed a token
+SECRET_SETTINGS = ('smtp_password', 'webhook_url')
+
+# Cache state: modification time of the config file the settings were loaded from
+_loaded_mtime = None
+_lock = threading.RLock()
+
+# Problems found in the SMTP settings when they were loaded, empty when email can be sent
+email_settings_errors = []
+
+def drive_key(mountpoint):
+    """Return the name of a drive in the settings keys: 'C' for C:\\, the mount point elsewhere."""
+    # ':' and '=' separate keys from values in config.ini
+    return mountpoint.strip(':\\').replace(':', '_').replace('=', '_') or mountpoint
+
+def load_settings():
+    """Load settings from the config.ini file or create it with default values if not present."""
+    global _loaded_mtime
+    with _lock:
+        _load_settings()
+        _loaded_mtime = _config_mtime()
+        validate_email_settings()
+
+def _load_settings():
+    config = configparser.ConfigParser()
+
+    # Ensure the config directory exists
+    if not os.path.exists(CONFIG_DIR):
+        os.makedirs(CONFIG_DIR)
+
+    # If the config file does not exist, create it with default values
+    if not os.path.exists(CONFIG_FILE_PATH):
+        print("Config file not found, creating a new one with default settings.")
+        config['General'] = {
+            'refresh_rate': '60'
+        }
+        config['Email'] = {
+            'smtp_server': '',
+            'smtp_port': '',
+            'smtp_username': '',
+            'smtp_password': '',
+            'email_recipient': '',
+            'smtp_security': 'starttls',
+            'email_interval': '5',
+            'send_on_threshold_violation': '0',
+            'digest_mode': '0',
+            'digest_window': '300',
+            'attachment_window': '30'
+        }
+        config['Thresholds'] = {
+            'cpu_min_threshold': '0',
+            'cpu_max_threshold': '100',
+            'ram_min_threshold': '0',
+            'ram_max_threshold': '100',
+            'disk_min_threshold': '0',
+            'disk_max_threshold': '100',
+            'network_upload_min_threshold': '0',
+            'network_upload_max_threshold': '1000',
+            'network_download_min_threshold': '0',
+            'network_download_max_threshold': '1000',
+            'gpu_max_threshold': '100',  # Add GPU max threshold default
+            'pressure_max_threshold': '100'
+        }
+        config['Notifications'] = {
+            'smtp_enabled': '1',
+            'smtp_timeout': '30',
+            'smtp_retries': '2',
+            'webhook_url': '',
+            'webhook_timeout': '5',
+            'webhook_retries': '3',
+            'syslog_address': '',
+            'syslog_timeout': '2',
+            'syslog_retries': '1',
+            'jsonl_path': '',
+            'jsonl_timeout': '2',
+            'jsonl_retries': '1'
+        }
+        config['Anomaly'] = {
+            'anomaly_detection': 'off',
+            'anomaly_threshold': '3.0'
+        }
+        config['Server'] = {
+            'http_address': '',
+            'listen_address': '',
+            'shared_memory': ''
+        }
+        config['Containers'] = {
+            'container_monitoring': 'off',
+            'cgroup_root': '/sys/fs/cgroup'
+        }
+        config['Plugins'] = {}
+
+        # Write the default configuration to file
+        with open(CONFIG_FILE_PATH, 'w') as configfile:
+            config.write(configfile)
+
+    # Read the config file
+    config.read(CONFIG_FILE_PATH)
+
+    # Load general settings
+    settings['refresh_rate'] = config.getint('General', 'refresh_rate', fallback=60)
+    settings['smtp_server'] = config.get('Email', 'smtp_server', fallback='')
+    settings['smtp_port'] = config.get('Email', 'smtp_port', fallback='')
+    settings['smtp_username'] = config.get('Email', 'smtp_username', fallback='')
+    settings['smtp_password'] = config.get('Email', 'smtp_password', fallback='')
+    settings['email_recipient'] = config.get('Email', 'email_recipient', fallback='')
+    settings['smtp_security'] = config.get('Email', 'smtp_security', fallback='starttls')
+    settings['email_interval'] = config.getint('Email', 'email_interval', fallback=5)
+    settings['send_on_threshold_violation'] = config.getint('Email', 'send_on_threshold_violation', fallback=0)
+    settings['digest_mode'] = config.getint('Email', 'digest_mode', fallback=0)
+    settings['digest_window'] = config.getint('Email', 'digest_window', fallback=300)
+    settings['attachment_window'] = config.getint('Email', 'attachment_window', fallback=30)
+
+    # Load threshold settings
+    settings['cpu_min_threshold'] = config.getint('Thresholds', 'cpu_min_threshold', fallback=0)
+    settings['cpu_max_threshold'] = config.getint('Thresholds', 'cpu_max_threshold', fallback=100)
+    settings['ram_min_threshold'] = config.getint('Thresholds', 'ram_min_threshold', fallback=0)
+    settings['ram_max_threshold'] = config.getint('Thresholds', 'ram_max_threshold', fallback=100)
+    settings['disk_min_threshold'] = config.getint('Thresholds', 'disk_min_threshold', fallback=0)
+    settings['disk_max_threshold'] = config.getint('Thresholds', 'disk_max_threshold', fallback=100)
+    settings['network_upload_min_threshold'] = config.getint('Thresholds', 'network_upload_min_threshold', fallback=0)
+    settings['network_upload_max_threshold'] = config.getint('Thresholds', 'network_upload_max_threshold', fallback=1000)
+    settings['network_download_min_threshold'] = config.getint('Thresholds', 'network_download_min_threshold', fallback=0)
+    settings['network_download_max_threshold'] = config.getint('Thresholds', 'network_download_max_threshold', fallback=1000)
+
+    # **Load GPU threshold**
+    settings['gpu_max_threshold'] = config.getint('Thresholds', 'gpu_max_threshold', fallback=100)  # Add this line to load the GPU threshold
+    # Share of time a container's tasks stall on CPU, memory or IO (cgroup pressure, %)
+    settings['pressure_max_threshold'] = config.getint('Thresholds', 'pressure_max_threshold', fallback=100)
+
+    # Load notification channel settings
+    settings['smtp_enabled'] = config.getint('Notifications', 'smtp_enabled', fallback=1)
+    settings['smtp_timeout'] = config.getint('Notifications', 'smtp_timeout', fallback=30)
+    settings['smtp_retries'] = config.getint('Notifications', 'smtp_retries', fallback=2)
+    settings['webhook_url'] = config.get('Notifications', 'webhook_url', fallback='')
+    settings['webhook_timeout'] = config.getint('Notifications', 'webhook_timeout', fallback=5)
+    settings['webhook_retries'] = config.getint('Notifications', 'webhook_retries', fallback=3)
+    settings['syslog_address'] = config.get('Notifications', 'syslog_address', fallback='')
+    settings['syslog_timeout'] = config.getint('Notifications', 'syslog_timeout', fallback=2)
+    settings['syslog_retries'] = config.getint('Notifications', 'syslog_retries', fallback=1)
+    settings['jsonl_path'] = config.get('Notifications', 'jsonl_path', fallback='')
+    settings['jsonl_timeout'] = config.getint('Notifications', 'jsonl_timeout', fallback=2)
+    settings['jsonl_retries'] = config.getint('Notifications', 'jsonl_retries', fallback=1)
+
+    # Load anomaly detection settings
+    settings['anomaly_detection'] = config.get('Anomaly', 'anomaly_detection', fallback='off')
+    settings['anomaly_threshold'] = config.getfloat('Anomaly', 'anomaly_threshold', fallback=3.0)
+
+    # Load the embedded HTTP server settings ('' disables it)
+    settings['http_address'] = config.get('Server', 'http_address', fallback='')
+    # Address the agents connect to ('' disables the aggregator and the Fleet tab)
+    settings['listen_address'] = config.get('Server', 'listen_address', fallback='')
+    # Shared memory segment holding the latest sample for local tools ('' disables it, e.g. 'pysentinel')
+    settings['shared_memory'] = config.get('Server', 'shared_memory', fallback='')
+
+    # Load the per-container (cgroup v2) monitoring settings
+    settings['container_monitoring'] = config.get('Containers', 'container_monitoring', fallback='off')
+    settings['cgroup_root'] = config.get('Containers', 'cgroup_root', fallback='/sys/fs/cgroup')
+
+    # Load the plugin collectors switched on or off ([Plugins]) and their options and thresholds ([Plugin <name>])
+    settings['plugins'] = {name: value.strip().lower() for name, value in config.items('Plugins')} if config.has_section('Plugins') else {}
+    settings['plugin_settings'] = {section[len('Plugin '):].lower(): dict(config[section])
+                                   for section in config.sections() if section.startswith('Plugin ')}
+
+    # Load drive thresholds
+    for partition in psutil.disk_partitions():
+        normalized_drive = drive_key(partition.mountpoint)
+
+        # Load thresholds from config
+        min_threshold = config.getint('Thresholds', f'drive_{normalized_drive}_min_threshold', fallback=10)
+        max_threshold = config.getint('Thresholds', f'drive_{normalized_drive}_max_threshold', fallback=90)
+        enabled = config.getint('Thresholds', f'drive_{normalized_drive}_enabled', fallback=1)
+
+        settings[f'drive_{normalized_drive}_min_threshold'] = min_threshold
+        settings[f'drive_{normalized_drive}_max_threshold'] = max_threshold
+        settings[f'drive_{normalized_drive}_enabled'] = enabled
+
+    print("Settings loaded:", printable_settings())  # Log the settings for debugging
+
+def save_settings():
+    """Save settings to the config.ini file."""
+    global _loaded_mtime
+    config = configparser.ConfigParser()
+    config['General'] = {
+        'refresh_rate': str(settings['refresh_rate']),
+    }
+    config['Email'] = {
+        'smtp_server': settings['smtp_server'],
+        'smtp_port': settings['smtp_port'],
+        'smtp_username': settings['smtp_username'],
+        'smtp_password': settings['smtp_password'],
+        'email_recipient': settings['email_recipient'],
+        'smtp_security': settings['smtp_security'],
+        'email_interval': str(settings['email_interval']),
+        'send_on_threshold_violation': str(settings['send_on_threshold_violation']),
+        'digest_mode': str(settings['digest_mode']),
+        'digest_window': str(settings['digest_window']),
+        'attachment_window': str(settings['attachment_window']),
+    }
+    config['Thresholds'] = {
+        'cpu_min_threshold': str(settings['cpu_min_threshold']),
+        'cpu_max_threshold': str(settings['cpu_max_threshold']),
+        'ram_min_threshold': str(settings['ram_min_threshold']),
+        'ram_max_threshold': str(settings['ram_max_threshold']),
+        'disk_min_threshold': str(settings['disk_min_threshold']),
+        'disk_max_threshold': str(settings['disk_max_threshold']),
+        'network_upload_min_threshold': str(settings['network_upload_min_threshold']),
+        'network_upload_max_threshold': str(settings['network_upload_max_threshold']),
+        'network_download_min_threshold': str(settings['network_download_min_threshold']),
+        'network_download_max_threshold': str(settings['network_download_max_threshold']),
+        'gpu_max_threshold': str(settings['gpu_max_threshold']),
+        'pressure_max_threshold': str(settings['pressure_max_threshold']),
+    }
+
+    config['Notifications'] = {
+        'smtp_enabled': str(settings['smtp_enabled']),
+        'smtp_timeout': str(settings['smtp_timeout']),
+        'smtp_retries': str(settings['smtp_retries']),
+        'webhook_url': settings['webhook_url'],
+        'webhook_timeout': str(settings['webhook_timeout']),
+        'webhook_retries': str(settings['webhook_retries']),
+        'syslog_address': settings['syslog_address'],
+        'syslog_timeout': str(settings['syslog_timeout']),
+        'syslog_retries': str(settings['syslog_retries']),
+        'jsonl_path': settings['jsonl_path'],
+        'jsonl_timeout': str(settings['jsonl_timeout']),
+        'jsonl_retries': str(settings['jsonl_retries']),
+    }
+
+    config['Anomaly'] = {
+        'anomaly_detection': settings['anomaly_detection'],
+        'anomaly_threshold': str(settings['anomaly_threshold']),
+    }
+
+    config['Server'] = {
+        'http_address': settings['http_address'],
+        'listen_address': settings['listen_address'],
+        'shared_memory': settings['shared_memory'],
+    }
+
+    config['Containers'] = {
+        'container_monitoring': settings['container_monitoring'],
+        'cgroup_root': settings['cgroup_root'],
+    }
+
+    config['Plugins'] = settings['plugins']
+    for name, options in settings['plugin_settings'].items():
+        config[f'Plugin {name}'] = {key: str(value) for key, value in options.items()}
+
+    # Save drive thresholds
+    for partition in psutil.disk_partitions():
+        normalized_drive = drive_key(partition.mountpoint)
+        for name in ('min_threshold', 'max_threshold', 'enabled'):
+            if f'drive_{normalized_drive}_{name}' in settings:
+                config['Thresholds'][f'drive_{normalized_drive}_{name}'] = str(settings[f'drive_{normalized_drive}_{name}'])
+
+    # Ensure the directory exists
+    if not os.path.exists(CONFIG_DIR):
+        os.makedirs(CONFIG_DIR)
+
+    # Write the settings to the config file
+    with _lock:
+        with open(CONFIG_FILE_PATH, 'w') as configfile:
+            config.write(configfile)
+        # The in-memory settings already match what was written, no reload needed
+        _loaded_mtime = _config_mtime()
+        validate_email_settings()
+
+def enabled_plugins():
+    """Return the names of the plugin collectors switched on in the [Plugins] section (see plugins.py)."""
+    return [name for name, state in settings['plugins'].items() if state == 'on']
+
+def printable_settings():
+    """Return a copy of the settings for the log, with the secrets masked."""
+    return {key: '***' if key in SECRET_SETTINGS and value else value for key, value in settings.items()}
+
+def _config_mtime():
+    """Return the modification time of the config file, or None if it does not exist."""
+    try:
+        return os.stat(CONFIG_FILE_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+def get_settings():
+    """Return the shared settings, reloading them first if config.ini changed on disk."""
+    if _loaded_mtime is None or _config_mtime() != _loaded_mtime:
+        with _lock:
+            if _loaded_mtime is None or _config_mtime() != _loaded_mtime:
+                if _loaded_mtime is not None:
+                    print("Config file changed on disk, reloading settings.")
+                load_settings()
+    return settings
+
+def reload_settings():
+    """Force a reload of the settings from config.ini."""
+    load_settings()
+    return settings
+
+def validate_email_settings():
+    """Check the SMTP settings once so problems are reported when they are loaded, not when sending."""
+    errors = []
+    if not settings['smtp_server']:
+        errors.append("SMTP server is not set.")
+    try:
+        port = int(settings['smtp_port'])
+        if not 0 < port < 65536:
+            errors.append(f"SMTP port {port} is out of range.")
+    except ValueError:
+        errors.append(f"SMTP port '{settings['smtp_port']}' is not a number.")
+    if settings['smtp_security'] not in ('starttls', 'ssl', 'none'):
+        errors.append(f"SMTP security '{settings['smtp_security']}' must be starttls, ssl or none.")
+    if not settings['smtp_username']:
+        errors.append("SMTP username is not set.")
+    if '@' not in settings['email_recipient']:
+        errors.append(f"Recipient email '{settings['email_recipient']}' is not a valid address.")
+
+    email_settings_errors[:] = errors
+    for error in errors:
+        print(f"Email settings: {error}")
+    return errors
+
+def get_email_settings():
+    """Return the email settings from the shared cache, or None if they are not usable."""
+    current = get_settings()
+    if email_settings_errors:
+        return None
+    return {
+        'smtp_server': current['smtp_server'],
+        'smtp_port': current['smtp_port'],
+        'smtp_username': current['smtp_username'],
+        'smtp_password': current['smtp_password'],
+        'email_recipient': current['email_recipient'],
+        'smtp_security': current['smtp_security'],
+        'attachment_window': current['attachment_window'],
+    }
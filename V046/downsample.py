@@ -0,0 +1,39 @@
+import numpy as np
+
+def lttb(x, y, threshold):
+    """Downsample a series to `threshold` points with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; every bucket in between keeps the point forming
+    the largest triangle with the point kept before it and the average of the next
+    bucket, so peaks and dips survive the reduction.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    # Bucket boundaries for the n - 2 points between the first and the last one
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    starts = edges[:-1]
+    counts = np.maximum(np.diff(edges), 1)
+
+    # Average point of every bucket, the last "bucket" being the last point
+    avg_x = np.append(np.add.reduceat(x[:n - 1], starts) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:n - 1], starts) / counts, y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((x[a] - avg_x[i + 1]) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y[i + 1] - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return x[selected], y[selected]
@@ -0,0 +1,106 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+import psutil
+from config_store import drive_key
+
+# Seconds of usage history used to estimate how fast a drive fills up
+GROWTH_WINDOW = 3600
+
+class DriveStats:
+    """Latest usage of one partition and its growth rate."""
+
+    def __init__(self, partition):
+        self.key = drive_key(partition.mountpoint)
+        self.mountpoint = partition.mountpoint
+        self.device = partition.device
+        self.fstype = partition.fstype
+        self.total = self.used = self.free = 0
+        self.percent = 0.0
+        self.growth = 0.0  # Bytes per second, negative when space is freed
+        self.responding = True
+        self.history = deque()  # (time, used bytes) over the growth window
+
+    def update(self, usage, now):
+        """Record a disk_usage() result. Returns True if anything shown changed."""
+        changed = usage.used != self.used or usage.total != self.total or not self.responding
+        self.total, self.used, self.free, self.percent = usage.total, usage.used, usage.free, usage.percent
+        self.responding = True
+
+        self.history.append((now, usage.used))
+        while now - self.history[0][0] > GROWTH_WINDOW:
+            self.history.popleft()
+        first_time, first_used = self.history[0]
+        growth = (usage.used - first_used) / (now - first_time) if now > first_time else 0.0
+        changed = changed or growth != self.growth
+        self.growth = growth
+        return changed
+
+    def seconds_until_full(self):
+        """Estimated time before the drive is full at the current growth rate, or None."""
+        if self.growth <= 0:
+            return None
+        return self.free / self.growth
+
+class DrivePoller:
+    """Poll the usage of every partition and report the partitions that changed; run by the scheduler.
+
+    Each partition is queried on a small thread pool, so a slow or hung network mount only
+    marks its own row as not responding instead of delaying the others or the scheduler.
+    """
+
+    def __init__(self, on_update, workers=8, timeout=0.5):
+        self.on_update = on_update  # Called with (changed DriveStats list, removed keys)
+        self.timeout = timeout  # Seconds a poll waits for the answers; later ones are picked up next time
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="drive-usage")
+        self.drives = {}  # key -> DriveStats
+        self.pending = {}  # key -> future of a disk_usage() call still running
+
+    def stop(self):
+        self.executor.shutdown(wait=False)
+
+    def poll(self):
+        """Query every partition once and report what changed."""
+        partitions = {}
+        for partition in psutil.disk_partitions():
+            partitions.setdefault(drive_key(partition.mountpoint), partition)
+
+        removed = [key for key in self.drives if key not in partitions]
+        for key in removed:
+            del self.drives[key]
+        changed = []
+        for key, partition in partitions.items():
+            if key not in self.drives:
+                self.drives[key] = DriveStats(partition)
+                changed.append(self.drives[key])
+            # Do not queue another call behind one that is still stuck
+            if key not in self.pending:
+                self.pending[key] = self.executor.submit(psutil.disk_usage, partition.mountpoint)
+
+        wait(list(self.pending.values()), timeout=self.timeout)
+        now = time.monotonic()
+        for key, future in list(self.pending.items()):
+            drive = self.drives.get(key)
+            if future.done():
+                del self.pending[key]
+                try:
+                    usage = future.result()
+                except Exception as e:
+                    # Failed (e.g. permission denied): shown as not responding, retried next time
+                    if not isinstance(e, PermissionError):
+                        print(f"Error reading usage of {key}: {e}")
+                    usage = None
+            else:
+                usage = None  # Still running: a hung mount
+            if drive is None:
+                continue
+            if usage is None:
+                if drive.responding:
+                    drive.responding = False
+                    if drive not in changed:
+                        changed.append(drive)
+            elif drive.update(usage, now) and drive not in changed:
+                changed.append(drive)
+
+        if changed or removed:
+            self.on_update(changed, removed)
@@ -1,57 +1,93 @@
-import subprocess
-import sys
 import os
-import configparser
+import re
 import smtplib
+import socket
+import threading
+import time
+import base64
+import tempfile
+import uuid
+from email import policy
+from email.header import Header
+from email.utils import formatdate, make_msgid
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from datetime import datetime
-
-# Function to check and install dependencies
-def check_and_install_dependencies():
-    """Check and install required dependencies."""
-    required_packages = {
-        'configparser': 'configparser',
-    }
-
-    for package_name, module_name in required_packages.items():
-        try:
-            __import__(module_name)
-        except ImportError:
-            print(f"{package_name} not found. Installing...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
-            print(f"{package_name} installed successfully.")
+from datetime import datetime, timedelta
+import storage
+import config_store
 
-# Ensure dependencies are installed before importing other modules
-check_and_install_dependencies()
+def read_email_settings():
+    """Read email settings from the shared settings cache (reloaded when config.ini changes)."""
+    return config_store.get_email_settings()
 
-# Path to the config file
-CONFIG_DIR = os.path.join(os.getcwd(), 'config')
-CONFIG_FILE_PATH = os.path.join(CONFIG_DIR, 'config.ini')
+# Size of the raw chunks read for base64 encoding (57 bytes give one 76 character line)
+ATTACHMENT_CHUNK_SIZE = 57 * 1024
 
-def read_email_settings():
-    """Read email settings from the config.ini file."""
-    config = configparser.ConfigParser()
-    if not os.path.exists(CONFIG_FILE_PATH):
-        print("Configuration file not found.")
-        return None
-
-    config.read(CONFIG_FILE_PATH)
-    email_settings = {
-        'smtp_server': config.get('Email', 'smtp_server', fallback=''),
-        'smtp_port': config.get('Email', 'smtp_port', fallback=''),
-        'smtp_username': config.get('Email', 'smtp_username', fallback=''),
-        'smtp_password': config.get('Email', 'smtp_password', fallback=''),
-        'email_recipient': config.get('Email', 'email_recipient', fallback=''),
-    }
-    return email_settings
-
-def send_email(subject, body, attachment_path=None):
-    """Send a basic email with optional attachment."""
+def iter_message_lines(sender, recipient, subject, body, attachments=()):
+    """Yield the MIME message line by line so attachments are never held in memory."""
+    boundary = f"=============== PySentinel {uuid.uuid4().hex} =="
+
+    yield f"From: {sender}\r\n".encode()
+    yield f"To: {recipient}\r\n".encode()
+    # Long subjects are folded: with CRLF, as every line of the DATA must end
+    encoded_subject = Header(subject, 'utf-8').encode(linesep='\r\n')
+    yield f"Subject: {encoded_subject}\r\n".encode()
+    yield f"Date: {formatdate(localtime=True)}\r\n".encode()
+    yield f"Message-ID: {make_msgid()}\r\n".encode()
+    yield b"MIME-Version: 1.0\r\n"
+    yield f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n\r\n'.encode()
+
+    # The body is small, the email package can render it in one go
+    yield f"--{boundary}\r\n".encode()
+    text_part = MIMEText(body, 'plain', 'utf-8')
+    del text_part['MIME-Version']
+    for line in text_part.as_bytes(policy=policy.SMTP).splitlines(keepends=True):
+        yield line
+    yield b"\r\n"
+
+    for filename, fileobj in attachments:
+        content_type = 'application/gzip' if filename.endswith('.gz') else 'application/octet-stream'
+        yield f"--{boundary}\r\n".encode()
+        yield f'Content-Type: {content_type}; name="{filename}"\r\n'.encode()
+        yield b"Content-Transfer-Encoding: base64\r\n"
+        yield f'Content-Disposition: attachment; filename="{filename}"\r\n\r\n'.encode()
+        while True:
+            chunk = fileobj.read(ATTACHMENT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield base64.encodebytes(chunk).replace(b"\n", b"\r\n")
+
+    yield f"--{boundary}--\r\n".encode()
+
+def send_streamed(server, sender, recipient, lines):
+    """Send a message to an open SMTP connection through the DATA command, chunk by chunk."""
+    server.ehlo_or_helo_if_needed()
+    code, response = server.mail(sender)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, response, sender)
+    code, response = server.rcpt(recipient)
+    if code not in (250, 251):
+        raise smtplib.SMTPRecipientsRefused({recipient: (code, response)})
+    code, response = server.docmd("data")
+    if code != 354:
+        raise smtplib.SMTPDataError(code, response)
+
+    for chunk in lines:
+        # Dot-stuffing: a line starting with "." must be escaped (base64 lines never do)
+        if chunk.startswith(b"."):
+            chunk = b"." + chunk
+        chunk = chunk.replace(b"\r\n.", b"\r\n..")
+        server.send(chunk)
+    server.send(b".\r\n")
+
+    code, response = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+
+def send_email(subject, body, attachment_path=None, attachment=None, timeout=None):
+    """Send a basic email with an optional file attachment or (filename, fileobj) attachment."""
     email_settings = read_email_settings()
     if not email_settings:
-        print("Email settings not found or incomplete.")
+        print("Email settings not found or incomplete:", " ".join(config_store.email_settings_errors))
         return False
 
     smtp_server = email_settings['smtp_server']
@@ -59,52 +95,55 @@ def send_email(subject, body, attachment_path=None):
     smtp_username = email_settings['smtp_username']
     smtp_password = email_settings['smtp_password']
     recipient_email = email_settings['email_recipient']
+    smtp_security = email_settings['smtp_security']
+    # Socket timeout for every SMTP operation, so a stalled relay cannot hang the caller forever
+    connect_args = {'timeout': timeout} if timeout else {}
 
     # Include machine name in the subject
     machine_name = os.getenv('COMPUTERNAME', 'Unknown Machine')
     subject = f"{machine_name}: {subject}"
 
-    # Create the email
-    msg = MIMEMultipart()
-    msg['From'] = smtp_username
-    msg['To'] = recipient_email
-    msg['Subject'] = subject
-
-    msg.attach(MIMEText(body, 'plain'))
-
-    # Attach the file if provided
+    # Collect the attachments, they are only read while the message is streamed
+    attachments = []
+    attached_file = None
+    if attachment:
+        attachments.append(attachment)
     if attachment_path and os.path.exists(attachment_path):
         try:
-            with open(attachment_path, "rb") as file:
-                part = MIMEApplication(file.read(), Name=os.path.basename(attachment_path))
-                part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment_path)}"'
-                msg.attach(part)
+            attached_file = open(attachment_path, "rb")
+            attachments.append((os.path.basename(attachment_path), attached_file))
             print(f"Attachment {attachment_path} added to the email.")
         except Exception as e:
             print(f"Error attaching file {attachment_path}: {e}")
     elif attachment_path:
         print(f"Attachment file not found: {attachment_path}")
 
+    server = None
     try:
         # Connect to the SMTP server and send the email
         print(f"Connecting to SMTP server {smtp_server}:{smtp_port}...")
-        if smtp_port == "465":
+        if smtp_security == 'none':
+            # Plain SMTP, only meant for internal relays
+            server = smtplib.SMTP(smtp_server, smtp_port, **connect_args)
+        elif smtp_port == "465" or smtp_security == 'ssl':
             # Use SMTP_SSL if port 465 is specified
-            server = smtplib.SMTP_SSL(smtp_server, smtp_port)
+            server = smtplib.SMTP_SSL(smtp_server, smtp_port, **connect_args)
         else:
             # Use regular SMTP with TLS
-            server = smtplib.SMTP(smtp_server, smtp_port)
+            server = smtplib.SMTP(smtp_server, smtp_port, **connect_args)
             server.ehlo()
             server.starttls()
             print("TLS encryption enabled.")
         
         server.set_debuglevel(1)  # Enable SMTP debug output
-        print("Logging in to SMTP server...")
-        server.login(smtp_username, smtp_password)
-        print("Logged in to SMTP server successfully.")
+        if smtp_password:
+            print("Logging in to SMTP server...")
+            server.login(smtp_username, smtp_password)
+            print("Logged in to SMTP server successfully.")
 
         print(f"Sending email to {recipient_email}...")
-        server.sendmail(smtp_username, recipient_email, msg.as_string())
+        send_streamed(server, smtp_username, recipient_email,
+                      iter_message_lines(smtp_username, recipient_email, subject, body, attachments))
         print("Email sent successfully.")
         server.quit()
         print("SMTP connection closed.")
@@ -119,41 +158,165 @@ def send_email(subject, body, attachment_path=None):
         print(f"Failed to send email: {e}")
     finally:
         try:
-            server.quit()
-            print("SMTP connection closed.")
+            if server:
+                server.quit()
+                print("SMTP connection closed.")
         except Exception as e:
             print(f"Failed to close SMTP connection: {e}")
+        if attached_file:
+            attached_file.close()
     return False
 
 def get_current_csv_file():
     """Get the path of the current day's CSV file."""
-    machine_name = os.getenv('COMPUTERNAME', 'Machine')
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    csv_file_name = f"{machine_name}_{current_date}.csv"
-    csv_file_path = os.path.join(os.getcwd(), csv_file_name)
-    return csv_file_path
+    return storage.get_csv_file_path()
+
+def build_history_attachment(start, end=None, machine_name=None):
+    """Compress the stored samples between start and end into a spooled temporary file.
+
+    A container, checked as the host "<machine>/<cgroup>", gets its rows of the machine's container files.
+    """
+    end = end or datetime.now()
+    machine_name = machine_name or socket.gethostname()
+    machine, _, container = machine_name.partition('/')
+    # Small slices stay in memory, larger ones spill to a temporary file on disk
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    rows = storage.write_history_slice(spool, start, end, machine, container or None)
+    # Same characters as the aggregator allows in host names: cgroup paths have slashes
+    safe_name = re.sub(r'[^A-Za-z0-9._-]', '_', machine_name)
+    filename = f"{safe_name}_{start.strftime('%Y-%m-%d_%H%M%S')}_{end.strftime('%H%M%S')}.csv.gz"
+    print(f"History attachment {filename} prepared with {rows} rows.")
+    return filename, spool
+
+def send_alert_email(subject, body, breach_time=None, timeout=None, host=None):
+    """Send an alert email with the history around the breach attached (of `host`, this machine by default)."""
+    window = config_store.get_settings()['attachment_window']
+    start = (breach_time or datetime.now()) - timedelta(minutes=window)
+    filename, spool = build_history_attachment(start, machine_name=host)
+    try:
+        return send_email(subject, body, attachment=(filename, spool), timeout=timeout)
+    finally:
+        spool.close()
 
 def send_daily_report():
     """Send the daily report email."""
     subject = "Daily System Monitoring Report"
     body = "Please find attached the system monitoring report for today."
-    csv_file_path = get_current_csv_file()
+    now = datetime.now()
     print("Preparing to send the daily report email...")
-    return send_email(subject, body, csv_file_path)
+    filename, spool = build_history_attachment(datetime(now.year, now.month, now.day), now)
+    try:
+        return send_email(subject, body, attachment=(filename, spool))
+    finally:
+        spool.close()
 
-def send_threshold_alert(exceeded_parameter):
-    """Send an alert email when a threshold is exceeded."""
+def threshold_alert_message(exceeded_parameter):
+    """Return the subject and body of a threshold alert."""
     subject = f"Threshold Alert: {exceeded_parameter} Exceeded"
     body = f"The {exceeded_parameter} has exceeded the defined threshold for more than three minutes."
-    csv_file_path = get_current_csv_file()  # Assuming you want to attach the current CSV file
-    print(f"Preparing to send threshold alert for {exceeded_parameter}...")
-    return send_email(subject, body, csv_file_path)
+    return subject, body
 
-
-def send_drive_space_alert(drive_letter, free_space_gb):
+def drive_space_alert_message(drive_letter, free_space_gb):
+    """Return the subject and body of a drive space alert."""
     subject = f"Drive Space Alert: Drive {drive_letter} Low on Space"
     body = (f"The free space on drive {drive_letter} has fallen below the defined threshold.\n"
             f"Current free space: {free_space_gb:.2f} GB.")
-    csv_file_path = get_current_csv_file()
-    return send_email(subject, body, csv_file_path)
+    return subject, body
+
+def send_threshold_alert(exceeded_parameter, breach_time=None):
+    """Send an alert email when a threshold is exceeded."""
+    subject, body = threshold_alert_message(exceeded_parameter)
+    print(f"Preparing to send threshold alert for {exceeded_parameter}...")
+    return send_alert_email(subject, body, breach_time)
+
+
+def send_drive_space_alert(drive_letter, free_space_gb, breach_time=None):
+    subject, body = drive_space_alert_message(drive_letter, free_space_gb)
+    return send_alert_email(subject, body, breach_time)
+
+
+class AlertDigest:
+    """Collect alerts per host for a time window and send them as one summary email."""
+
+    def __init__(self, window=None, notify=None):
+        self.window = window  # Seconds to collect alerts before sending the digest; None follows digest_window
+        self.notify = notify or send_alert_email  # Called with (subject, body, breach_time, host=host)
+        self.pending = {}  # host -> {'opened': timestamp, 'metrics': {metric: stats}}
+        self.timers = {}
+        self.lock = threading.Lock()
+
+    def add(self, metric, value, threshold, unit='', above=True, host=None):
+        """Record a breach; the first breach for a host opens its collection window."""
+        host = host or socket.gethostname()
+        now = time.time()
+        # Read when a window opens, so edits of config.ini apply to the next digest
+        window = self.window if self.window is not None else config_store.get_settings()['digest_window']
+        with self.lock:
+            entry = self.pending.get(host)
+            if entry is None:
+                entry = {'opened': now, 'metrics': {}}
+                self.pending[host] = entry
+                timer = threading.Timer(window, self.flush, args=(host,))
+                timer.daemon = True
+                self.timers[host] = timer
+                timer.start()
+
+            stats = entry['metrics'].get(metric)
+            if stats is None:
+                entry['metrics'][metric] = {
+                    'peak': value, 'threshold': threshold, 'unit': unit, 'above': above,
+                    'first': now, 'last': now, 'count': 1,
+                }
+            else:
+                # For "above" breaches the worst value is the highest, otherwise the lowest
+                stats['peak'] = max(stats['peak'], value) if above else min(stats['peak'], value)
+                stats['threshold'] = threshold
+                stats['last'] = now
+                stats['count'] += 1
+
+    def flush(self, host):
+        """Send the digest collected for a host, if any."""
+        with self.lock:
+            entry = self.pending.pop(host, None)
+            self.timers.pop(host, None)
+        if not entry or not entry['metrics']:
+            return False
+
+        subject = f"Alert Digest: {len(entry['metrics'])} threshold(s) breached on {host}"
+        body = format_digest(host, entry)
+        print(f"Sending alert digest for {host} ({len(entry['metrics'])} metrics)...")
+        return self.notify(subject, body, datetime.fromtimestamp(entry['opened']), host=host)
+
+    def flush_all(self):
+        """Cancel pending timers and send every open digest immediately."""
+        with self.lock:
+            hosts = list(self.pending)
+            for timer in self.timers.values():
+                timer.cancel()
+        for host in hosts:
+            self.flush(host)
+
+def format_digest(host, entry):
+    """Build the plain-text digest body with a per-metric table of peaks and durations.
 
+    Rows are ordered by breach duration, longest first; equal durations list the most recent first.
+    """
+    opened = datetime.fromtimestamp(entry['opened']).strftime("%Y-%m-%d %H:%M:%S")
+    lines = [
+        f"The following thresholds were breached on {host} since {opened}:",
+        "",
+        f"{'Metric':<32} {'Peak':>13} {'Threshold':>13} {'First':>9} {'Last':>9} {'Duration':>9} {'Samples':>8}",
+        "-" * 99,
+    ]
+    # Worst offenders first: the longest lasting breaches are listed at the top
+    ordered = sorted(entry['metrics'].items(), key=lambda item: (item[1]['last'] - item[1]['first'], item[1]['last']), reverse=True)
+    for metric, stats in ordered:
+        unit = stats['unit'].strip()
+        duration = int(stats['last'] - stats['first'])
+        lines.append(
+            f"{metric[:32]:<32} {stats['peak']:>10.2f} {unit:<2} {stats['threshold']:>10} {unit:<2} "
+            f"{datetime.fromtimestamp(stats['first']).strftime('%H:%M:%S'):>9} "
+            f"{datetime.fromtimestamp(stats['last']).strftime('%H:%M:%S'):>9} "
+            f"{duration // 60:>5}m{duration % 60:02d}s {stats['count']:>8}"
+        )
+    return "\n".join(lines)
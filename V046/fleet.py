@@ -0,0 +1,128 @@
+import time
+import bisect
+import threading
+from collections import deque
+
+# Metrics compared across the fleet, all in percent
+FLEET_METRICS = ('cpu', 'ram', 'disk', 'gpu')
+
+# Updates kept per host and for the fleet percentiles, drawn as sparklines
+SPARKLINE_POINTS = 60
+SPARKLINE_CHARS = '▁▂▃▄▅▆▇█'
+
+# Hosts silent for this many seconds leave the percentiles
+HOST_TIMEOUT = 300
+
+def sparkline(values, low=0.0, high=100.0):
+    """Draw values as a line of block characters, scaled between low and high."""
+    steps = len(SPARKLINE_CHARS) - 1
+    span = (high - low) or 1.0
+    return ''.join(SPARKLINE_CHARS[max(0, min(steps, round((value - low) / span * steps)))] for value in values)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+class FleetModel:
+    """Latest metrics of every agent's host, with the fleet p50/p95/max kept up to date as samples arrive.
+
+    Each metric keeps the hosts' current values in a sorted list: an update moves one value
+    with bisect, and the percentiles are read by index, without sorting the fleet again.
+    Fed by the aggregator (observe_totals) on its own thread; read by the Fleet tab.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change  # Called after each update, from the aggregator thread
+        self.hosts = {}  # host -> {'values', 'history', 'last', 'updated'}
+        self.sorted = {metric: [] for metric in FLEET_METRICS}
+        self.fleet_history = {metric: deque(maxlen=SPARKLINE_POINTS) for metric in FLEET_METRICS}  # (p50, p95, max)
+        self.lock = threading.Lock()
+
+    def observe_totals(self, totals):
+        """Take the latest sample of each host that sent some: {host: (sums, count, last sample)}."""
+        now = time.monotonic()
+        with self.lock:
+            for host, (sums, count, last) in totals.items():
+                state = self.hosts.get(host)
+                if state is None:
+                    state = self.hosts[host] = {
+                        'values': None, 'last': None, 'updated': now,
+                        'history': {metric: deque(maxlen=SPARKLINE_POINTS) for metric in FLEET_METRICS},
+                    }
+                values = {metric: float(last[metric]) for metric in FLEET_METRICS}
+                state.pop('stale_values', None)
+                self.move(state['values'], values)
+                state['values'] = values
+                state['last'] = last
+                state['updated'] = now
+                for metric in FLEET_METRICS:
+                    state['history'][metric].append(values[metric])
+            self.expire(now)
+            for metric in FLEET_METRICS:
+                values = self.sorted[metric]
+                if values:
+                    self.fleet_history[metric].append((percentile(values, 0.5), percentile(values, 0.95), values[-1]))
+        if self.on_change is not None:
+            self.on_change()
+
+    def move(self, old, new):
+        """Replace a host's values in the sorted lists (old is None for a new or returning host)."""
+        for metric in FLEET_METRICS:
+            values = self.sorted[metric]
+            if old is not None:
+                del values[bisect.bisect_left(values, old[metric])]
+            bisect.insort(values, new[metric])
+
+    def expire(self, now):
+        """Take the hosts that stopped sending out of the percentiles; they stay listed as stale."""
+        for state in self.hosts.values():
+            if state['values'] is not None and now - state['updated'] > HOST_TIMEOUT:
+                for metric in FLEET_METRICS:
+                    values = self.sorted[metric]
+                    del values[bisect.bisect_left(values, state['values'][metric])]
+                state['stale_values'] = state['values']
+                state['values'] = None
+
+    def summary(self):
+        """Return {metric: (p50, p95, max, fleet p95 sparkline)} over the active hosts."""
+        with self.lock:
+            return {
+                metric: (percentile(self.sorted[metric], 0.5), percentile(self.sorted[metric], 0.95),
+                         self.sorted[metric][-1] if self.sorted[metric] else None,
+                         sparkline(p95 for p50, p95, high in self.fleet_history[metric]))
+                for metric in FLEET_METRICS
+            }
+
+    def host_count(self):
+        with self.lock:
+            return len(self.sorted[FLEET_METRICS[0]]), len(self.hosts)
+
+    def rows(self, sort_key='worst', limit=None):
+        """Return the hosts as (host, values, sparklines, stale), worst first.
+
+        sort_key is a metric, or 'worst' for the highest of a host's metrics. Sparklines are
+        only drawn for the rows returned.
+        """
+        def severity(item):
+            host, state, values, stale = item
+            score = max(values.values()) if sort_key == 'worst' else values[sort_key]
+            return (not stale, score)
+
+        with self.lock:
+            items = []
+            for host, state in self.hosts.items():
+                stale = state['values'] is None
+                items.append((host, state, state['stale_values'] if stale else state['values'], stale))
+            items.sort(key=severity, reverse=True)
+            if limit:
+                items = items[:limit]
+            return [(host, values, {metric: sparkline(state['history'][metric]) for metric in FLEET_METRICS}, stale)
+                    for host, state, values, stale in items]
+
+    def last_sample(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+            return state['last'] if state else None
@@ -0,0 +1,174 @@
+import struct
+
+# Gorilla-style compression of a block of samples (Pelkonen et al., "Gorilla: A Fast, Scalable,
+# In-Memory Time Series Database", VLDB 2015), written one sample at a time:
+#   timestamp  first one as 64 bits, then the delta of the deltas:
+#              '0' when the interval did not change, else '10' + 7 bits, '110' + 9 bits,
+#              '1110' + 12 bits or '1111' + 64 bits
+#   each value first one as 64 bits, then XORed with the previous one:
+#              '0' when equal, '10' + the meaningful bits inside the previous window,
+#              '11' + 5 bits of leading zeros + 6 bits of length + the meaningful bits
+# Timestamps are kept in milliseconds; values are 64-bit floats.
+TIMESTAMP_SCALE = 1000
+
+MASK64 = (1 << 64) - 1
+
+_DOUBLE = struct.Struct('>d')
+
+# Delta-of-delta buckets: (control bits, control value, value bits, offset)
+DOD_BUCKETS = ((2, 0b10, 7, 63), (3, 0b110, 9, 255), (4, 0b1110, 12, 2047))
+
+def float_bits(value):
+    return int.from_bytes(_DOUBLE.pack(value), 'big')
+
+def bits_float(bits):
+    return _DOUBLE.unpack(bits.to_bytes(8, 'big'))[0]
+
+class BlockEncoder:
+    """Compress samples as they are appended; finish() returns the block's bytes so far."""
+
+    def __init__(self, field_count):
+        self.field_count = field_count
+        self.count = 0
+        self.out = bytearray()
+        self.acc = 0  # Bits not written to out yet
+        self.acc_bits = 0
+        self.last_time = 0
+        self.last_delta = 0
+        self.last_values = [0] * field_count
+        # (leading zeros, trailing zeros) of each field's last meaningful bits; 65 forces a new window
+        self.windows = [(65, 0)] * field_count
+
+    def write(self, value, bits):
+        acc = (self.acc << bits) | value
+        total = self.acc_bits + bits
+        if total >= 64:
+            spare = total & 7
+            self.out += (acc >> spare).to_bytes((total - spare) >> 3, 'big')
+            acc &= (1 << spare) - 1
+            total = spare
+        self.acc = acc
+        self.acc_bits = total
+
+    def append(self, timestamp, values):
+        write = self.write
+        time_ms = int(round(timestamp * TIMESTAMP_SCALE))
+        if self.count == 0:
+            write(time_ms & MASK64, 64)
+            for index, value in enumerate(values):
+                bits = float_bits(value)
+                write(bits, 64)
+                self.last_values[index] = bits
+        else:
+            delta = time_ms - self.last_time
+            dod = delta - self.last_delta
+            self.last_delta = delta
+            if dod == 0:
+                write(0, 1)
+            else:
+                for control_bits, control, value_bits, offset in DOD_BUCKETS:
+                    if -offset <= dod <= offset + 1:
+                        write((control << value_bits) | (dod + offset), control_bits + value_bits)
+                        break
+                else:
+                    write(0b1111, 4)
+                    write(dod & MASK64, 64)
+
+            last_values = self.last_values
+            windows = self.windows
+            for index, value in enumerate(values):
+                bits = float_bits(value)
+                xor = bits ^ last_values[index]
+                last_values[index] = bits
+                if xor == 0:
+                    write(0, 1)
+                    continue
+                leading = min(64 - xor.bit_length(), 31)
+                trailing = (xor & -xor).bit_length() - 1
+                previous_leading, previous_trailing = windows[index]
+                if leading >= previous_leading and trailing >= previous_trailing:
+                    length = 64 - previous_leading - previous_trailing
+                    write((0b10 << length) | (xor >> previous_trailing), 2 + length)
+                else:
+                    length = 64 - leading - trailing
+                    write((((0b11 << 5 | leading) << 6 | (length & 63)) << length) | (xor >> trailing), 13 + length)
+                    windows[index] = (leading, trailing)
+        self.last_time = time_ms
+        self.count += 1
+
+    def finish(self):
+        """Return the compressed block, padded to whole bytes; more samples can still be appended."""
+        pad = -self.acc_bits & 7
+        tail = (self.acc << pad).to_bytes((self.acc_bits + pad) >> 3, 'big')
+        return bytes(self.out) + tail
+
+def decode_block(data, count, field_count):
+    """Decode a block of `count` samples into (timestamps, [values of each field]).
+
+    Raises ValueError when the block is too short for its sample count.
+    """
+    size = len(data) * 8
+    # Every sample after the first takes at least one bit per timestamp and value
+    if count and size < 64 * (field_count + 1) + (count - 1) * (field_count + 1):
+        raise ValueError("block too short for its sample count")
+    data = bytes(data) + bytes(9)  # Reads never run past the end of the buffer
+    pos = 0
+
+    def read(bits):
+        nonlocal pos
+        start = pos >> 3
+        end = (pos + bits + 7) >> 3
+        chunk = int.from_bytes(data[start:end], 'big')
+        shift = (end << 3) - pos - bits
+        pos += bits
+        return (chunk >> shift) & ((1 << bits) - 1)
+
+    timestamps = []
+    columns = [[] for _ in range(field_count)]
+    if count == 0:
+        return timestamps, columns
+
+    time_ms = read(64)
+    delta = 0
+    last_values = [read(64) for _ in range(field_count)]
+    windows = [(65, 0)] * field_count
+    timestamps.append(time_ms / TIMESTAMP_SCALE)
+    for index, bits in enumerate(last_values):
+        columns[index].append(bits_float(bits))
+
+    for _ in range(count - 1):
+        if read(1):
+            if not read(1):
+                delta += read(7) - 63
+            elif not read(1):
+                delta += read(9) - 255
+            elif not read(1):
+                delta += read(12) - 2047
+            else:
+                dod = read(64)
+                delta += dod - (1 << 64) if dod >> 63 else dod
+        time_ms += delta
+        timestamps.append(time_ms / TIMESTAMP_SCALE)
+
+        for index in range(field_count):
+            if read(1):
+                if read(1):
+                    leading = read(5)
+                    length = read(6) or 64
+                    trailing = 64 - leading - length
+                    windows[index] = (leading, trailing)
+                    last_values[index] ^= read(length) << trailing
+                else:
+                    leading, trailing = windows[index]
+                    last_values[index] ^= read(64 - leading - trailing) << trailing
+            columns[index].append(bits_float(last_values[index]))
+    if pos > size:
+        raise ValueError("block too short for its sample count")
+    return timestamps, columns
+
+def encode_block(timestamps, columns):
+    """Compress samples given as a list of timestamps and one list of values per field."""
+    encoder = BlockEncoder(len(columns))
+    for index, timestamp in enumerate(timestamps):
+        encoder.append(timestamp, [column[index] for column in columns])
+    return encoder.finish()
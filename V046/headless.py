@@ -0,0 +1,151 @@
+import sys
+import signal
+import argparse
+import threading
+from config_store import settings, load_settings, get_settings, reload_settings, enabled_plugins
+from sampler import SamplingJob, stop_slow_collectors
+from scheduler import Scheduler, wakeups
+import monitoring
+
+# Seconds between two reports of the wakeups per minute in the log
+REPORT_INTERVAL = 600
+
+# Seconds between two polls of the drives exported by the HTTP server
+DRIVE_POLL_INTERVAL = 60
+
+def get_refresh_rate():
+    try:
+        return int(settings['refresh_rate'])
+    except (ValueError, TypeError):
+        return 60  # Fallback default if parsing fails
+
+def run_checks():
+    get_settings()  # Pick up edits of config.ini
+    monitoring.run_checks()
+
+def report_wakeups():
+    print(f"Wakeups in the last minute: {wakeups.per_minute()}")
+
+def main(argv=None):
+    """Run the sampler, the CSV logging and the alert pipeline without tkinter or matplotlib."""
+    parser = argparse.ArgumentParser(description="Run PySentinel as a service: sampling, CSV logging and alerting, no GUI.")
+    parser.add_argument('--headless', action='store_true', help="Accepted for compatibility with PySentinel_V046.py --headless")
+    parser.add_argument('--interval', type=int, default=monitoring.CHECK_INTERVAL, help="Seconds between alert checks")
+    parser.add_argument('--listen', default=None, help="Also store and check the samples of agents (agent.py) connecting to host:port or unix:/path")
+    parser.add_argument('--http', default=None, help="Serve /metrics and the JSON API on host:port (overrides http_address in config.ini)")
+    parser.add_argument('--alert-workers', type=int, default=0, help="Processes running the agents' alert checks, sharded by host (0: in this process)")
+    args = parser.parse_args(argv)
+
+    load_settings()
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, shutting down...")
+        stop_event.set()
+
+    # SIGBREAK is what Windows sends for Ctrl+Break and when a console service is stopped
+    for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), request_stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload_settings())
+
+    # Embedded HTTP server, fed with every sample and the drive usage
+    status_server = drive_poller = None
+    http_address = args.http if args.http is not None else settings['http_address']
+    if http_address:
+        # Only imported when enabled, like the aggregator below: a plain service starts faster
+        import drives
+        from status_server import StatusServer
+        drive_poller = drives.DrivePoller(lambda changed, removed: None)
+        status_server = StatusServer(http_address, lambda: drive_poller.drives.values())
+        status_server.start()
+
+    # Latest sample in shared memory, for local tools reading it with shared_snapshot.SnapshotReader
+    publisher = None
+    if settings['shared_memory']:
+        from shared_snapshot import SnapshotPublisher
+        try:
+            publisher = SnapshotPublisher(settings['shared_memory'])
+        except OSError as e:
+            print(f"Cannot publish the latest sample as {settings['shared_memory']!r}: {e}")
+
+    def on_sample(sample):
+        if status_server is not None:
+            status_server.update(sample)
+        if publisher is not None:
+            publisher.publish(sample)
+
+    # One thread runs everything; the sampling job writes every sample to the daily CSV file
+    scheduler = Scheduler()
+    scheduler.add('sampling', SamplingJob(on_sample), get_refresh_rate)
+    if drive_poller is not None:
+        scheduler.add('drives', drive_poller.poll, DRIVE_POLL_INTERVAL)
+    scheduler.add('checks', run_checks, args.interval)
+    scheduler.add('report', report_wakeups, REPORT_INTERVAL)
+
+    # Per-container metrics from the cgroup v2 files, stored and checked like this machine's
+    container_job = None
+    if settings['container_monitoring'] == 'on':
+        import cgroups
+        if cgroups.is_cgroup2(settings['cgroup_root']):
+            container_monitor = monitoring.HostMonitor(args.interval)
+            container_job = cgroups.ContainerJob(settings['cgroup_root'], container_monitor)
+            scheduler.add('containers', container_job, get_refresh_rate)
+            scheduler.add('container-checks', container_monitor.run_checks, args.interval)
+        else:
+            print(f"No cgroup v2 hierarchy at {settings['cgroup_root']}, container monitoring disabled.")
+
+    # Third-party collectors, only imported when switched on in config.ini: stored and checked like the sampler's metrics
+    loaded_plugins = []
+    if enabled_plugins():
+        import plugins
+        loaded_plugins = plugins.load_enabled()
+        for plugin in loaded_plugins:
+            scheduler.add(f'plugin-{plugin.name}', plugins.PluginJob(plugin), get_refresh_rate)
+            monitoring.extra_checks.append(plugin.breaches)
+
+    # Central instance: the agents' samples go to their own CSV files and through the same alerting
+    server = shards = None
+    if args.listen:
+        import aggregator
+        if args.alert_workers > 0:
+            alerts = shards = aggregator.AlertShards(args.alert_workers, args.interval)
+        else:
+            alerts = monitoring.HostMonitor(args.interval)
+            scheduler.add('agent-checks', alerts.run_checks, args.interval)
+        server = aggregator.Aggregator(args.listen, [alerts])
+        server.start()
+        scheduler.add('ingest-report', lambda: print(f"Aggregator: {server.stats()}"), REPORT_INTERVAL)
+    scheduler.start()
+    print(f"PySentinel running headless (sampling every {get_refresh_rate()} s, checks every {args.interval} s).")
+
+    try:
+        # Windows only handles Ctrl+C between waits, elsewhere a signal interrupts the wait
+        timeout = 5 if sys.platform == 'win32' else None
+        while not stop_event.wait(timeout):
+            pass
+    finally:
+        scheduler.stop()
+        scheduler.join(timeout=5)
+        if container_job is not None:
+            container_job.close()
+        for plugin in loaded_plugins:
+            plugin.close()
+        if server is not None:
+            server.stop()
+        if shards is not None:
+            shards.stop()
+        if status_server is not None:
+            status_server.stop()
+            drive_poller.stop()
+        if publisher is not None:
+            publisher.close()
+        stop_slow_collectors()
+        # Send the alerts still waiting in an open digest window before exiting
+        monitoring.shutdown()
+        print("PySentinel stopped.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
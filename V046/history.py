@@ -0,0 +1,158 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+import storage
+from downsample import lttb
+
+# Points kept per day for wide ranges (one every 5 minutes), computed once per day file
+SUMMARY_POINTS = 288
+SUMMARY_RESOLUTION = 24 * 3600 / SUMMARY_POINTS
+
+# Days of full-resolution samples kept in memory for zoomed-in views
+RAW_CACHE_DAYS = 8
+
+class HistoryStore:
+    """Serve the stored samples of any time range at a given resolution, caching per day file.
+
+    Wide ranges are built from small per-day summaries and narrow ones from the raw samples of a
+    few recent days, so memory stays bounded however much history is browsed.
+    """
+
+    def __init__(self, keys=None, machine_name=None):
+        self.keys = list(keys or storage.SAMPLE_COLUMNS)
+        self.machine_name = machine_name
+        self.raw = OrderedDict()  # day -> (signature, {key: (x, y)}), least recently used first
+        self.summaries = {}  # day -> (signature, {key: (x, y)})
+        self.lock = threading.Lock()
+
+    def signature(self, day):
+        """Return what identifies the current content of a day file, or None if there is no file."""
+        try:
+            stat = os.stat(storage.get_csv_file_path(day, self.machine_name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def day_samples(self, day, signature=None):
+        """Return the full-resolution samples of a day as {key: (timestamps, values)}."""
+        signature = signature or self.signature(day)
+        with self.lock:
+            cached = self.raw.get(day)
+            if cached is not None and cached[0] == signature:
+                self.raw.move_to_end(day)
+                return cached[1]
+
+        timestamps, columns = storage.load_history(day, day + timedelta(days=1) - timedelta(seconds=1), self.machine_name)
+        series = {key: (timestamps, columns[key]) for key in self.keys}
+        with self.lock:
+            self.raw[day] = (signature, series)
+            self.raw.move_to_end(day)
+            while len(self.raw) > RAW_CACHE_DAYS:
+                self.raw.popitem(last=False)
+        return series
+
+    def day_summary(self, day, signature=None):
+        """Return the samples of a day reduced to SUMMARY_POINTS per series."""
+        signature = signature or self.signature(day)
+        with self.lock:
+            cached = self.summaries.get(day)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+        series = {key: lttb(x, y, SUMMARY_POINTS) for key, (x, y) in self.day_samples(day, signature).items()}
+        with self.lock:
+            self.summaries[day] = (signature, series)
+        return series
+
+    def first_day(self):
+        """Return the oldest day with stored samples, or None."""
+        days = storage.list_days(self.machine_name)
+        return days[0] if days else None
+
+    def fetch(self, start, end, points, cancelled=None):
+        """Return {key: (timestamps, values)} between two epoch timestamps, at most `points` per series.
+
+        Returns None if `cancelled()` becomes true, i.e. the view moved before the data was ready.
+        """
+        points = max(int(points), 3)
+        coarse = (end - start) / points >= SUMMARY_RESOLUTION
+        parts = {key: [] for key in self.keys}
+
+        day = datetime.fromtimestamp(start).replace(hour=0, minute=0, second=0, microsecond=0)
+        last_day = datetime.fromtimestamp(end)
+        while day <= last_day:
+            if cancelled is not None and cancelled():
+                return None
+            signature = self.signature(day)
+            if signature is not None:
+                series = self.day_summary(day, signature) if coarse else self.day_samples(day, signature)
+                for key in self.keys:
+                    parts[key].append(series[key])
+            day += timedelta(days=1)
+
+        result = {}
+        for key in self.keys:
+            if parts[key]:
+                x = np.concatenate([part[0] for part in parts[key]])
+                y = np.concatenate([part[1] for part in parts[key]])
+            else:
+                x, y = np.empty(0), np.empty(0)
+            # Keep one sample beyond each edge so the lines reach the borders of the view
+            low = max(int(np.searchsorted(x, start)) - 1, 0)
+            high = min(int(np.searchsorted(x, end, side='right')) + 1, len(x))
+            x, y = x[low:high], y[low:high]
+            if len(x) > points:
+                x, y = lttb(x, y, points)
+            result[key] = (x, y)
+        return result
+
+class HistoryLoader(threading.Thread):
+    """Answer range requests in the background: only the latest request is served, then the
+    ranges on both sides of it are loaded into the cache so panning finds them ready."""
+
+    def __init__(self, store, on_result):
+        super().__init__(name="history-loader", daemon=True)
+        self.store = store
+        self.on_result = on_result  # Called on this thread with (generation, start, end, series)
+        self.requests = queue.Queue()
+        self.generation = 0
+
+    def request(self, start, end, points):
+        """Ask for a range; older requests still waiting are dropped. Returns the request generation."""
+        self.generation += 1
+        self.requests.put((self.generation, start, end, points))
+        return self.generation
+
+    def stop(self):
+        self.requests.put(None)
+
+    def run(self):
+        while True:
+            item = self.requests.get()
+            # Skip straight to the most recent request
+            while item is not None:
+                try:
+                    item = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+            if item is None:
+                return
+
+            generation, start, end, points = item
+            cancelled = lambda: generation != self.generation
+            try:
+                series = self.store.fetch(start, end, points, cancelled)
+                if series is None:
+                    continue
+                self.on_result(generation, start, end, series)
+
+                # Prefetch the adjacent ranges unless the view has already moved on
+                span = end - start
+                for adjacent_start, adjacent_end in ((start - span, start), (end, end + span)):
+                    if self.store.fetch(adjacent_start, adjacent_end, points, cancelled) is None:
+                        break
+            except Exception as e:
+                print(f"Error loading history: {e}")
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+import argparse
+
+# pip package name -> module it provides. Run this once at install/upgrade time, never from the monitor itself.
+REQUIRED_PACKAGES = {
+    'psutil': 'psutil',
+    'matplotlib': 'matplotlib',  # Graphs (GUI only)
+    'numpy': 'numpy',  # Graph buffers and downsampling (GUI only)
+    'setuptools': 'setuptools',  # Provides distutils for GPUtil on Python 3.12+
+    'GPUtil': 'GPUtil',  # GPU monitoring
+}
+
+# Packages only needed on some platforms
+if sys.platform == 'win32':
+    REQUIRED_PACKAGES['WMI'] = 'wmi'  # Disk usage monitoring on Windows
+
+def find_missing_packages():
+    """Return the pip names of the required packages that cannot be imported."""
+    missing = []
+    for package_name, module_name in REQUIRED_PACKAGES.items():
+        try:
+            __import__(module_name)
+        except ImportError:
+            missing.append(package_name)
+    return missing
+
+def check_and_install_dependencies():
+    """Install the required packages that are missing."""
+    for package_name in find_missing_packages():
+        print(f"{package_name} not found. Installing...")
+        subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
+        print(f"{package_name} installed successfully.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Install the packages PySentinel depends on.")
+    parser.add_argument('--check', action='store_true', help="Only list the missing packages; exit with 1 if any")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        missing = find_missing_packages()
+        for package_name in missing:
+            print(f"{package_name} is not installed.")
+        if not missing:
+            print("All dependencies are installed.")
+        return 1 if missing else 0
+
+    check_and_install_dependencies()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+import gorilla
+import protocol
+
+class LoadStats:
+    def __init__(self):
+        self.connected = 0
+        self.sent = 0
+        self.acknowledged = 0
+        self.errors = 0
+        self.latencies = []  # Seconds between sending a frame and receiving its ACK
+
+    def error(self, message):
+        self.errors += 1
+        if self.errors == 1:
+            print(message)  # The first one only: thousands of agents tend to fail the same way
+
+async def read_acks(reader, sent_at, stats):
+    frames = protocol.FrameReader()
+    last = 0
+    while True:
+        data = await reader.read(4096)
+        if not data:
+            return
+        for frame_type, payload in frames.feed(data):
+            sequence = protocol.decode_ack(payload)
+            stats.acknowledged += sequence - last
+            last = sequence
+            sent = sent_at.pop(sequence, None)
+            if sent is not None:
+                stats.latencies.append(time.monotonic() - sent)
+
+async def simulate_agent(index, is_unix, address, interval, batch, compress, deadline, stats):
+    """One simulated agent: HELLO, then `batch` random samples every `interval` seconds."""
+    try:
+        if is_unix:
+            reader, writer = await asyncio.open_unix_connection(address)
+        else:
+            reader, writer = await asyncio.open_connection(*address)
+    except OSError as e:
+        stats.error(f"Connection failed: {e} (raise the open files limit for many agents, e.g. ulimit -n)")
+        return
+    stats.connected += 1
+    writer.write(protocol.encode_hello(f"loadgen-{index:05d}", random.getrandbits(63)))
+    sent_at = {}
+    acks = asyncio.ensure_future(read_acks(reader, sent_at, stats))
+    sequence = 0
+    rng = random.Random(index)
+    # Spread the agents over the interval instead of sending in one burst
+    await asyncio.sleep(rng.random() * interval)
+    try:
+        while time.monotonic() < deadline:
+            now = time.time()
+            samples = [{
+                'timestamp': now - (batch - 1 - i) * interval / batch,
+                'cpu': rng.uniform(0, 100), 'ram': rng.uniform(20, 90), 'disk': rng.uniform(0, 50), 'gpu': 0.0,
+                'network_in': index * 1.5, 'network_out': index * 0.5,
+            } for i in range(batch)]
+            if compress:
+                block = gorilla.encode_block([sample['timestamp'] for sample in samples],
+                                             [[sample[field] for sample in samples] for field in protocol.SAMPLE_FIELDS])
+                writer.write(protocol.encode_block(sequence + 1, batch, block))
+            else:
+                writer.write(protocol.encode_samples(sequence + 1, samples))
+            sequence += batch
+            sent_at[sequence] = time.monotonic()
+            stats.sent += batch
+            await writer.drain()
+            await asyncio.sleep(interval)
+        await asyncio.sleep(2)  # Let the last ACKs arrive
+    except OSError as e:
+        stats.error(f"Agent {index} disconnected: {e}")
+    finally:
+        acks.cancel()
+        writer.close()
+
+async def run(args):
+    is_unix, address = protocol.parse_address(args.server)
+    stats = LoadStats()
+    deadline = time.monotonic() + args.duration
+    agents = [simulate_agent(i, is_unix, address, args.interval, args.batch, args.compress, deadline, stats) for i in range(args.agents)]
+    await asyncio.gather(*agents)
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many agents against an aggregator and report the sustained ingest rate.")
+    parser.add_argument('--server', default=f"127.0.0.1:{protocol.DEFAULT_PORT}", help="Aggregator address: host:port or unix:/path/to/socket")
+    parser.add_argument('--agents', type=int, default=1000, help="Number of simulated agents")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between two frames of an agent")
+    parser.add_argument('--batch', type=int, default=1, help="Samples per frame")
+    parser.add_argument('--compress', action='store_true', help="Send Gorilla-compressed BLOCK frames, like agents with --batch")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run")
+    args = parser.parse_args(argv)
+    if args.agents < 1 or args.interval <= 0 or not 1 <= args.batch <= protocol.MAX_SAMPLES_PER_FRAME:
+        parser.error("--agents, --interval and --batch must be positive, --batch at most the frame limit")
+
+    print(f"Simulating {args.agents} agents for {args.duration:.0f} s ({args.agents * args.batch / args.interval:.0f} samples/s offered)...")
+    stats = asyncio.run(run(args))
+    latencies = sorted(stats.latencies)
+    print(f"Connected agents: {stats.connected}/{args.agents}, errors: {stats.errors}")
+    print(f"Samples sent: {stats.sent}, acknowledged: {stats.acknowledged}")
+    print(f"Sustained ingest rate: {stats.acknowledged / args.duration:.0f} samples/s")
+    if latencies:
+        print(f"ACK latency: median {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms")
+    return 0 if stats.errors == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import time
+import socket
+import threading
+import psutil
+from sampler import collect_slow, CpuMeter
+from config_store import settings, drive_key
+from email_sender import AlertDigest
+import notifiers
+import anomaly
+
+def monitor_drive_space():
+    """Monitor the free space of each drive and send an alert if below the threshold.
+
+    Returns the drives below their threshold as (metric, value, threshold, unit).
+    """
+    low = []
+    for partition in psutil.disk_partitions():
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+            free_space_gb = usage.free / (1024 ** 3)  # Convert bytes to GB
+            
+            # Get thresholds from settings, under the same key load_settings and the Drives tab use
+            normalized_drive = drive_key(partition.mountpoint)
+            if not settings.get(f'drive_{normalized_drive}_enabled', 1):
+                continue
+            min_threshold = settings.get(f'drive_{normalized_drive}_min_threshold', 10)  # Default threshold to 10GB
+            
+            # Check if the free space is below the threshold
+            if free_space_gb < min_threshold:
+                low.append((f"Free Space {partition.mountpoint}", free_space_gb, min_threshold, ' GB'))
+                if settings['digest_mode']:
+                    # Coalesce with the other breaches of this host instead of one email per drive
+                    alert_digest.add(f"Free Space {partition.mountpoint}", free_space_gb, min_threshold, unit=' GB', above=False)
+                else:
+                    # Delivered by the notification sinks in the background
+                    notifiers.notify_drive_space_alert(partition.mountpoint, free_space_gb)
+        except PermissionError:
+            print(f"Permission denied for {partition.device}")
+    return low
+            
+# Seconds between two runs of the checks
+CHECK_INTERVAL = 60
+
+# Average CPU usage since the previous check, read without blocking
+cpu_meter = CpuMeter()
+
+# Callables returning more (message, metric, value, threshold, unit) breaches for this machine's checks,
+# such as the threshold rules of the plugin collectors (plugins.py)
+extra_checks = []
+
+# Alert digest shared by the drive and threshold monitors, its window following digest_window
+alert_digest = AlertDigest(notify=notifiers.notify)
+
+# Streaming anomaly detectors, rebuilt when the detector type or threshold changes
+anomaly_monitor = None
+
+def check_anomalies(values):
+    """Feed the latest values to the anomaly detectors and return the anomalies found."""
+    global anomaly_monitor
+    kind = settings['anomaly_detection']
+    if kind not in anomaly.DETECTORS:
+        return []
+    if anomaly_monitor is None or anomaly_monitor.kind != kind or anomaly_monitor.threshold != settings['anomaly_threshold']:
+        anomaly_monitor = anomaly.AnomalyMonitor(kind, settings['anomaly_threshold'])
+    return anomaly_monitor.observe(values, time.time())
+
+# Breaches found by the latest checks, read by the HTTP endpoints:
+# host -> {metric: {'value', 'threshold', 'unit', 'since'}}
+active_alerts = {}
+active_alerts_lock = threading.Lock()
+
+def set_active_alerts(host, breaches):
+    """Replace the active alerts of a host with the (metric, value, threshold, unit) breaches of its latest check."""
+    now = time.time()
+    with active_alerts_lock:
+        if not breaches:
+            active_alerts.pop(host, None)  # Hosts come and go (containers, agents): keep no empty entries
+            return
+        previous = active_alerts.get(host, {})
+        active_alerts[host] = {
+            metric: {'value': value, 'threshold': threshold, 'unit': unit,
+                     'since': previous[metric]['since'] if metric in previous else now}
+            for metric, value, threshold, unit in breaches
+        }
+
+def get_active_alerts():
+    """Return a copy of the active alerts of every host that has some."""
+    with active_alerts_lock:
+        return {host: dict(alerts) for host, alerts in active_alerts.items() if alerts}
+
+def usage_breaches(cpu_usage, ram_usage, gpu_usage, anomalies):
+    """Compare CPU, RAM and GPU usage with their thresholds and list the breaches and anomalies.
+
+    Every breach is (message, metric, value, threshold, unit): the message goes in the alert,
+    the rest in the alert digest.
+    """
+    breaches = []
+    if cpu_usage > settings['cpu_max_threshold']:
+        breaches.append((f"CPU Usage ({cpu_usage}%) exceeded threshold ({settings['cpu_max_threshold']}%)",
+                         "CPU Usage", cpu_usage, settings['cpu_max_threshold'], '%'))
+    if ram_usage > settings['ram_max_threshold']:
+        breaches.append((f"RAM Usage ({ram_usage}%) exceeded threshold ({settings['ram_max_threshold']}%)",
+                         "RAM Usage", ram_usage, settings['ram_max_threshold'], '%'))
+    if gpu_usage > settings['gpu_max_threshold']:
+        breaches.append((f"GPU Usage ({gpu_usage}%) exceeded threshold ({settings['gpu_max_threshold']}%)",
+                         "GPU Usage", gpu_usage, settings['gpu_max_threshold'], '%'))
+
+    # Anomaly rules: compare against the learned baseline instead of a fixed limit
+    for metric, value, expected, score in anomalies:
+        breaches.append((f"{metric} ({value:.2f}%) is anomalous, expected about {expected:.2f}% (score {score:.1f})",
+                         f"{metric} (anomaly)", value, round(expected, 2), '%'))
+    return breaches
+
+def network_breaches(network_in_cumulative, network_out_cumulative):
+    """Compare the cumulative upload and download (MB) with their thresholds."""
+    breaches = []
+    if network_out_cumulative > settings['network_upload_max_threshold']:
+        breaches.append((f"Network Upload ({network_out_cumulative:.2f} MB) exceeded threshold ({settings['network_upload_max_threshold']} MB)",
+                         "Network Upload", network_out_cumulative, settings['network_upload_max_threshold'], ' MB'))
+    if network_in_cumulative > settings['network_download_max_threshold']:
+        breaches.append((f"Network Download ({network_in_cumulative:.2f} MB) exceeded threshold ({settings['network_download_max_threshold']} MB)",
+                         "Network Download", network_in_cumulative, settings['network_download_max_threshold'], ' MB'))
+    return breaches
+
+def pressure_breaches(sample):
+    """Compare a container's pressure-stall shares (cgroups.py) with their threshold; other samples have none."""
+    breaches = []
+    threshold = settings['pressure_max_threshold']
+    for key, metric in (('cpu_pressure', "CPU Pressure"), ('memory_pressure', "Memory Pressure"), ('io_pressure', "IO Pressure")):
+        value = sample.get(key)
+        if value is not None and value > threshold:
+            breaches.append((f"{metric} ({value}%) exceeded threshold ({threshold}%)", metric, value, threshold, '%'))
+    return breaches
+
+def report_breaches(breaches, host=None):
+    """Send the breaches of a host (this machine by default) as one alert, or add them to the digest."""
+    # In digest mode the breaches are collected and sent as one summary per window
+    if settings['digest_mode']:
+        for message, metric, value, threshold, unit in breaches:
+            alert_digest.add(metric, value, threshold, unit=unit, host=host)
+        return
+
+    # Send alert if any thresholds are exceeded
+    if breaches:
+        exceeded_params_str = "\n".join(breach[0] for breach in breaches)
+        print("Sending threshold exceedance alert...")
+        notifiers.notify_threshold_alert(exceeded_params_str, host=host)
+
+def monitor_thresholds():
+    """Monitor system thresholds like CPU, RAM, GPU, Disk, and Network usage and send alerts if thresholds are exceeded."""
+    cpu_usage = cpu_meter.percent()
+    ram_usage = psutil.virtual_memory().percent
+    gpu_usage = collect_slow('gpu')[0]  # The last value if GPUtil is late
+    anomalies = check_anomalies(anomaly.anomaly_values({'cpu': cpu_usage, 'ram': ram_usage, 'gpu': gpu_usage}))
+    breaches = usage_breaches(cpu_usage, ram_usage, gpu_usage, anomalies)
+
+    # Monitor Disk usage
+    for partition in psutil.disk_partitions():
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+            disk_usage = (usage.used / usage.total) * 100  # Get disk usage as percentage
+            if disk_usage > settings['disk_max_threshold']:
+                breaches.append((f"Disk Usage ({disk_usage:.2f}%) on {partition.device} exceeded threshold ({settings['disk_max_threshold']}%)",
+                                 f"Disk Usage {partition.device}", disk_usage, settings['disk_max_threshold'], '%'))
+        except PermissionError:
+            print(f"Permission denied for {partition.device}")
+
+    # Monitor Network usage
+    network_io = psutil.net_io_counters()
+    network_in_cumulative = (network_io.bytes_recv / (1024 * 1024))  # Convert to MB
+    network_out_cumulative = (network_io.bytes_sent / (1024 * 1024))  # Convert to MB
+    breaches += network_breaches(network_in_cumulative, network_out_cumulative)
+
+    for check in extra_checks:
+        breaches += check()
+
+    report_breaches(breaches)
+    return breaches
+
+# Sample keys averaged over a check interval for the agents' hosts
+USAGE_KEYS = ('cpu', 'ram', 'gpu')
+
+# A host silent for this many check intervals is forgotten, with its active alerts
+HOST_TIMEOUT_CHECKS = 3
+
+class HostMonitor:
+    """Threshold and anomaly checks on the samples streamed by agents (see aggregator.py) or of containers (cgroups.py).
+
+    Samples are folded into per-host sums as they arrive; run_checks() evaluates and
+    resets them once per check interval, like monitor_thresholds() does for this machine.
+    Hosts that stop sending are dropped after HOST_TIMEOUT_CHECKS intervals, or right away
+    through forget() when their source knows they are gone.
+    """
+
+    def __init__(self, interval=CHECK_INTERVAL):
+        self.hosts = {}  # host -> {'sums': {key: total}, 'count': n, 'last': sample, 'anomaly': AnomalyMonitor, 'seen': monotonic time}
+        self.timeout = HOST_TIMEOUT_CHECKS * interval
+        self.lock = threading.Lock()
+
+    def observe_totals(self, totals):
+        """Add the samples received, summarized per host as {host: (sums, count, last sample)}."""
+        now = time.monotonic()
+        with self.lock:
+            for host, (sums, count, last) in totals.items():
+                state = self.hosts.get(host)
+                if state is None:
+                    state = self.hosts[host] = {'sums': dict.fromkeys(USAGE_KEYS, 0.0), 'count': 0, 'last': None, 'anomaly': None}
+                for key in USAGE_KEYS:
+                    state['sums'][key] += sums[key]
+                state['count'] += count
+                state['last'] = last
+                state['seen'] = now
+
+    def forget(self, hosts):
+        """Drop hosts known to be gone, such as removed containers, and clear their active alerts."""
+        with self.lock:
+            for host in hosts:
+                self.hosts.pop(host, None)
+        for host in hosts:
+            set_active_alerts(host, [])
+
+    def run_checks(self):
+        """Check the averages of every host that sent samples since the previous run, and expire the silent ones."""
+        now = time.monotonic()
+        with self.lock:
+            ready = []
+            expired = [host for host, state in self.hosts.items() if now - state['seen'] > self.timeout]
+            for host in expired:
+                del self.hosts[host]
+            for host, state in self.hosts.items():
+                if state['count']:
+                    averages = {key: round(total / state['count'], 1) for key, total in state['sums'].items()}
+                    ready.append((host, state, averages, state['last']))
+                    state['sums'] = dict.fromkeys(state['sums'], 0.0)
+                    state['count'] = 0
+
+        kind = settings['anomaly_detection']
+        for host, state, averages, last in ready:
+            anomalies = []
+            if kind in anomaly.DETECTORS:
+                monitor = state['anomaly']
+                if monitor is None or monitor.kind != kind or monitor.threshold != settings['anomaly_threshold']:
+                    monitor = state['anomaly'] = anomaly.AnomalyMonitor(kind, settings['anomaly_threshold'])
+                anomalies = monitor.observe(anomaly.anomaly_values(averages), last['timestamp'])
+            breaches = usage_breaches(averages['cpu'], averages['ram'], averages['gpu'], anomalies)
+            if 'network_in' in last:
+                breaches += network_breaches(last['network_in'], last['network_out'])
+            breaches += pressure_breaches(last)
+            report_breaches(breaches, host)
+            set_active_alerts(host, [breach[1:] for breach in breaches])
+        for host in expired:
+            print(f"No samples from {host} for {self.timeout:g} s, its alerts are cleared.")
+            set_active_alerts(host, [])
+
+def run_checks():
+    """Run every periodic check once: drive space, then the CPU, RAM, GPU, disk and network thresholds."""
+    low_drives = monitor_drive_space()
+    breaches = monitor_thresholds()
+    set_active_alerts(socket.gethostname(), low_drives + [breach[1:] for breach in breaches])
+
+def shutdown():
+    """Send the alerts still waiting in an open digest window and stop the notification sinks."""
+    alert_digest.flush_all()
+    notifiers.close()
@@ -0,0 +1,233 @@
+import os
+import abc
+import json
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config_store
+import email_sender
+
+# Syslog priority for alerts: facility "user" (1) and severity "warning" (4)
+SYSLOG_PRIORITY = 1 * 8 + 4
+
+class PermanentDeliveryError(Exception):
+    """Raised by a sink when retrying cannot help, such as with incomplete settings."""
+
+class NotificationSink(abc.ABC):
+    """Base class for a notification channel with its own timeout and retry budget."""
+
+    name = 'sink'
+
+    def __init__(self, timeout=5, retries=1):
+        self.timeout = timeout  # Seconds allowed for each delivery attempt
+        self.retries = retries  # Extra attempts after the first failure
+        # One worker per sink: a slow channel only queues its own notifications
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"notify-{self.name}")
+
+    @abc.abstractmethod
+    def deliver(self, notification):
+        """Deliver one notification, raising an exception on failure."""
+
+    def send(self, notification):
+        """Deliver a notification, retrying with a short backoff until the retry budget is spent."""
+        for attempt in range(self.retries + 1):
+            try:
+                self.deliver(notification)
+                return True
+            except PermanentDeliveryError as e:
+                print(f"Notification via {self.name} not sent: {e}")
+                return False
+            except Exception as e:
+                print(f"Notification via {self.name} failed (attempt {attempt + 1}/{self.retries + 1}): {e}")
+                if attempt < self.retries:
+                    time.sleep(min(2 ** attempt, self.timeout))
+        return False
+
+    def submit(self, notification):
+        """Queue a notification on this sink's worker and return its future."""
+        return self.executor.submit(self.send, notification)
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+class WebhookSink(NotificationSink):
+    """POST notifications as JSON to an HTTP endpoint."""
+
+    name = 'webhook'
+
+    def __init__(self, url, timeout=5, retries=3):
+        super().__init__(timeout, retries)
+        self.url = url
+
+    def deliver(self, notification):
+        payload = {
+            'host': notification['host'],
+            'time': notification['time'].isoformat(timespec='seconds'),
+            'subject': notification['subject'],
+            'body': notification['body'],
+        }
+        request = urllib.request.Request(
+            self.url, data=json.dumps(payload).encode('utf-8'), method='POST',
+            headers={'Content-Type': 'application/json', 'User-Agent': 'PySentinel'},
+        )
+        # urlopen raises HTTPError for 4xx/5xx responses
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+class SyslogSink(NotificationSink):
+    """Send notifications as RFC 3164 syslog datagrams to "host:port" or a local socket path."""
+
+    name = 'syslog'
+
+    def __init__(self, address, timeout=2, retries=1):
+        super().__init__(timeout, retries)
+        if ':' in address and not address.startswith('/'):
+            host, port = address.rsplit(':', 1)
+            self.address = (host, int(port))
+        else:
+            self.address = address
+
+    def deliver(self, notification):
+        timestamp = notification['time'].strftime('%b %d %H:%M:%S')
+        text = f"{notification['subject']} - {notification['body']}".replace('\n', ' | ')
+        message = f"<{SYSLOG_PRIORITY}>{timestamp} {notification['host']} PySentinel: {text}".encode('utf-8')
+
+        if isinstance(self.address, tuple):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            sock.send(message)
+        finally:
+            sock.close()
+
+class FileSink(NotificationSink):
+    """Append notifications as JSON lines to a local file."""
+
+    name = 'jsonl'
+
+    def __init__(self, path, timeout=2, retries=1):
+        super().__init__(timeout, retries)
+        self.path = path
+
+    def deliver(self, notification):
+        record = {
+            'host': notification['host'],
+            'time': notification['time'].isoformat(timespec='seconds'),
+            'subject': notification['subject'],
+            'body': notification['body'],
+        }
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + '\n')
+
+class SmtpSink(NotificationSink):
+    """Send notifications as alert emails with the history around the breach attached."""
+
+    name = 'smtp'
+
+    def __init__(self, timeout=30, retries=2):
+        super().__init__(timeout, retries)
+
+    def deliver(self, notification):
+        if config_store.email_settings_errors:
+            # Retrying cannot fix a bad configuration, the errors were reported at load time
+            raise PermanentDeliveryError("the email settings are incomplete")
+        if not email_sender.send_alert_email(notification['subject'], notification['body'],
+                                             notification['breach_time'], timeout=self.timeout,
+                                             host=notification['host']):
+            raise RuntimeError("SMTP delivery failed")
+
+class NotificationDispatcher:
+    """Fan a notification out to every sink concurrently."""
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def notify(self, subject, body, breach_time=None, host=None):
+        """Queue a notification on every sink and return immediately with their futures."""
+        notification = {
+            'host': host or socket.gethostname(),
+            'time': datetime.now(),
+            'subject': subject,
+            'body': body,
+            'breach_time': breach_time,
+        }
+        return [sink.submit(notification) for sink in self.sinks]
+
+    def close(self, wait=True):
+        for sink in self.sinks:
+            sink.close(wait)
+
+def build_sinks(current):
+    """Create the sinks enabled in the settings."""
+    sinks = []
+    if current['smtp_enabled']:
+        sinks.append(SmtpSink(current['smtp_timeout'], current['smtp_retries']))
+    if current['webhook_url']:
+        sinks.append(WebhookSink(current['webhook_url'], current['webhook_timeout'], current['webhook_retries']))
+    if current['syslog_address']:
+        sinks.append(SyslogSink(current['syslog_address'], current['syslog_timeout'], current['syslog_retries']))
+    if current['jsonl_path']:
+        sinks.append(FileSink(os.path.expanduser(current['jsonl_path']), current['jsonl_timeout'], current['jsonl_retries']))
+    return sinks
+
+# Keys of the settings the sinks are built from
+SINK_SETTINGS = (
+    'smtp_enabled', 'smtp_timeout', 'smtp_retries',
+    'webhook_url', 'webhook_timeout', 'webhook_retries',
+    'syslog_address', 'syslog_timeout', 'syslog_retries',
+    'jsonl_path', 'jsonl_timeout', 'jsonl_retries',
+)
+
+_dispatcher = None
+_dispatcher_settings = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Return the shared dispatcher, rebuilding it when the notification settings change."""
+    global _dispatcher, _dispatcher_settings
+    current = config_store.get_settings()
+    key = tuple(current[name] for name in SINK_SETTINGS)
+    with _dispatcher_lock:
+        if _dispatcher is None or key != _dispatcher_settings:
+            if _dispatcher is not None:
+                # Let the old sinks finish what they already queued
+                _dispatcher.close(wait=False)
+            _dispatcher = NotificationDispatcher(build_sinks(current))
+            _dispatcher_settings = key
+        return _dispatcher
+
+def notify(subject, body, breach_time=None, host=None):
+    """Send a notification through every configured sink without blocking the caller.
+
+    `host` is the machine the alert is about, for alerts on samples streamed by agents.
+    """
+    return get_dispatcher().notify(subject, body, breach_time, host)
+
+def notify_threshold_alert(exceeded_parameter, breach_time=None, host=None):
+    """Notify that one or more thresholds were exceeded."""
+    subject, body = email_sender.threshold_alert_message(exceeded_parameter)
+    if host:
+        subject = f"{host}: {subject}"
+    print(f"Sending threshold alert for {exceeded_parameter}...")
+    return notify(subject, body, breach_time, host)
+
+def notify_drive_space_alert(drive_letter, free_space_gb, breach_time=None):
+    """Notify that a drive is low on free space."""
+    subject, body = email_sender.drive_space_alert_message(drive_letter, free_space_gb)
+    print(f"Sending drive space alert for drive {drive_letter} with free space: {free_space_gb:.2f} GB")
+    return notify(subject, body, breach_time)
+
+def close():
+    """Wait for the queued notifications to be delivered."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.close(wait=True)
+            _dispatcher = None
@@ -0,0 +1,249 @@
+import os
+import re
+import sys
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import storage
+from config_store import settings, load_settings, enabled_plugins
+
+# Entry point group third-party collectors register under, e.g. in their pyproject.toml:
+#   [project.entry-points."pysentinel.collectors"]
+#   temperature = "pysentinel_temperature:TemperatureCollector"
+# The entry point is called with the options of its [Plugin <name>] section of config.ini
+# (a dict of strings) and returns the collector, an object with:
+#   metrics    {metric key: {'label': ..., 'unit': ..., 'min_threshold': ..., 'max_threshold': ...}},
+#              everything but the label optional; a plain string is taken as the label
+#   collect()  returning {metric key: number}; a missing key or None is stored as NaN
+#   title      optional, the name of the collector's graph tab
+#   close()    optional, called at exit
+# A collector is only imported once switched on in the [Plugins] section (`temperature = on`).
+ENTRY_POINT_GROUP = 'pysentinel.collectors'
+
+# Plugin names end up in file names
+PLUGIN_NAME = re.compile(r'^[\w.-]+$')
+
+# Seconds a sample waits for a plugin's collect() before repeating its last values, marked stale
+PLUGIN_DEADLINE = 0.5
+
+def discover():
+    """Return the installed collectors as {name: entry point}, read from the package metadata without importing them."""
+    from importlib import metadata
+    try:
+        found = metadata.entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:
+        found = metadata.entry_points().get(ENTRY_POINT_GROUP, [])  # Python < 3.10
+    # config.ini keys are lowercase
+    return {entry_point.name.lower(): entry_point for entry_point in found}
+
+def display_unit(unit):
+    """Unit as appended to a value in the alerts: '%' right after it, others after a space."""
+    return unit if unit in ('', '%') else f" {unit}"
+
+def read_schema(collector):
+    """Return the metrics a collector declares, with every field filled in."""
+    metrics = {}
+    for key, spec in dict(collector.metrics).items():
+        if isinstance(spec, str):
+            spec = {'label': spec}
+        metrics[str(key)] = {
+            'label': spec.get('label', key),
+            'unit': spec.get('unit', ''),
+            'min_threshold': spec.get('min_threshold'),
+            'max_threshold': spec.get('max_threshold'),
+        }
+    if not metrics:
+        raise ValueError("the collector declares no metrics")
+    return metrics
+
+class Plugin:
+    """An enabled collector with its declared schema, its latest sample and its threshold rules.
+
+    The schema gives the columns of the plugin's daily CSV files (plugin_<name>_<host>_<date>.csv),
+    the lines of its graph and the thresholds it is checked against; config.ini overrides the
+    declared thresholds with `<metric>_max_threshold` / `<metric>_min_threshold` in its section.
+
+    collect() runs on the plugin's own thread, like the slow collectors of the sampler
+    (collector_pool.py): the scheduler thread waits at most `deadline` seconds for it, and a
+    late answer is picked up by a later call while the last values are repeated, marked stale.
+    """
+
+    def __init__(self, name, collector, deadline=PLUGIN_DEADLINE):
+        self.name = name
+        self.collector = collector
+        self.deadline = deadline  # None waits as long as collect() takes
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"plugin-{name}")
+        self.pending = None  # Future of the collect() call still running
+        self.late = False
+        self.metrics = read_schema(collector)
+        self.title = getattr(collector, 'title', None) or name
+        self.columns = {key: f"{spec['label']} ({spec['unit']})" if spec['unit'] else spec['label']
+                        for key, spec in self.metrics.items()}
+        self.header = ['Date', 'Time'] + list(self.columns.values())
+        self.file_prefix = f"plugin_{name}_"
+        self.latest = None
+        self.last_error = None
+
+    def threshold(self, key, bound):
+        """Return the 'min' or 'max' threshold of a metric: config.ini, else the declared one; None if neither.
+
+        An empty value in config.ini turns a declared threshold off.
+        """
+        options = settings['plugin_settings'].get(self.name, {})
+        option = f'{key}_{bound}_threshold'
+        if option not in options:
+            declared = self.metrics[key][f'{bound}_threshold']
+            return float(declared) if declared is not None else None
+        try:
+            return float(options[option])
+        except ValueError:
+            return None
+
+    def collect(self):
+        """Return a sample {'timestamp', metric: value, 'stale'} from the collector, or None if it failed.
+
+        'stale' lists the metrics repeated from the previous sample because collect() is late.
+        """
+        timestamp = time.time()
+        if self.pending is None:
+            self.pending = self.executor.submit(self.collector.collect)
+        if not wait([self.pending], timeout=self.deadline)[0]:
+            if not self.late:
+                print(f"The {self.name} plugin did not answer within {self.deadline} s, repeating its last values.")
+                self.late = True
+            if self.latest is None:
+                return None
+            self.latest = dict(self.latest, timestamp=timestamp, stale=list(self.metrics))
+            return self.latest
+        future, self.pending = self.pending, None
+        self.late = False
+        try:
+            values = future.result()
+            sample = {'timestamp': timestamp, 'stale': []}
+            for key in self.metrics:
+                value = values.get(key)
+                sample[key] = float(value) if value is not None else float('nan')
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if error != self.last_error:
+                print(f"The {self.name} plugin failed: {error}")
+                self.last_error = error
+            return None
+        self.last_error = None
+        self.latest = sample
+        return sample
+
+    def breaches(self):
+        """Compare the latest values with their thresholds, as (message, metric, value, threshold, unit) like monitoring."""
+        breaches = []
+        if self.latest is None:
+            return breaches
+        for key, spec in self.metrics.items():
+            value = self.latest[key]  # NaN compares false with every threshold
+            label, unit = spec['label'], display_unit(spec['unit'])
+            high, low = self.threshold(key, 'max'), self.threshold(key, 'min')
+            if high is not None and value > high:
+                breaches.append((f"{label} ({value:g}{unit}) exceeded threshold ({high:g}{unit})", label, value, high, unit))
+            elif low is not None and value < low:
+                breaches.append((f"{label} ({value:g}{unit}) is below threshold ({low:g}{unit})", label, value, low, unit))
+        return breaches
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        close = getattr(self.collector, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                print(f"The {self.name} plugin failed to close: {type(e).__name__}: {e}")
+
+def load_enabled():
+    """Import and create the collectors enabled in config.ini; those missing or broken are reported and skipped."""
+    names = enabled_plugins()
+    if not names:
+        return []
+    installed = discover()
+    plugins = []
+    for name in names:
+        entry_point = installed.get(name)
+        if entry_point is None:
+            print(f"Plugin {name!r} is enabled but not installed (installed: {', '.join(sorted(installed)) or 'none'}).")
+            continue
+        if not PLUGIN_NAME.match(name):
+            print(f"Plugin {name!r} skipped: only letters, digits, '_', '.' and '-' can be used in its name.")
+            continue
+        try:
+            factory = entry_point.load()
+            plugins.append(Plugin(name, factory(dict(settings['plugin_settings'].get(name, {})))))
+        except Exception as e:
+            print(f"Cannot load plugin {name!r}: {type(e).__name__}: {e}")
+            continue
+        print(f"Plugin {name!r} loaded: {', '.join(plugins[-1].metrics)}.")
+    return plugins
+
+class PluginJob:
+    """Scheduler job: collect a plugin's sample, store it in its daily CSV file and hand it to a callback.
+
+    Like SamplingJob, the callback runs on the scheduler thread.
+    """
+
+    def __init__(self, plugin, on_sample=None):
+        self.plugin = plugin
+        self.on_sample = on_sample
+        self.file_path = None
+
+    def __call__(self):
+        sample = self.plugin.collect()
+        if sample is None:
+            return
+        file_path = storage.get_csv_file_path(datetime.fromtimestamp(sample['timestamp']), prefix=self.plugin.file_prefix)
+        if file_path != self.file_path:
+            self.file_path = self.create_file(file_path)
+        storage.append_row(file_path, storage.sample_row(sample, self.plugin.columns))
+        if self.on_sample is not None:
+            self.on_sample(sample)
+
+    def create_file(self, file_path):
+        """Create a day file; one written with other columns (the plugin was upgraded) is set aside first."""
+        header = storage.read_header(file_path)
+        if header is not None and header != self.plugin.header:
+            moved = f"{file_path[:-len('.csv')]}_{time.strftime('%H%M%S')}.csv"
+            os.replace(file_path, moved)
+            print(f"The columns of the {self.plugin.name} plugin changed, the day's previous samples are in {moved}.")
+        return storage.create_csv_file(file_path, self.plugin.header)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the installed collector plugins, or try one out.")
+    parser.add_argument('name', nargs='?', help="Load this plugin, print its schema and one sample")
+    args = parser.parse_args(argv)
+
+    load_settings()
+    installed = discover()
+    if args.name is None:
+        if not installed:
+            print(f"No collector plugins installed (entry point group {ENTRY_POINT_GROUP!r}).")
+        enabled = enabled_plugins()
+        for name, entry_point in sorted(installed.items()):
+            print(f"{name:<20} {'on ' if name in enabled else 'off'}  {entry_point.value}")
+        return 0
+
+    name = args.name.lower()
+    if name not in installed:
+        print(f"Plugin {name!r} is not installed.")
+        return 1
+    plugin = Plugin(name, installed[name].load()(dict(settings['plugin_settings'].get(name, {}))), deadline=None)
+    print(f"{plugin.title}: {', '.join(plugin.header[2:])}")
+    for key in plugin.metrics:
+        print(f"  {key:<16} min {plugin.threshold(key, 'min')}  max {plugin.threshold(key, 'max')}")
+    sample = plugin.collect()
+    plugin.close()
+    if sample is None:
+        return 1
+    for key, spec in plugin.metrics.items():
+        print(f"  {key:<16} {sample[key]:g}{display_unit(spec['unit'])}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import struct
+
+import gorilla
+
+# Wire format between agents and the aggregator. Every frame is
+#   !IB  payload length, frame type   followed by the payload:
+#   HELLO    !BQ version, session id, then the host name (UTF-8)
+#   SAMPLES  !QH sequence number of the first sample, sample count, then the sample records
+#   ACK      !Q  sequence number of the last sample stored
+#   BLOCK    !QH like SAMPLES, then the samples compressed by gorilla.BlockEncoder (version 2)
+PROTOCOL_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+HELLO, SAMPLES, ACK, BLOCK = 1, 2, 3, 4
+
+FRAME_HEADER = struct.Struct('!IB')
+HELLO_HEADER = struct.Struct('!BQ')
+SAMPLES_HEADER = struct.Struct('!QH')
+ACK_BODY = struct.Struct('!Q')
+
+# One sample: timestamp, CPU, RAM, disk and GPU usage (%), cumulative network in and out (MB)
+SAMPLE_FIELDS = ('cpu', 'ram', 'disk', 'gpu', 'network_in', 'network_out')
+SAMPLE_RECORD = struct.Struct('!d4f2d')
+FLOAT32_FIELDS = SAMPLE_FIELDS[:4]
+
+# Frames above this size are rejected: a corrupt length must not make the reader allocate gigabytes
+MAX_FRAME_SIZE = 1 << 20
+MAX_SAMPLES_PER_FRAME = (MAX_FRAME_SIZE - SAMPLES_HEADER.size) // SAMPLE_RECORD.size
+
+DEFAULT_PORT = 7070
+
+class ProtocolError(Exception):
+    """Raised on a frame that does not follow the wire format."""
+
+def encode_frame(frame_type, payload):
+    return FRAME_HEADER.pack(len(payload), frame_type) + payload
+
+def encode_hello(host, session):
+    return encode_frame(HELLO, HELLO_HEADER.pack(PROTOCOL_VERSION, session) + host.encode('utf-8'))
+
+def decode_hello(payload):
+    """Return (session id, host name)."""
+    if len(payload) < HELLO_HEADER.size:
+        raise ProtocolError("HELLO frame too short")
+    version, session = HELLO_HEADER.unpack_from(payload)
+    if version not in SUPPORTED_VERSIONS:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    return session, payload[HELLO_HEADER.size:].decode('utf-8', 'replace')
+
+def encode_samples(first_sequence, samples):
+    """Encode consecutive samples (dicts with 'timestamp' and SAMPLE_FIELDS) as one SAMPLES frame."""
+    records = b''.join(
+        SAMPLE_RECORD.pack(sample['timestamp'], *(sample[field] for field in SAMPLE_FIELDS))
+        for sample in samples
+    )
+    return encode_frame(SAMPLES, SAMPLES_HEADER.pack(first_sequence, len(samples)) + records)
+
+def decode_sample_columns(payload):
+    """Return (sequence number of the first sample, {'timestamp' or field: tuple of values}).
+
+    Columns rather than one dict per sample: the aggregator batches and stores them as is.
+    """
+    if len(payload) < SAMPLES_HEADER.size:
+        raise ProtocolError("SAMPLES frame too short")
+    first_sequence, count = SAMPLES_HEADER.unpack_from(payload)
+    if count == 0 or len(payload) != SAMPLES_HEADER.size + count * SAMPLE_RECORD.size:
+        raise ProtocolError("SAMPLES frame length does not match its sample count")
+    values = list(zip(*SAMPLE_RECORD.iter_unpack(memoryview(payload)[SAMPLES_HEADER.size:])))
+    columns = {'timestamp': values[0]}
+    for field, column in zip(SAMPLE_FIELDS, values[1:]):
+        # The usage fields travel as 32-bit floats: round off the conversion noise
+        columns[field] = tuple(round(value, 2) for value in column) if field in FLOAT32_FIELDS else column
+    return first_sequence, columns
+
+def encode_block(first_sequence, count, block):
+    """Encode `count` consecutive samples already compressed by gorilla.BlockEncoder as one BLOCK frame."""
+    return encode_frame(BLOCK, SAMPLES_HEADER.pack(first_sequence, count) + block)
+
+def decode_block_columns(payload):
+    """Return (sequence number of the first sample, {'timestamp' or field: list of values}) of a BLOCK frame."""
+    if len(payload) < SAMPLES_HEADER.size:
+        raise ProtocolError("BLOCK frame too short")
+    first_sequence, count = SAMPLES_HEADER.unpack_from(payload)
+    if count == 0:
+        raise ProtocolError("BLOCK frame without samples")
+    try:
+        timestamps, values = gorilla.decode_block(memoryview(payload)[SAMPLES_HEADER.size:], count, len(SAMPLE_FIELDS))
+    except ValueError as e:
+        raise ProtocolError(f"Corrupt BLOCK frame: {e}")
+    columns = dict(zip(SAMPLE_FIELDS, values))
+    columns['timestamp'] = timestamps
+    return first_sequence, columns
+
+def encode_ack(sequence):
+    return encode_frame(ACK, ACK_BODY.pack(sequence))
+
+def decode_ack(payload):
+    if len(payload) != ACK_BODY.size:
+        raise ProtocolError("ACK frame has the wrong size")
+    return ACK_BODY.unpack(payload)[0]
+
+class FrameReader:
+    """Split a byte stream into frames, whatever the size of the chunks it arrives in."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Add received bytes and return the complete frames as (frame type, payload) tuples."""
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            length, frame_type = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Frame of {length} bytes exceeds the limit")
+            end = offset + FRAME_HEADER.size + length
+            if end > len(self.buffer):
+                break
+            frames.append((frame_type, bytes(self.buffer[offset + FRAME_HEADER.size:end])))
+            offset = end
+        del self.buffer[:offset]
+        return frames
+
+def parse_address(text, default_port=DEFAULT_PORT):
+    """Parse 'host:port', 'host' or 'unix:/path/to/socket' into (is_unix, address)."""
+    if text.startswith('unix:'):
+        return True, text[len('unix:'):]
+    host, _, port = text.rpartition(':')
+    if not host:
+        return False, (text, default_port)
+    return False, (host.strip('[]'), int(port))
@@ -0,0 +1,63 @@
+import numpy as np
+
+class RingBuffer:
+    """Preallocated circular buffer of samples: one timestamp array and one array per series.
+
+    Every value is written twice, at i and i + capacity, so the samples in chronological
+    order are always one contiguous slice and view() never copies.
+    """
+
+    def __init__(self, capacity, keys):
+        self.capacity = max(int(capacity), 1)
+        self.keys = list(keys)
+        self.times = np.zeros(2 * self.capacity)
+        self.columns = {key: np.zeros(2 * self.capacity) for key in self.keys}
+        self.start = 0  # Index of the oldest sample in the first half
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+    def append(self, timestamp, values):
+        """Add one sample; when full, the oldest sample is overwritten."""
+        # Keep timestamps monotonic (searchsorted relies on it) even if the wall clock goes back
+        if self.size and timestamp < self.times[self.start + self.size - 1]:
+            timestamp = self.times[self.start + self.size - 1]
+
+        index = (self.start + self.size) % self.capacity
+        self.times[index] = self.times[index + self.capacity] = timestamp
+        for key in self.keys:
+            self.columns[key][index] = self.columns[key][index + self.capacity] = values[key]
+
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def extend(self, timestamps, columns):
+        """Replace the content with arrays of samples, keeping the most recent ones that fit."""
+        timestamps = np.asarray(timestamps, dtype=float)[-self.capacity:]
+        count = len(timestamps)
+        self.start = 0
+        self.size = count
+        self.times[:count] = self.times[self.capacity:self.capacity + count] = timestamps
+        for key in self.keys:
+            values = np.asarray(columns[key], dtype=float)[-self.capacity:]
+            self.columns[key][:count] = self.columns[key][self.capacity:self.capacity + count] = values
+
+    def drop_before(self, timestamp):
+        """Forget the samples older than a timestamp."""
+        dropped = int(np.searchsorted(self.view_times(), timestamp, side='left'))
+        self.start = (self.start + dropped) % self.capacity
+        self.size -= dropped
+
+    def view_times(self):
+        return self.times[self.start:self.start + self.size]
+
+    def view(self, key):
+        """Return the values of a series in chronological order, without copying."""
+        return self.columns[key][self.start:self.start + self.size]
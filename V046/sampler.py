@@ -0,0 +1,220 @@
+import time
+import socket
+import threading
+import importlib.util
+import psutil
+import storage
+
+# Seconds a sample waits for the GPU and WMI collectors, which run in worker processes
+SLOW_COLLECTOR_DEADLINE = 0.5
+
+def get_gpu_usage():
+    """Fetch the current GPU usage using GPUtil, imported on first use."""
+    try:
+        import GPUtil
+    except ImportError:
+        return 0  # GPUtil not installed: no GPU monitoring
+    gpus = GPUtil.getGPUs()
+    if gpus:
+        return gpus[0].load * 100  # GPU load is a fraction, convert to percentage
+    else:
+        return 0  # No GPU found
+
+_wmi_interface = None
+
+def get_wmi_disk_usage():
+    """Fetch the disk usage percentage of the "_Total" disk from WMI, connecting on first use."""
+    global _wmi_interface
+    if _wmi_interface is None:
+        import wmi
+        # WMI objects are COM objects bound to the thread that created them
+        try:
+            import pythoncom
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass
+        _wmi_interface = wmi.WMI()
+    disk_usage_percentage = 0
+    for disk in _wmi_interface.Win32_PerfFormattedData_PerfDisk_LogicalDisk():
+        if disk.Name == "_Total":  # Use "_Total" to get the overall disk usage
+            disk_usage_percentage = float(disk.PercentDiskTime)
+            break
+    # Ensure the disk usage percentage is clamped between 0 and 100
+    return max(0, min(disk_usage_percentage, 100))
+
+# Collectors that can take seconds or hang (GPUtil runs nvidia-smi): name -> (module needed, function)
+SLOW_COLLECTORS = {
+    'gpu': ('GPUtil', get_gpu_usage),
+    'disk': ('wmi', get_wmi_disk_usage),
+}
+_slow_collectors = {}
+_slow_collectors_lock = threading.Lock()
+
+def slow_collector(name):
+    """Return the worker process running a slow collector, shared by the sampler and the checks.
+
+    None when its module is not installed (found without importing it, which is slow too).
+    """
+    with _slow_collectors_lock:
+        if name not in _slow_collectors:
+            module, function = SLOW_COLLECTORS[name]
+            collector = None
+            if importlib.util.find_spec(module) is not None:
+                from collector_pool import IsolatedCollector
+                collector = IsolatedCollector(name, function, deadline=SLOW_COLLECTOR_DEADLINE)
+            _slow_collectors[name] = collector
+        return _slow_collectors[name]
+
+def collect_slow(name, default=0):
+    """Return (value, stale) from a slow collector's worker, or (default, False) without its module."""
+    collector = slow_collector(name)
+    return collector.collect() if collector is not None else (default, False)
+
+def stop_slow_collectors():
+    with _slow_collectors_lock:
+        for collector in _slow_collectors.values():
+            if collector is not None:
+                collector.stop()
+        _slow_collectors.clear()
+
+def _cpu_busy_total(times):
+    # Guest time is already counted in user time on Linux
+    guest = getattr(times, 'guest', 0) + getattr(times, 'guest_nice', 0)
+    total = sum(times) - guest
+    return total - times.idle - getattr(times, 'iowait', 0), total
+
+class CpuMeter:
+    """Non-blocking CPU usage: the average since the previous reading of this meter.
+
+    Same computation as psutil.cpu_percent(interval=None), but each caller keeps its own
+    reference point, so the sampler and the threshold checks do not reset each other.
+    """
+
+    def __init__(self):
+        self.last = _cpu_busy_total(psutil.cpu_times())
+
+    def percent(self):
+        busy, total = _cpu_busy_total(psutil.cpu_times())
+        last_busy, last_total = self.last
+        self.last = busy, total
+        if total <= last_total:
+            return 0.0  # Called twice within one clock tick
+        return round(max(0.0, min((busy - last_busy) / (total - last_total) * 100, 100.0)), 1)
+
+class Sampler:
+    """Collect one snapshot of the system metrics and log it to the daily CSV file.
+
+    GPUtil (which runs nvidia-smi) and WMI can take seconds or hang: when available they run
+    in worker processes (collector_pool.IsolatedCollector), and a sample whose GPU or disk
+    value is late repeats the previous one and lists the metric in sample['stale'].
+    """
+
+    def __init__(self, log_to_csv=True):
+        # Store the initial network I/O counters to initialize cumulative data to 0
+        self.initial_net_io = psutil.net_io_counters()
+
+        # Average CPU usage between two samples, without blocking like cpu_percent(interval=1)
+        self.cpu_meter = CpuMeter()
+
+        # Start the slow collectors' workers now, they take a moment to import their modules
+        slow_collector('gpu')
+        slow_collector('disk')
+        self.last_disk_io = None  # (monotonic time, busy time in ms) for the psutil fallback
+
+        # CSV-related attributes; an agent streaming its samples (see agent.py) logs nothing locally
+        self.machine_name = socket.gethostname()
+        self.current_date = time.strftime("%Y-%m-%d")
+        self.csv_file_path = self.create_csv_file() if log_to_csv else None
+
+    def create_csv_file(self):
+        """Create a new CSV file for the current day."""
+        file_path = storage.get_csv_file_path(machine_name=self.machine_name)
+        # Create the file and write the header
+        return storage.create_csv_file(file_path)
+
+    def write_to_csv(self, data_row):
+        """Write a row of data to the CSV file."""
+        storage.append_row(self.csv_file_path, data_row)
+
+    def get_gpu_usage(self):
+        """Return (GPU usage, stale); 0 without GPUtil."""
+        return collect_slow('gpu')
+
+    def get_disk_usage(self):
+        """Return (disk usage percentage, stale) from WMI; other platforms (e.g. headless Linux servers) use psutil's disk busy time."""
+        if slow_collector('disk') is None:
+            return self.get_disk_busy_time(), False
+        return collect_slow('disk')
+
+    def get_disk_busy_time(self):
+        """Fetch the share of time the disks were busy since the last call, from psutil (Linux, FreeBSD)."""
+        counters = psutil.disk_io_counters()
+        busy_time = getattr(counters, 'busy_time', None)
+        if busy_time is None:
+            return 0  # Not reported on this platform
+        now = time.monotonic()
+        previous, self.last_disk_io = self.last_disk_io, (now, busy_time)
+        if previous is None or now <= previous[0]:
+            return 0
+        # busy_time is summed over every disk, like the "_Total" WMI instance
+        disk_usage_percentage = (busy_time - previous[1]) / ((now - previous[0]) * 1000) * 100
+        return max(0, min(disk_usage_percentage, 100))
+
+    def snapshot(self):
+        """Take a snapshot of the metrics and return it as a dict, without logging it."""
+        timestamp = time.time()
+
+        # Collect data
+        cpu_usage = self.cpu_meter.percent()
+        ram_usage = psutil.virtual_memory().percent
+        disk_usage, disk_stale = self.get_disk_usage()  # Updated disk usage
+        gpu_usage, gpu_stale = self.get_gpu_usage()
+
+        # Get the current network I/O counters
+        current_net_io = psutil.net_io_counters()
+
+        # Calculate cumulative data by subtracting initial counters
+        network_in_cumulative = (current_net_io.bytes_recv - self.initial_net_io.bytes_recv) / (1024 * 1024)
+        network_out_cumulative = (current_net_io.bytes_sent - self.initial_net_io.bytes_sent) / (1024 * 1024)
+
+        return {
+            'timestamp': timestamp,
+            'date': time.strftime("%Y-%m-%d", time.localtime(timestamp)),
+            'time': time.strftime("%H:%M:%S", time.localtime(timestamp)),
+            'cpu': cpu_usage,
+            'ram': ram_usage,
+            'disk': disk_usage,
+            'gpu': gpu_usage,
+            'network_in': network_in_cumulative,
+            'network_out': network_out_cumulative,
+            'stale': [name for name, stale in (('disk', disk_stale), ('gpu', gpu_stale)) if stale],
+        }
+
+    def collect(self):
+        """Take a snapshot of the metrics, write it to the CSV file and return it as a dict."""
+        sample = self.snapshot()
+
+        # Create a new CSV file if the day has changed
+        if sample['date'] != self.current_date:
+            self.current_date = sample['date']
+            self.csv_file_path = self.create_csv_file()
+
+        # Write to CSV
+        self.write_to_csv(storage.sample_row(sample))
+        return sample
+
+class SamplingJob:
+    """Scheduler job collecting one sample and handing it to a callback.
+
+    The Sampler is created on the first run, i.e. on the scheduler thread that keeps using it.
+    The callback runs on that thread too, so GUI code must only queue the sample (see TkBridge).
+    """
+
+    def __init__(self, on_sample):
+        self.on_sample = on_sample
+        self.sampler = None
+
+    def __call__(self):
+        if self.sampler is None:
+            self.sampler = Sampler()
+        self.on_sample(self.sampler.collect())
@@ -0,0 +1,126 @@
+import time
+import threading
+from collections import deque
+
+class WakeupCounter:
+    """Count the process wakeups of the last minute (scheduler runs, GUI queue polls)."""
+
+    def __init__(self):
+        self.times = deque()
+        self.lock = threading.Lock()
+
+    def record(self):
+        now = time.monotonic()
+        with self.lock:
+            self.times.append(now)
+            self.trim(now)
+
+    def trim(self, now):
+        while self.times and now - self.times[0] > 60:
+            self.times.popleft()
+
+    def per_minute(self):
+        with self.lock:
+            self.trim(time.monotonic())
+            return len(self.times)
+
+# Shared by every source of periodic wakeups
+wakeups = WakeupCounter()
+
+class Job:
+    """A periodic job; intervals may be callables so they follow the settings."""
+
+    def __init__(self, name, callback, interval, idle_interval=None):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.due = 0.0  # Wall-clock time of the next run; 0 runs at the next wakeup
+
+    def get_interval(self, idle):
+        interval = self.idle_interval if idle and self.idle_interval is not None else self.interval
+        return max(float(interval() if callable(interval) else interval), 0.1)
+
+    def schedule(self, now, idle, slack=0.0):
+        """Align the next run on a multiple of the interval, so jobs with related intervals wake together."""
+        interval = self.get_interval(idle)
+        # A job run a little early (within the slack) must not run again right after its due time
+        self.due = (max(now, self.due) // interval + 1) * interval
+        if self.due - now <= slack:
+            self.due += interval
+
+class Scheduler(threading.Thread):
+    """Run every periodic job from one thread that sleeps until the next job is due.
+
+    Runs are aligned on wall-clock multiples of the job intervals, and jobs due within `slack`
+    seconds of a wakeup run with it, so the process wakes once where it used to wake per job.
+    """
+
+    def __init__(self, slack=1.0):
+        super().__init__(name="scheduler", daemon=True)
+        self.slack = slack
+        self.jobs = {}
+        self.idle = False
+        self.running = True
+        self.condition = threading.Condition()
+
+    def add(self, name, callback, interval, idle_interval=None):
+        """Register a job; it first runs at the next wakeup."""
+        with self.condition:
+            self.jobs[name] = Job(name, callback, interval, idle_interval)
+            self.condition.notify()
+
+    def trigger(self, name):
+        """Run a job as soon as possible, e.g. when its data becomes visible."""
+        with self.condition:
+            if name in self.jobs:
+                self.jobs[name].due = 0.0
+                self.condition.notify()
+
+    def reschedule(self):
+        """Recompute every due time, after the intervals changed."""
+        with self.condition:
+            now = time.time()
+            for job in self.jobs.values():
+                if job.due:
+                    job.due = now
+                    job.schedule(now, self.idle)
+            self.condition.notify()
+
+    def set_idle(self, idle):
+        """Switch to the idle intervals (window minimized) or back."""
+        with self.condition:
+            if idle == self.idle:
+                return
+            self.idle = idle
+            self.reschedule()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                now = time.time()
+                for job in self.jobs.values():
+                    if job.due - now > job.get_interval(self.idle) + self.slack:
+                        job.schedule(now, self.idle)  # The wall clock went back
+                next_due = min((job.due for job in self.jobs.values()), default=now + 3600)
+                if next_due > now:
+                    self.condition.wait(next_due - now)
+                    continue  # Re-check: a job may have been added or triggered
+                # Everything due now or within the slack shares this wakeup
+                due = [job for job in self.jobs.values() if job.due <= now + self.slack]
+                for job in due:
+                    job.schedule(now, self.idle, self.slack)
+
+            wakeups.record()
+            for job in due:
+                try:
+                    job.callback()
+                except Exception as e:
+                    print(f"Error in scheduled job {job.name}: {e}")
@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import struct
+import argparse
+from multiprocessing import shared_memory
+
+# The latest sample, published in a shared memory segment for other local processes.
+# Layout, native byte order and alignment:
+#   offset 0   Q  sequence: odd while an update is being written, even once it is complete
+#   offset 8   I  layout version, I size of the record
+#   offset 16  d  timestamp, then one d per SNAPSHOT_FIELDS
+# Readers copy the record between two reads of the sequence (a seqlock) and retry if it
+# changed: the writer never waits for them, and no lock is shared between processes.
+# Other languages can map the segment directly (/dev/shm/pysentinel on Linux).
+DEFAULT_NAME = 'pysentinel'
+LAYOUT_VERSION = 1
+SNAPSHOT_FIELDS = ('cpu', 'ram', 'disk', 'gpu', 'network_in', 'network_out')
+
+SEQUENCE = struct.Struct('=Q')
+HEADER = struct.Struct('=QII')
+RECORD = struct.Struct('=' + 'd' * (1 + len(SNAPSHOT_FIELDS)))
+SEGMENT_SIZE = HEADER.size + RECORD.size
+
+# Readers spin this many times, then let the writer run (it may have been preempted mid-update);
+# they give up after READ_TIMEOUT seconds, on a writer that died while updating
+SPIN_ATTEMPTS = 100
+READ_TIMEOUT = 1.0
+
+class SnapshotPublisher:
+    """Write every sample to the shared segment, which exists as long as the publisher."""
+
+    def __init__(self, name=DEFAULT_NAME):
+        # Raises FileExistsError while another PySentinel process publishes under the same name
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=SEGMENT_SIZE)
+        self.sequence = 0
+        HEADER.pack_into(self.shm.buf, 0, self.sequence, LAYOUT_VERSION, RECORD.size)
+
+    def publish(self, sample):
+        buf = self.shm.buf
+        self.sequence += 1
+        SEQUENCE.pack_into(buf, 0, self.sequence)  # Odd: readers retry
+        RECORD.pack_into(buf, HEADER.size, sample['timestamp'], *(float(sample[field]) for field in SNAPSHOT_FIELDS))
+        self.sequence += 1
+        SEQUENCE.pack_into(buf, 0, self.sequence)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+def attach(name):
+    """Open an existing segment without taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13, every process opening a segment tracks it and unlinks it at exit
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class SnapshotReader:
+    """Read the latest sample published by a PySentinel process on this machine.
+
+    Raises FileNotFoundError when nothing is published under that name.
+    """
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.shm = attach(name)
+        sequence, version, size = HEADER.unpack_from(self.shm.buf)
+        if version != LAYOUT_VERSION or size != RECORD.size:
+            self.shm.close()
+            raise ValueError(f"Shared snapshot {name!r} has layout {version}, expected {LAYOUT_VERSION}")
+
+    def read_values(self):
+        """Return (timestamp, *SNAPSHOT_FIELDS) unpacked straight from the segment, or None before the first sample."""
+        buf = self.shm.buf
+        deadline = None
+        while True:
+            for _ in range(SPIN_ATTEMPTS):
+                before = SEQUENCE.unpack_from(buf)[0]
+                if before & 1:
+                    continue
+                values = RECORD.unpack_from(buf, HEADER.size)
+                if SEQUENCE.unpack_from(buf)[0] == before:
+                    return values if before else None
+            if deadline is None:
+                deadline = time.monotonic() + READ_TIMEOUT
+            elif time.monotonic() > deadline:
+                raise RuntimeError("The shared snapshot kept changing while being read")
+            time.sleep(0.0001)
+
+    def read(self):
+        """Return the latest sample as a dict like Sampler.snapshot() without the date strings, or None."""
+        values = self.read_values()
+        return dict(zip(('timestamp',) + SNAPSHOT_FIELDS, values)) if values else None
+
+    def close(self):
+        self.shm.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the latest sample published by PySentinel on this machine.")
+    parser.add_argument('--name', default=DEFAULT_NAME, help="Name of the shared memory segment")
+    parser.add_argument('--max-age', type=float, default=None, help="Exit with status 1 if the sample is older than this many seconds, for health checks")
+    args = parser.parse_args(argv)
+
+    try:
+        reader = SnapshotReader(args.name)
+    except FileNotFoundError:
+        print(f"No snapshot published under {args.name!r}: is PySentinel running?")
+        return 1
+    sample = reader.read()
+    reader.close()
+    if sample is None:
+        print("No sample published yet.")
+        return 1
+    age = time.time() - sample['timestamp']
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(sample['timestamp']))} ({age:.1f} s ago)")
+    for field in SNAPSHOT_FIELDS:
+        print(f"  {field:<12} {sample[field]:.2f}")
+    return 1 if args.max_age is not None and age > args.max_age else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Entry point -> (module imported at startup, seconds allowed for a fresh interpreter to import it)
+ENTRY_POINTS = {
+    'headless': ('headless', 0.5),
+    'gui': ('PySentinel_V046', 1.0),
+}
+
+# Modules that must not be loaded just by starting an entry point
+FORBIDDEN_MODULES = {
+    'headless': ['tkinter', 'matplotlib', 'numpy', 'GPUtil', 'wmi'],
+    'gui': ['matplotlib', 'matplotlib.pyplot', 'GPUtil', 'wmi'],
+}
+
+# Run in a fresh interpreter: import the entry point and report the time and the modules loaded
+PROBE = """
+import sys, time, json
+sys.path.insert(0, {script_dir!r})
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'import': elapsed, 'loaded': [name for name in {forbidden!r} if name in sys.modules]}}))
+"""
+
+def measure(name, runs=5):
+    """Start an entry point `runs` times and return (median process time, median import time, forbidden modules loaded)."""
+    module = ENTRY_POINTS[name][0]
+    code = PROBE.format(script_dir=SCRIPT_DIR, module=module, forbidden=FORBIDDEN_MODULES[name])
+    process_times, import_times, loaded = [], [], set()
+    # Run from an empty directory so no config or CSV file of the current directory is touched
+    with tempfile.TemporaryDirectory() as work_dir:
+        for _ in range(runs):
+            started = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', code], cwd=work_dir, capture_output=True, text=True, check=True).stdout
+            process_times.append(time.perf_counter() - started)
+            result = json.loads(output.strip().splitlines()[-1])
+            import_times.append(result['import'])
+            loaded.update(result['loaded'])
+    return statistics.median(process_times), statistics.median(import_times), sorted(loaded)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the startup time of PySentinel and fail on regressions.")
+    parser.add_argument('entry_points', nargs='*', metavar='entry_point', help=f"Entry points to measure: {', '.join(sorted(ENTRY_POINTS))} (default: all)")
+    parser.add_argument('--runs', type=int, default=5, help="Interpreter starts per entry point; the median is compared with the budget")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget, e.g. 2 on a slow machine")
+    args = parser.parse_args(argv)
+    for name in args.entry_points:
+        if name not in ENTRY_POINTS:
+            parser.error(f"unknown entry point {name!r}")
+
+    failed = False
+    for name in args.entry_points or sorted(ENTRY_POINTS):
+        try:
+            process_time, import_time, loaded = measure(name, args.runs)
+        except subprocess.CalledProcessError as e:
+            print(f"{name}: could not start ({e.stderr.strip().splitlines()[-1] if e.stderr.strip() else e})")
+            failed = True
+            continue
+        budget = ENTRY_POINTS[name][1] * args.scale
+        status = "OK" if process_time <= budget and not loaded else "FAIL"
+        print(f"{name:<9} {status}  startup {process_time * 1000:7.1f} ms (import {import_time * 1000:6.1f} ms, budget {budget * 1000:.0f} ms)")
+        if loaded:
+            print(f"          loaded at startup: {', '.join(loaded)}")
+        failed = failed or status == "FAIL"
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+import os
+import re
+import json
+import gzip
+import math
+import time
+import socket
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import storage
+import protocol
+import monitoring
+import config_store
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+JSON_CONTENT_TYPE = 'application/json'
+
+# Large history responses are sent in chunks of about this many bytes
+CHUNK_SIZE = 64 * 1024
+
+# Range of /api/history when the query gives none
+DEFAULT_HISTORY_MINUTES = 60
+
+# Longest range /api/history serves, and most points per series it downsamples to
+MAX_HISTORY_DAYS = 366
+MAX_HISTORY_POINTS = 100000
+
+class BadRequest(Exception):
+    """Raised on invalid query parameters; answered with a 400 response."""
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_metric(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+        return f"{name}{{{label_text}}} {float(value)!r}"
+    return f"{name} {float(value)!r}"
+
+def render_metrics(sample, drives, alerts):
+    """Render the latest sample, the drives and the active alerts in the Prometheus text format."""
+    lines = []
+
+    def family(name, kind, help_text, values):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in values:
+            lines.append(format_metric(name, labels, value))
+
+    if sample is not None:
+        family('pysentinel_sample_timestamp_seconds', 'gauge', "Time of the latest sample.", [({}, sample['timestamp'])])
+        family('pysentinel_cpu_usage_percent', 'gauge', "CPU usage since the previous sample.", [({}, sample['cpu'])])
+        family('pysentinel_ram_usage_percent', 'gauge', "RAM in use.", [({}, sample['ram'])])
+        family('pysentinel_gpu_usage_percent', 'gauge', "Load of the first GPU.", [({}, sample['gpu'])])
+        family('pysentinel_disk_busy_percent', 'gauge', "Share of time the disks were busy.", [({}, sample['disk'])])
+        family('pysentinel_network_receive_bytes_total', 'counter', "Bytes received since PySentinel started.",
+               [({}, sample['network_in'] * 1024 * 1024)])
+        family('pysentinel_network_transmit_bytes_total', 'counter', "Bytes sent since PySentinel started.",
+               [({}, sample['network_out'] * 1024 * 1024)])
+        family('pysentinel_metric_stale', 'gauge', "1 while a collector misses its deadline and its last value is repeated.",
+               [({'metric': metric}, int(metric in sample.get('stale', ()))) for metric in ('disk', 'gpu')])
+
+    drives = list(drives)
+    if drives:
+        labels = [{'mountpoint': drive.mountpoint, 'device': drive.device, 'fstype': drive.fstype} for drive in drives]
+        family('pysentinel_drive_size_bytes', 'gauge', "Size of the partition.",
+               [(label, drive.total) for label, drive in zip(labels, drives)])
+        family('pysentinel_drive_free_bytes', 'gauge', "Free space on the partition.",
+               [(label, drive.free) for label, drive in zip(labels, drives)])
+        family('pysentinel_drive_used_percent', 'gauge', "Share of the partition in use.",
+               [(label, drive.percent) for label, drive in zip(labels, drives)])
+        family('pysentinel_drive_growth_bytes_per_second', 'gauge', "Growth of the used space over the last hour.",
+               [(label, drive.growth) for label, drive in zip(labels, drives)])
+        family('pysentinel_drive_responding', 'gauge', "0 while the partition does not answer (e.g. a hung network mount).",
+               [(label, drive.responding) for label, drive in zip(labels, drives)])
+
+    # One series per breached metric; pysentinel_alerts_active is 0 for this host when all is well
+    hosts = dict.fromkeys([socket.gethostname()] + sorted(alerts))
+    family('pysentinel_alerts_active', 'gauge', "Number of thresholds breached at the latest check.",
+           [({'host': host}, len(alerts.get(host, {}))) for host in hosts])
+    active = [(host, metric, alert) for host in hosts for metric, alert in sorted(alerts.get(host, {}).items())]
+    family('pysentinel_alert_value', 'gauge', "Value of a breached metric at the latest check.",
+           [({'host': host, 'metric': metric}, alert['value']) for host, metric, alert in active])
+    family('pysentinel_alert_threshold', 'gauge', "Threshold of a breached metric.",
+           [({'host': host, 'metric': metric}, alert['threshold']) for host, metric, alert in active])
+    family('pysentinel_alert_since_timestamp_seconds', 'gauge', "Time since when a metric has been breached.",
+           [({'host': host, 'metric': metric}, alert['since']) for host, metric, alert in active])
+
+    return '\n'.join(lines) + '\n'
+
+def parse_time(text):
+    """Parse a query time given as epoch seconds or ISO 8601 local time."""
+    try:
+        value = float(text)
+    except ValueError:
+        try:
+            return datetime.fromisoformat(text).timestamp()
+        except ValueError:
+            raise BadRequest(f"Invalid time {text!r}: use epoch seconds or YYYY-MM-DDTHH:MM:SS")
+    # nan, inf or 1e308 would only fail later, when turned into dates
+    try:
+        if not math.isfinite(value) or value < 0:
+            raise ValueError
+        datetime.fromtimestamp(value)
+    except (ValueError, OverflowError, OSError):
+        raise BadRequest(f"Invalid time {text!r}: out of range")
+    return value
+
+def parse_history_query(query):
+    """Return (host, start, end, metrics, points) from the /api/history query parameters."""
+    def single(name, default=None):
+        values = query.get(name)
+        return values[-1] if values else default
+
+    host = single('host', socket.gethostname())
+    if not re.fullmatch(r'[A-Za-z0-9._-]+', host) or host.strip('.') == '':
+        raise BadRequest(f"Invalid host {host!r}")
+    end = parse_time(single('end')) if single('end') else time.time()
+    if single('start'):
+        start = parse_time(single('start'))
+    else:
+        try:
+            minutes = float(single('minutes', DEFAULT_HISTORY_MINUTES))
+        except ValueError:
+            raise BadRequest("minutes must be a number")
+        if not (math.isfinite(minutes) and 0 <= minutes <= MAX_HISTORY_DAYS * 24 * 60):
+            raise BadRequest(f"minutes must be between 0 and {MAX_HISTORY_DAYS * 24 * 60}")
+        start = max(end - minutes * 60, 0)
+    if start > end:
+        raise BadRequest("start is after end")
+    if end - start > MAX_HISTORY_DAYS * 24 * 3600:
+        raise BadRequest(f"The range cannot be longer than {MAX_HISTORY_DAYS} days")
+    metrics = single('metrics', ','.join(storage.SAMPLE_COLUMNS)).split(',')
+    unknown = [metric for metric in metrics if metric not in storage.SAMPLE_COLUMNS]
+    if unknown:
+        raise BadRequest(f"Unknown metrics {', '.join(unknown)}; available: {', '.join(storage.SAMPLE_COLUMNS)}")
+    points = single('points')
+    if points is not None:
+        try:
+            points = int(points)
+        except ValueError:
+            raise BadRequest("points must be an integer")
+        if not 3 <= points <= MAX_HISTORY_POINTS:
+            raise BadRequest(f"points must be between 3 and {MAX_HISTORY_POINTS}")
+    return host, start, end, metrics, points
+
+def history_etag(host, start, end, query):
+    """ETag of a history response: the query, its range and the size and mtime of the day files it reads.
+
+    The range counts in sampling intervals: without an end in the query it moves with the clock,
+    and a client must not be told a response for an earlier window is still current.
+    """
+    digest = hashlib.sha1(query.encode('utf-8'))
+    step = max(config_store.get_settings()['refresh_rate'], 1)
+    digest.update(f"{start // step:.0f}:{end // step:.0f};".encode('ascii'))
+    day = datetime.fromtimestamp(start).replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= datetime.fromtimestamp(end):
+        try:
+            stat = os.stat(storage.get_csv_file_path(day, host))
+            digest.update(f"{day:%Y-%m-%d}:{stat.st_mtime_ns}:{stat.st_size};".encode('ascii'))
+        except OSError:
+            pass
+        day += timedelta(days=1)
+    return f'"{digest.hexdigest()}"'
+
+def iter_raw_history(host, start, end, metrics):
+    """Yield the JSON of the stored samples of a range, piece by piece, reading the CSV files lazily."""
+    columns = [storage.CSV_HEADER.index(storage.SAMPLE_COLUMNS[metric]) for metric in metrics]
+    yield json.dumps({'host': host, 'start': start, 'end': end, 'columns': ['timestamp'] + metrics})[:-1].encode('utf-8')
+    yield b', "samples": ['
+    minutes = {}  # "YYYY-MM-DD HH:MM" -> epoch seconds, so each row does not parse a full date
+    separator = b''
+    for row in storage.iter_rows(datetime.fromtimestamp(start), datetime.fromtimestamp(end), host):
+        try:
+            minute = f"{row[0]} {row[1][:5]}"
+            base = minutes.get(minute)
+            if base is None:
+                base = minutes[minute] = time.mktime(time.strptime(minute, "%Y-%m-%d %H:%M"))
+            values = [base + int(row[1][6:8])] + [float(row[index]) for index in columns]
+        except (ValueError, IndexError):
+            continue  # A partly written or corrupt line
+        yield separator + json.dumps(values).encode('utf-8')
+        separator = b','
+    yield b']}'
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'PySentinel'
+    protocol_version = 'HTTP/1.1'  # Needed for chunked responses; connections are kept alive
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status = self.server.status
+        try:
+            if url.path == '/metrics':
+                body, compressed = status.metrics
+                self.send_body(body, PROMETHEUS_CONTENT_TYPE, compressed=compressed)
+            elif url.path == '/api/current':
+                body, etag = status.current
+                if body is None:
+                    self.send_json_error(503, "No sample collected yet")
+                else:
+                    self.send_body(body, JSON_CONTENT_TYPE, etag=etag)
+            elif url.path == '/api/alerts':
+                body = json.dumps(monitoring.get_active_alerts()).encode('utf-8')
+                self.send_body(body, JSON_CONTENT_TYPE, etag=f'"{hashlib.sha1(body).hexdigest()}"')
+            elif url.path == '/api/history':
+                self.send_history(parse_qs(url.query), url.query)
+            elif url.path == '/':
+                self.send_body(b"PySentinel: /metrics, /api/current, /api/history, /api/alerts\n", 'text/plain; charset=utf-8')
+            else:
+                self.send_json_error(404, f"Unknown path {url.path}")
+        except BadRequest as e:
+            self.send_json_error(400, str(e))
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # The client went away in the middle of a response
+
+    def send_history(self, query, query_text):
+        host, start, end, metrics, points = parse_history_query(query)
+        etag = history_etag(host, start, end, query_text)
+        if self.not_modified(etag):
+            return
+        if points is None:
+            self.send_chunked(iter_raw_history(host, start, end, metrics), JSON_CONTENT_TYPE, etag)
+            return
+        # Downsampled on the server with LTTB, from the cached per-day summaries where the range allows
+        series = self.server.status.history_store(host).fetch(start, end, points)
+        body = {'host': host, 'start': start, 'end': end, 'points': points,
+                'series': {metric: [[x, y] for x, y in zip(series[metric][0].tolist(), series[metric][1].tolist())]
+                           for metric in metrics}}
+        self.send_chunked([json.dumps(body).encode('utf-8')], JSON_CONTENT_TYPE, etag)
+
+    def not_modified(self, etag):
+        """Answer 304 if the client already has this version."""
+        if etag is None or etag not in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+    def send_body(self, body, content_type, compressed=None, etag=None):
+        """Send a response body, pre-compressed when the client accepts gzip."""
+        if self.not_modified(etag):
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if compressed is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = compressed
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunked(self, pieces, content_type, etag):
+        """Send the pieces of a response as they are produced, in chunks of about CHUNK_SIZE bytes."""
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        buffer = []
+        size = 0
+        for piece in pieces:
+            buffer.append(piece)
+            size += len(piece)
+            if size >= CHUNK_SIZE:
+                self.write_chunk(b''.join(buffer))
+                buffer, size = [], 0
+        if buffer:
+            self.write_chunk(b''.join(buffer))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+
+    def send_json_error(self, code, message):
+        body = json.dumps({'error': message}).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', JSON_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapers poll every few seconds: do not flood the log
+
+class StatusServer:
+    """Embedded HTTP server: /metrics for Prometheus and a JSON API for local scripts.
+
+    The responses about the latest sample are rendered once per sample by update(), on the
+    sampling thread; requests only send the cached bytes, so many clients cost next to nothing.
+    """
+
+    def __init__(self, address, drives=None):
+        self.address = address
+        self.drives = drives or (lambda: [])  # Returns the DriveStats to export
+        self.httpd = None
+        self.current = (None, None)  # JSON of the latest sample and its ETag
+        self.history_stores = {}  # host -> history.HistoryStore, created on first use
+        self.lock = threading.Lock()
+        self.update(None)
+
+    def update(self, sample):
+        """Render the responses for a new sample."""
+        body = render_metrics(sample, self.drives(), monitoring.get_active_alerts()).encode('utf-8')
+        # Replaced in one assignment: request threads never see a body without its compressed copy
+        self.metrics = (body, gzip.compress(body, compresslevel=6))
+        if sample is not None:
+            self.current = (json.dumps(dict(sample, host=socket.gethostname())).encode('utf-8'),
+                            f'"{sample["timestamp"]!r}"')
+
+    def history_store(self, host):
+        with self.lock:
+            store = self.history_stores.get(host)
+            if store is None:
+                import history  # numpy: only loaded once a downsampled range is asked for
+                store = self.history_stores[host] = history.HistoryStore(machine_name=host)
+            return store
+
+    def start(self):
+        is_unix, address = protocol.parse_address(self.address, default_port=9464)
+        if is_unix:
+            raise ValueError("The HTTP server listens on host:port only")
+        self.httpd = ThreadingHTTPServer(address, StatusRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.status = self
+        threading.Thread(target=self.httpd.serve_forever, name="status-server", daemon=True).start()
+        print(f"Serving metrics on http://{self.address}/metrics and the JSON API on http://{self.address}/api/")
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
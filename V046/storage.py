@@ -0,0 +1,197 @@
+import os
+import csv
+import gzip
+import time
+import socket
+from datetime import datetime, timedelta
+
+# Header of the daily CSV log files
+CSV_HEADER = ['Date', 'Time', 'CPU Usage (%)', 'RAM Usage (%)', 'Disk Usage (%)',
+              'GPU Usage (%)', 'Network In (MB)', 'Network Out (MB)']
+
+# Columns of the daily container CSV files: one row per cgroup and sample (see cgroups.py)
+CONTAINER_COLUMNS = {
+    'cpu': 'CPU Usage (%)',
+    'ram': 'Memory Usage (%)',
+    'memory': 'Memory (MB)',
+    'io_read': 'IO Read (MB/s)',
+    'io_write': 'IO Write (MB/s)',
+    'cpu_pressure': 'CPU Pressure (%)',
+    'memory_pressure': 'Memory Pressure (%)',
+    'io_pressure': 'IO Pressure (%)',
+}
+CONTAINER_HEADER = ['Date', 'Time', 'Container'] + list(CONTAINER_COLUMNS.values())
+
+# Column of each sample key in the CSV files
+SAMPLE_COLUMNS = {
+    'cpu': 'CPU Usage (%)',
+    'ram': 'RAM Usage (%)',
+    'disk': 'Disk Usage (%)',
+    'gpu': 'GPU Usage (%)',
+    'network_in': 'Network In (MB)',
+    'network_out': 'Network Out (MB)',
+}
+
+def get_csv_file_path(date=None, machine_name=None, prefix=''):
+    """Get the path of the CSV file holding the samples of a given day (today by default).
+
+    Plugin collectors (plugins.py) store theirs in files named with a prefix.
+    """
+    machine_name = machine_name or socket.gethostname()
+    date = date or datetime.now()
+    csv_file_name = f"{prefix}{machine_name}_{date.strftime('%Y-%m-%d')}.csv"
+    return os.path.join(os.getcwd(), csv_file_name)
+
+def list_days(machine_name=None):
+    """Return the days that have a CSV file in the current directory, oldest first."""
+    prefix = f"{machine_name or socket.gethostname()}_"
+    days = []
+    for file_name in os.listdir(os.getcwd()):
+        if file_name.startswith(prefix) and file_name.endswith('.csv'):
+            try:
+                days.append(datetime.strptime(file_name[len(prefix):-len('.csv')], "%Y-%m-%d"))
+            except ValueError:
+                continue  # Another host whose name starts like ours
+    return sorted(days)
+
+def get_container_csv_file_path(date=None, machine_name=None):
+    """Get the path of the CSV file holding the container samples of a machine for a given day."""
+    machine_name = machine_name or socket.gethostname()
+    date = date or datetime.now()
+    return os.path.join(os.getcwd(), f"containers_{machine_name}_{date.strftime('%Y-%m-%d')}.csv")
+
+def create_csv_file(file_path, header=CSV_HEADER):
+    """Create a new CSV file and write the header, keeping the samples of a file that already exists."""
+    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+        return file_path
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+    return file_path
+
+def read_header(file_path):
+    """Return the header row of a CSV file, or None if it does not exist or is empty."""
+    try:
+        with open(file_path, newline='') as file:
+            return next(csv.reader(file), None)
+    except OSError:
+        return None
+
+def append_container_samples(timestamp, containers, machine_name=None):
+    """Append the metrics of every container ({name: {CONTAINER_COLUMNS key: value}}) taken at timestamp."""
+    moment = time.localtime(timestamp)
+    date, clock = time.strftime("%Y-%m-%d", moment), time.strftime("%H:%M:%S", moment)
+    file_path = create_csv_file(get_container_csv_file_path(datetime.fromtimestamp(timestamp), machine_name), CONTAINER_HEADER)
+    with open(file_path, 'a', newline='') as file:
+        csv.writer(file).writerows(
+            [date, clock, name] + [metrics[key] for key in CONTAINER_COLUMNS] for name, metrics in sorted(containers.items())
+        )
+
+def sample_row(sample, columns=SAMPLE_COLUMNS):
+    """Return the CSV row of a sample dict (see Sampler.snapshot, or a plugin's columns)."""
+    moment = time.localtime(sample['timestamp'])
+    return [time.strftime("%Y-%m-%d", moment), time.strftime("%H:%M:%S", moment)] + \
+        [sample[key] for key in columns]
+
+def append_columns(columns, machine_name=None):
+    """Append samples given as columns ('timestamp' and the SAMPLE_COLUMNS keys) to the daily CSV files of a machine.
+
+    Each day file is opened once per call, so a batch of many samples costs one write.
+    """
+    by_day = {}
+    minutes = {}  # Minute -> (date, "HH:MM:"): time zones shift by whole minutes, so only the seconds vary within one
+    for timestamp, *values in zip(columns['timestamp'], *(columns[key] for key in SAMPLE_COLUMNS)):
+        second = int(timestamp)
+        minute = second // 60
+        prefix = minutes.get(minute)
+        if prefix is None:
+            moment = time.localtime(minute * 60)
+            prefix = minutes[minute] = (time.strftime("%Y-%m-%d", moment), time.strftime("%H:%M:", moment))
+        by_day.setdefault(prefix[0], []).append([prefix[0], f"{prefix[1]}{second - minute * 60:02d}"] + values)
+    for day, rows in by_day.items():
+        file_path = create_csv_file(get_csv_file_path(datetime.strptime(day, "%Y-%m-%d"), machine_name))
+        with open(file_path, 'a', newline='') as file:
+            csv.writer(file).writerows(rows)
+
+def append_row(file_path, data_row):
+    """Write a row of data to a CSV file."""
+    with open(file_path, 'a', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(data_row)
+
+def iter_rows(start, end, machine_name=None, prefix=''):
+    """Yield the stored rows whose timestamp lies between start and end, one line at a time."""
+    # "YYYY-MM-DD HH:MM:SS" strings sort chronologically, so rows are filtered without parsing dates
+    start_key = start.strftime("%Y-%m-%d %H:%M:%S")
+    end_key = end.strftime("%Y-%m-%d %H:%M:%S")
+
+    day = datetime(start.year, start.month, start.day)
+    while day <= end:
+        file_path = get_csv_file_path(day, machine_name, prefix)
+        if os.path.exists(file_path):
+            with open(file_path, newline='') as file:
+                reader = csv.reader(file)
+                next(reader, None)  # Skip the header
+                for row in reader:
+                    if len(row) < 2:
+                        continue
+                    key = f"{row[0]} {row[1]}"
+                    if start_key <= key <= end_key:
+                        yield row
+        day += timedelta(days=1)
+
+def load_history(start, end, machine_name=None, columns=SAMPLE_COLUMNS, header=CSV_HEADER, prefix=''):
+    """Load the samples between start and end as (epoch timestamps, {sample key: values}) NumPy arrays.
+
+    The columns, header and file prefix default to this machine's samples; a plugin passes its own.
+    """
+    import numpy as np  # Only the graphs need NumPy; the headless service never loads it
+    indexes = {key: header.index(column) for key, column in columns.items()}
+    timestamps = []
+    columns = {key: [] for key in indexes}
+    minute_starts = {}
+    for row in iter_rows(start, end, machine_name, prefix):
+        try:
+            # Resolve the local time once per minute: the UTC offset changes with DST within a day,
+            # but time zones shift by whole minutes, so only the seconds need adding
+            minute = f"{row[0]} {row[1][:5]}"
+            minute_start = minute_starts.get(minute)
+            if minute_start is None:
+                minute_start = minute_starts[minute] = time.mktime(time.strptime(minute, "%Y-%m-%d %H:%M"))
+            timestamp = minute_start + int(row[1][6:8])
+            values = [float(row[index]) for index in indexes.values()]
+        except (ValueError, IndexError):
+            continue
+        timestamps.append(timestamp)
+        for key, value in zip(indexes, values):
+            columns[key].append(value)
+    return np.array(timestamps), {key: np.array(values) for key, values in columns.items()}
+
+def write_history_slice(fileobj, start, end, machine_name=None, container=None):
+    """Write the rows between start and end as a gzip-compressed CSV into fileobj.
+
+    With a container (a cgroup name, see cgroups.py) the rows are those of the machine's container files.
+    """
+    rows = 0
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as gz:
+        writer = csv.writer(_TextSink(gz))
+        if container is None:
+            writer.writerow(CSV_HEADER)
+            selected = iter_rows(start, end, machine_name)
+        else:
+            writer.writerow(CONTAINER_HEADER)
+            selected = (row for row in iter_rows(start, end, machine_name, 'containers_') if row[2:3] == [container])
+        for row in selected:
+            writer.writerow(row)
+            rows += 1
+    fileobj.seek(0)
+    return rows
+
+class _TextSink:
+    """Minimal text wrapper so csv.writer can write straight into a binary stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        return self.stream.write(text.encode('utf-8'))
@@ -0,0 +1,84 @@
+import math
+import random
+import unittest
+
+import gorilla
+
+def bit_patterns(values):
+    """Values as their IEEE 754 bits, so NaN and -0.0 compare exactly."""
+    return [gorilla.float_bits(value) for value in values]
+
+class BlockRoundTripTest(unittest.TestCase):
+    def assert_round_trip(self, timestamps, columns):
+        block = gorilla.encode_block(timestamps, columns)
+        decoded_timestamps, decoded_columns = gorilla.decode_block(block, len(timestamps), len(columns))
+        self.assertEqual(decoded_timestamps, [round(timestamp, 3) for timestamp in timestamps])
+        self.assertEqual(len(decoded_columns), len(columns))
+        for column, decoded in zip(columns, decoded_columns):
+            self.assertEqual(bit_patterns(decoded), bit_patterns(column))
+        return block
+
+    def test_empty_block(self):
+        block = self.assert_round_trip([], [[], []])
+        self.assertEqual(block, b'')
+
+    def test_single_point(self):
+        block = self.assert_round_trip([1700000000.25], [[12.5], [-3.0]])
+        self.assertEqual(len(block), 8 * 3)
+
+    def test_identical_values_take_one_bit_each(self):
+        timestamps = [1700000000 + index for index in range(100)]
+        block = self.assert_round_trip(timestamps, [[42.0] * 100, [0.0] * 100])
+        # 3 x 64 bits for the first sample, 4 + 12 bits for the first 1000 ms interval,
+        # then 1 bit per unchanged interval and value
+        self.assertEqual(len(block), (3 * 64 + 16 + 99 * 3 - 1 + 7) // 8)
+
+    def test_special_values(self):
+        values = [float('nan'), -1.5, float('inf'), float('-inf'), -0.0, 0.0, 5e-324, -1e308, float('nan'), 1.0]
+        timestamps = [1700000000 + index * 0.5 for index in range(len(values))]
+        self.assert_round_trip(timestamps, [values, [-value for value in values]])
+
+    def test_delta_of_delta_buckets(self):
+        # Each interval change lands on a bucket edge, then beyond the last one, then backwards in time
+        intervals = [1000, 1000, 937, 1001, 745, 1001, -1047, 1001, 3050, 1001, 1 << 40, 1000, -(1 << 41), 1000]
+        timestamps = [1700000000.0]
+        for interval in intervals:
+            timestamps.append(timestamps[-1] + interval / gorilla.TIMESTAMP_SCALE)
+        self.assert_round_trip(timestamps, [[float(index) for index in range(len(timestamps))]])
+
+    def test_random_walk(self):
+        generator = random.Random(46)
+        timestamps, cpu, network = [], [], []
+        timestamp, total = 1700000000.0, 0.0
+        for _ in range(2000):
+            timestamp += generator.choice((1.0, 1.0, 1.0, 0.999, 1.013, 60.0))
+            total += generator.random() * 3
+            timestamps.append(round(timestamp, 3))
+            cpu.append(round(generator.random() * 100, 1))
+            network.append(total)
+        self.assert_round_trip(timestamps, [cpu, network])
+
+    def test_encoder_appends_after_finish(self):
+        encoder = gorilla.BlockEncoder(1)
+        encoder.append(1700000000.0, [1.0])
+        encoder.finish()
+        encoder.append(1700000001.0, [2.0])
+        timestamps, columns = gorilla.decode_block(encoder.finish(), 2, 1)
+        self.assertEqual(timestamps, [1700000000.0, 1700000001.0])
+        self.assertEqual(columns, [[1.0, 2.0]])
+
+    def test_truncated_block(self):
+        timestamps = [1700000000 + index for index in range(10)]
+        block = gorilla.encode_block(timestamps, [[float(index) * 1.1 for index in range(10)]])
+        with self.assertRaises(ValueError):
+            gorilla.decode_block(block[:len(block) // 2], 10, 1)
+        with self.assertRaises(ValueError):
+            gorilla.decode_block(block, 1000, 1)
+
+    def test_nan_stays_nan(self):
+        timestamps, columns = gorilla.decode_block(gorilla.encode_block([1.0, 2.0], [[float('nan'), 3.0]]), 2, 1)
+        self.assertTrue(math.isnan(columns[0][0]))
+        self.assertEqual(columns[0][1], 3.0)
+
+if __name__ == '__main__':
+    unittest.main()
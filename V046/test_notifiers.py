@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import socketserver
+from datetime import datetime
+from email import message_from_bytes
+from email.header import decode_header, make_header
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config_store
+import notifiers
+
+def make_notification(subject="Threshold Alert: CPU Usage Exceeded"):
+    return {'host': 'test-host', 'time': datetime(2024, 5, 1, 12, 0, 0), 'subject': subject,
+            'body': "CPU Usage (97%) exceeded threshold (90%)", 'breach_time': None}
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Record the JSON posted, answering with the server's status codes in turn (200 once they run out)."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        with server.lock:
+            server.requests.append(json.loads(body))
+            status = server.statuses.pop(0) if server.statuses else 200
+        time.sleep(server.delay)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class WebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, statuses=(), delay=0.0):
+        super().__init__(('127.0.0.1', 0), WebhookHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.statuses = list(statuses)
+        self.delay = delay  # Seconds before answering each request
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/hook"
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: greeting, EHLO, MAIL, RCPT, DATA and QUIT."""
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        if server.greeting_delay:
+            time.sleep(server.greeting_delay)
+        self.wfile.write(b"220 stand-in ESMTP\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.wfile.write(b"250 stand-in\r\n")
+            elif command in (b"MAIL", b"RCPT"):
+                self.wfile.write(b"250 OK\r\n")
+            elif command == b"DATA":
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                message = []
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line == b".\r\n":
+                        break
+                    message.append(data_line)
+                with server.lock:
+                    server.messages.append(b"".join(message))
+                self.wfile.write(b"250 Queued\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            else:
+                self.wfile.write(b"502 Not implemented\r\n")
+
+class SmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, greeting_delay=0.0):
+        super().__init__(('127.0.0.1', 0), SmtpHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = []
+        self.greeting_delay = greeting_delay  # Seconds before the 220 greeting: a slow relay
+
+def start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class SinkTestCase(unittest.TestCase):
+    """Run each test with its own config.ini pointing the email settings at a local SMTP stand-in."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_path = config_store.CONFIG_FILE_PATH
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)  # The history attachments read the CSV files of the current directory
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        config_store.CONFIG_FILE_PATH = self.config_path
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def serve(self, server):
+        self.servers.append(start(server))
+        return server
+
+    def configure_smtp(self, port):
+        config_store.CONFIG_FILE_PATH = os.path.join(self.directory, 'config.ini')
+        with open(config_store.CONFIG_FILE_PATH, 'w') as file:
+            file.write("[Email]\n"
+                       "smtp_server = 127.0.0.1\n"
+                       f"smtp_port = {port}\n"
+                       "smtp_security = none\n"
+                       "smtp_username = pysentinel@example.com\n"
+                       "email_recipient = ops@example.com\n")
+        config_store.load_settings()
+
+class NotificationSinkTest(unittest.TestCase):
+    def test_deliver_is_abstract(self):
+        with self.assertRaises(TypeError):
+            notifiers.NotificationSink()
+
+class WebhookSinkTest(SinkTestCase):
+    def test_posts_json(self):
+        server = self.serve(WebhookServer())
+        sink = notifiers.WebhookSink(server.url, timeout=2, retries=0)
+        try:
+            self.assertTrue(sink.send(make_notification()))
+        finally:
+            sink.close()
+        self.assertEqual(server.requests, [{
+            'host': 'test-host', 'time': '2024-05-01T12:00:00',
+            'subject': "Threshold Alert: CPU Usage Exceeded", 'body': "CPU Usage (97%) exceeded threshold (90%)",
+        }])
+
+    def test_retries_until_delivered(self):
+        server = self.serve(WebhookServer(statuses=[500, 503]))
+        sink = notifiers.WebhookSink(server.url, timeout=0.1, retries=3)
+        try:
+            self.assertTrue(sink.send(make_notification()))
+        finally:
+            sink.close()
+        self.assertEqual(len(server.requests), 3)
+
+    def test_gives_up_after_the_retry_budget(self):
+        server = self.serve(WebhookServer(statuses=[500] * 10))
+        sink = notifiers.WebhookSink(server.url, timeout=0.1, retries=2)
+        try:
+            self.assertFalse(sink.send(make_notification()))
+        finally:
+            sink.close()
+        self.assertEqual(len(server.requests), 3)
+
+    def test_timeout_per_attempt(self):
+        server = self.serve(WebhookServer(delay=1.0))
+        sink = notifiers.WebhookSink(server.url, timeout=0.2, retries=1)
+        started = time.monotonic()
+        try:
+            self.assertFalse(sink.send(make_notification()))
+        finally:
+            sink.close(wait=False)
+        # Two attempts of 0.2 s and a 0.2 s backoff, far from the server's 1 s answers
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(len(server.requests), 2)
+
+class SmtpSinkTest(SinkTestCase):
+    def test_sends_alert_email(self):
+        server = self.serve(SmtpServer())
+        self.configure_smtp(server.server_address[1])
+        sink = notifiers.SmtpSink(timeout=2, retries=0)
+        try:
+            self.assertTrue(sink.send(make_notification()))
+        finally:
+            sink.close()
+        self.assertEqual(len(server.messages), 1)
+        message = message_from_bytes(server.messages[0])
+        self.assertTrue(str(make_header(decode_header(message['Subject']))).endswith(": Threshold Alert: CPU Usage Exceeded"))
+        self.assertEqual(message['To'], "ops@example.com")
+        attachment = message.get_payload()[1]
+        self.assertTrue(attachment.get_filename().startswith("test-host_"))
+
+    def test_long_subject_is_folded_with_crlf(self):
+        server = self.serve(SmtpServer())
+        self.configure_smtp(server.server_address[1])
+        subject = "Threshold Alert: " + "\n".join(f"{metric} Usage (97%) exceeded threshold (90%)" for metric in ("CPU", "RAM", "GPU"))
+        sink = notifiers.SmtpSink(timeout=2, retries=0)
+        try:
+            self.assertTrue(sink.send(make_notification(subject)))
+        finally:
+            sink.close()
+        self.assertEqual(len(server.messages), 1)
+        data = server.messages[0]
+        self.assertIsNone(re.search(rb'(?<!\r)\n', data))
+        self.assertIn(b"\r\n =?utf-8?q?", data)
+
+    def test_timeout_and_retries(self):
+        server = self.serve(SmtpServer(greeting_delay=2.0))
+        self.configure_smtp(server.server_address[1])
+        sink = notifiers.SmtpSink(timeout=0.2, retries=1)
+        started = time.monotonic()
+        try:
+            self.assertFalse(sink.send(make_notification()))
+        finally:
+            sink.close(wait=False)
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(server.connections, 2)
+        self.assertEqual(server.messages, [])
+
+    def test_incomplete_settings_are_not_retried(self):
+        config_store.CONFIG_FILE_PATH = os.path.join(self.directory, 'config.ini')
+        with open(config_store.CONFIG_FILE_PATH, 'w') as file:
+            file.write("[Email]\nsmtp_server =\n")
+        config_store.load_settings()
+        sink = notifiers.SmtpSink(timeout=0.2, retries=3)
+        started = time.monotonic()
+        try:
+            self.assertFalse(sink.send(make_notification()))
+        finally:
+            sink.close()
+        # A retry would have slept 0.2 s first
+        self.assertLess(time.monotonic() - started, 0.2)
+
+class DispatcherTest(SinkTestCase):
+    def test_slow_smtp_does_not_delay_webhook(self):
+        smtp = self.serve(SmtpServer(greeting_delay=1.5))
+        webhook = self.serve(WebhookServer())
+        self.configure_smtp(smtp.server_address[1])
+        dispatcher = notifiers.NotificationDispatcher([
+            notifiers.SmtpSink(timeout=5, retries=0),
+            notifiers.WebhookSink(webhook.url, timeout=2, retries=0),
+        ])
+        try:
+            smtp_future, webhook_future = dispatcher.notify("Subject", "Body", host='test-host')
+            self.assertTrue(webhook_future.result(timeout=1))
+            self.assertFalse(smtp_future.done())
+            self.assertTrue(smtp_future.result(timeout=5))
+        finally:
+            dispatcher.close()
+        self.assertEqual(len(webhook.requests), 1)
+        self.assertEqual(len(smtp.messages), 1)
+
+if __name__ == '__main__':
+    unittest.main()
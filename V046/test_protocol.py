@@ -0,0 +1,103 @@
+import struct
+import unittest
+
+import gorilla
+import protocol
+
+def make_samples(count, start=1700000000.0):
+    return [{'timestamp': start + index, 'cpu': 12.5 + index, 'ram': 40.25, 'disk': 0.0, 'gpu': 99.75,
+             'network_in': 1234.5 + index, 'network_out': 0.125 * index} for index in range(count)]
+
+class FrameReaderTest(unittest.TestCase):
+    def test_frames_split_across_chunks(self):
+        stream = protocol.encode_hello('web-01', 7) + protocol.encode_samples(1, make_samples(3)) + protocol.encode_ack(3)
+        reader = protocol.FrameReader()
+        frames = []
+        for index in range(len(stream)):
+            frames += reader.feed(stream[index:index + 1])
+        self.assertEqual([frame_type for frame_type, payload in frames], [protocol.HELLO, protocol.SAMPLES, protocol.ACK])
+        self.assertEqual(reader.buffer, bytearray())
+
+    def test_several_frames_in_one_chunk(self):
+        reader = protocol.FrameReader()
+        frames = reader.feed(protocol.encode_ack(1) + protocol.encode_ack(2) + protocol.encode_ack(3)[:4])
+        self.assertEqual([protocol.decode_ack(payload) for frame_type, payload in frames], [1, 2])
+        frames = reader.feed(protocol.encode_ack(3)[4:])
+        self.assertEqual([protocol.decode_ack(payload) for frame_type, payload in frames], [3])
+
+    def test_oversized_frame_is_rejected(self):
+        reader = protocol.FrameReader()
+        with self.assertRaises(protocol.ProtocolError):
+            reader.feed(protocol.FRAME_HEADER.pack(protocol.MAX_FRAME_SIZE + 1, protocol.SAMPLES))
+
+class FrameCodingTest(unittest.TestCase):
+    def payload(self, frame):
+        frames = protocol.FrameReader().feed(frame)
+        self.assertEqual(len(frames), 1)
+        return frames[0]
+
+    def test_hello(self):
+        frame_type, payload = self.payload(protocol.encode_hello('db-02.example', 1 << 62))
+        self.assertEqual(frame_type, protocol.HELLO)
+        self.assertEqual(protocol.decode_hello(payload), (1 << 62, 'db-02.example'))
+
+    def test_hello_with_unsupported_version(self):
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_hello(protocol.HELLO_HEADER.pack(99, 1) + b'host')
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_hello(b'\x02')
+
+    def test_samples(self):
+        samples = make_samples(5)
+        frame_type, payload = self.payload(protocol.encode_samples(10, samples))
+        self.assertEqual(frame_type, protocol.SAMPLES)
+        first_sequence, columns = protocol.decode_sample_columns(payload)
+        self.assertEqual(first_sequence, 10)
+        self.assertEqual(list(columns['timestamp']), [sample['timestamp'] for sample in samples])
+        for field in protocol.SAMPLE_FIELDS:
+            self.assertEqual(list(columns[field]), [sample[field] for sample in samples])
+
+    def test_samples_with_wrong_length(self):
+        frame_type, payload = self.payload(protocol.encode_samples(1, make_samples(2)))
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_sample_columns(payload[:-1])
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_sample_columns(protocol.SAMPLES_HEADER.pack(1, 0))
+
+    def test_block(self):
+        samples = make_samples(50)
+        encoder = gorilla.BlockEncoder(len(protocol.SAMPLE_FIELDS))
+        for sample in samples:
+            encoder.append(sample['timestamp'], [sample[field] for field in protocol.SAMPLE_FIELDS])
+        frame_type, payload = self.payload(protocol.encode_block(100, len(samples), encoder.finish()))
+        self.assertEqual(frame_type, protocol.BLOCK)
+        first_sequence, columns = protocol.decode_block_columns(payload)
+        self.assertEqual(first_sequence, 100)
+        self.assertEqual(columns['timestamp'], [sample['timestamp'] for sample in samples])
+        for field in protocol.SAMPLE_FIELDS:
+            self.assertEqual(columns[field], [sample[field] for sample in samples])
+
+    def test_corrupt_block(self):
+        encoder = gorilla.BlockEncoder(len(protocol.SAMPLE_FIELDS))
+        encoder.append(1700000000.0, [1.0] * len(protocol.SAMPLE_FIELDS))
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_block_columns(protocol.SAMPLES_HEADER.pack(1, 20) + encoder.finish())
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_block_columns(protocol.SAMPLES_HEADER.pack(1, 0))
+
+    def test_ack(self):
+        frame_type, payload = self.payload(protocol.encode_ack(123456789))
+        self.assertEqual(frame_type, protocol.ACK)
+        self.assertEqual(protocol.decode_ack(payload), 123456789)
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode_ack(struct.pack('!I', 1))
+
+class ParseAddressTest(unittest.TestCase):
+    def test_addresses(self):
+        self.assertEqual(protocol.parse_address('unix:/run/pysentinel.sock'), (True, '/run/pysentinel.sock'))
+        self.assertEqual(protocol.parse_address('10.0.0.5:9000'), (False, ('10.0.0.5', 9000)))
+        self.assertEqual(protocol.parse_address('collector'), (False, ('collector', protocol.DEFAULT_PORT)))
+        self.assertEqual(protocol.parse_address('[::1]:7071'), (False, ('::1', 7071)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import time
+import queue
+import threading
+from collections import deque
+from scheduler import wakeups
+
+class TkBridge:
+    """Bounded queue carrying work from background threads to the Tk main loop.
+
+    Tk is not thread-safe: threads only post callbacks here, and the Tk side runs them
+    from a periodic after() poll, a capped batch per tick so bursts cannot freeze the UI.
+    The poll backs off while the queue stays empty, so an idle window hardly wakes up.
+
+    Callbacks posted with post() carry deltas and one-shot results: they run in order and
+    are only dropped, and counted, if the queue is full. The frequent posts take one queue
+    entry per key however many arrive while it waits: post_latest() for refreshes, where
+    the newest call replaces the waiting one, and post_batch() for samples, handed over
+    together (up to max_batch of them) so none is lost while the Tk thread is busy.
+    """
+
+    def __init__(self, root, maxsize=1000, poll_ms=50, batch_size=100, max_poll_ms=1000, idle_poll_ms=5000, max_batch=1000):
+        self.root = root
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.latest = {}  # key -> (callback, args) of the post_latest() call still waiting
+        self.batches = {}  # key -> (callback, deque of the items posted since the batch was queued)
+        self.latest_lock = threading.Lock()
+        self.max_batch = max_batch
+        self.poll_ms = poll_ms
+        self.batch_size = batch_size
+        self.max_poll_ms = max_poll_ms
+        self.idle_poll_ms = idle_poll_ms  # Longest delay while the window is minimized
+        self.delay = poll_ms
+        self.idle = False
+        self.after_id = None
+        self.running = False
+
+        # Queue latency statistics (time between post and execution, in milliseconds)
+        self.processed = 0
+        self.dropped = 0  # Callbacks or batched items that never ran: the queue or the batch was full
+        self.coalesced = 0  # Callbacks replaced by a newer one before they ran
+        self.latency_last = 0.0
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+
+    def post(self, callback, *args):
+        """Queue a callback to run on the Tk thread; safe to call from any thread."""
+        try:
+            self.queue.put_nowait((time.perf_counter(), callback, args))
+        except queue.Full:
+            # The Tk thread has stalled for long: refuse new work rather than grow without bound
+            self.dropped += 1
+            if self.dropped == 1:
+                print(f"GUI queue full ({self.queue.maxsize} callbacks waiting), dropping callbacks.")
+            return False
+        return True
+
+    def post_latest(self, key, callback, *args):
+        """Queue a callback that a later one posted under the same key supersedes, such as a refresh."""
+        with self.latest_lock:
+            waiting = key in self.latest
+            self.latest[key] = (callback, args)
+            if waiting:
+                self.coalesced += 1
+                return
+        if not self.post(self.run_latest, key):
+            with self.latest_lock:
+                self.latest.pop(key, None)
+
+    def run_latest(self, key):
+        with self.latest_lock:
+            callback, args = self.latest.pop(key)
+        callback(*args)
+
+    def post_batch(self, key, callback, item):
+        """Queue an item, such as a sample, for callback(items) along with the others of its key still waiting."""
+        with self.latest_lock:
+            batch = self.batches.get(key)
+            if batch is not None:
+                if len(batch[1]) == self.max_batch:
+                    self.dropped += 1  # The oldest item falls out of the deque
+                batch[1].append(item)
+                return
+            self.batches[key] = (callback, deque([item], maxlen=self.max_batch))
+        if not self.post(self.run_batch, key):
+            with self.latest_lock:
+                self.batches.pop(key, None)
+
+    def run_batch(self, key):
+        with self.latest_lock:
+            callback, items = self.batches.pop(key)
+        callback(list(items))
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.expect()
+
+    def stop(self):
+        self.running = False
+
+    def expect(self):
+        """Poll at full rate again, e.g. right after starting background work whose result is awaited."""
+        if not self.running:
+            return
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+        self.delay = self.poll_ms
+        self.after_id = self.root.after(self.poll_ms, self.poll)
+
+    def set_idle(self, idle):
+        """Allow longer delays between polls while nothing is shown, or resume polling quickly."""
+        self.idle = idle
+        if not idle:
+            self.expect()
+
+    def poll(self):
+        """Run up to batch_size queued callbacks, then schedule the next poll."""
+        self.after_id = None
+        if not self.running:
+            return
+        wakeups.record()
+        if self.drain(self.batch_size):
+            self.delay = self.poll_ms
+        else:
+            # Nothing came: wait twice as long next time, up to the limit of the current mode
+            self.delay = min(self.delay * 2, self.idle_poll_ms if self.idle else self.max_poll_ms)
+        self.after_id = self.root.after(self.delay, self.poll)
+
+    def drain(self, limit=None):
+        """Run queued callbacks on the calling (Tk) thread and return how many ran."""
+        count = 0
+        while limit is None or count < limit:
+            try:
+                posted, callback, args = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            latency = (time.perf_counter() - posted) * 1000
+            self.latency_last = latency
+            self.latency_max = max(self.latency_max, latency)
+            self.latency_avg = latency if not self.processed else 0.9 * self.latency_avg + 0.1 * latency
+            self.processed += 1
+            count += 1
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in queued GUI callback {getattr(callback, '__name__', callback)}: {e}")
+        return count
+
+    def stats(self):
+        """Return the queue latency statistics."""
+        return {
+            'pending': self.queue.qsize(),
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'latency_last_ms': self.latency_last,
+            'latency_avg_ms': self.latency_avg,
+            'latency_max_ms': self.latency_max,
+        }